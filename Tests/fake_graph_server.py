@@ -0,0 +1,90 @@
+"""
+Local stand-in for Microsoft Graph that serves recorded pages.
+
+Routes are matched on path + query string; ``{base}`` inside a recorded
+response is replaced with the server's own base URL so recorded
+``@odata.nextLink``/``@odata.deltaLink`` values point back at it.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+class FakeGraphServer:
+    def __init__(self, routes=None):
+        # routes: {"GET /v1.0/me/messages/1": {"status": 200, "body": {...}}}
+        # A list of responses is served in order, repeating the last one
+        self.routes = dict(routes or {})
+        self.requests = []
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1.0/"
+
+    def add_route(self, method, path, body, status=200, headers=None):
+        self.routes[f"{method} {path}"] = {'status': status, 'body': body, 'headers': headers or {}}
+
+    def add_sequence(self, method, path, responses):
+        """Serve ``responses`` (route dicts) in order for repeated requests."""
+        self.routes[f"{method} {path}"] = list(responses)
+
+    def load(self, path):
+        """Load recorded routes from a JSON fixture file."""
+        with open(path) as f:
+            self.routes.update(json.load(f))
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = self.rfile.read(length) if length else b''
+                key = f"{method} {unquote(self.path)}"
+                fake.requests.append({
+                    'method': method,
+                    'path': unquote(self.path),
+                    'headers': dict(self.headers),
+                    'body': json.loads(payload) if payload else None
+                })
+                route = fake.routes.get(key)
+                if isinstance(route, list):
+                    route = route.pop(0) if len(route) > 1 else route[0]
+                if route is None:
+                    route = {'status': 404, 'body': {'error': {'code': 'NotFound', 'message': key}}}
+                body = json.dumps(route['body']).replace('{base}', fake.base_url.rstrip('/') + '/')
+                data = body.encode('utf-8')
+                self.send_response(route.get('status', 200))
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in route.get('headers', {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+            def do_PATCH(self):
+                self._serve('PATCH')
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -107,6 +107,15 @@ class TestChatEndpoint:
             json={'message': 'Hello'})
         assert response.status_code in [200, 400, 422]
 
+class TestJobsEndpoint:
+    """Test bulk job endpoints"""
+    
+    def test_non_numeric_count_is_rejected(self, client):
+        """A fetch job with a non-numeric count is a client error"""
+        response = client.post('/api/jobs', json={'type': 'fetch_and_process', 'count': 'ten'})
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
+
 class TestErrorHandling:
     """Test error handling"""
     
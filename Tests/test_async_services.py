@@ -0,0 +1,207 @@
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from services.async_cohere_service import AsyncCohereService
+from services.async_graph_transport import AsyncGraphTransport
+from services.async_ms_graph_service import AsyncMSGraphService
+from services.cohere_service import CHAT_FALLBACK, CohereService
+from services.graph_transport import GraphTransport
+from services.llm_cache import LLMCache
+from services.ms_graph_service import MSGraphService
+from fake_graph_server import FakeGraphServer
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+THROTTLED = {'status': 429, 'body': {'error': {'code': 'TooManyRequests'}}, 'headers': {'Retry-After': '2'}}
+OK = {'status': 200, 'body': {'value': []}}
+
+
+@pytest.fixture
+def async_cohere(tmp_path):
+    """Async Cohere service sharing a cached sync service, with a mocked client"""
+    service = CohereService('test_api_key', cache=LLMCache(str(tmp_path / 'cache.sqlite3')))
+    return AsyncCohereService(service, client=MagicMock(chat=AsyncMock()))
+
+
+@pytest.fixture
+def graph_server():
+    """Local stand-in Graph server serving recorded delta pages"""
+    server = FakeGraphServer()
+    server.load(FIXTURES / 'graph_delta_pages.json')
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def async_graph(graph_server, tmp_path):
+    """Async Graph service whose transport records sleeps instead of waiting"""
+    ms_graph = MSGraphService('test_app_id', ['Mail.Read'], base_url=graph_server.base_url,
+                              transport=GraphTransport(max_retries=3))
+    ms_graph.delta_state_file = str(tmp_path / 'delta_tokens.json')
+    ms_graph.get_access_token = lambda: 'test_token'
+    service = AsyncMSGraphService(ms_graph)
+    service.transport.sleeps = []
+
+    async def record_sleep(delay):
+        service.transport.sleeps.append(delay)
+
+    service.transport._sleep = record_sleep
+    yield service
+    asyncio.run(service.close())
+
+
+class TestAsyncCohereService:
+    """Test suite for the asyncio Cohere service"""
+
+    def test_fused_fallback_uses_same_steps(self, async_cohere):
+        """Malformed fused output falls back to classify + extract, as in the sync service"""
+        async_cohere.client.chat.side_effect = [
+            MagicMock(text='Category: Meetings, tasks: prepare'),
+            MagicMock(text='Meetings'),
+            MagicMock(text='[{"task": "Prepare updates"}]'),
+        ]
+
+        category, items = asyncio.run(async_cohere.classify_and_extract('Team meeting tomorrow.'))
+
+        assert category == 'Meetings'
+        assert items[0]['task'] == 'Prepare updates'
+        assert async_cohere.usage()['calls'] == 3
+
+    def test_cache_shared_with_sync_service(self, async_cohere):
+        """Results cached by the async path are served to the sync path"""
+        async_cohere.client.chat.return_value = MagicMock(text='Financial')
+        async_cohere.service.client = MagicMock()
+
+        assert asyncio.run(async_cohere.classify_email('Invoice attached')) == 'Financial'
+        assert async_cohere.service.classify_email('Invoice attached') == 'Financial'
+        async_cohere.service.client.chat.assert_not_called()
+
+    def test_cache_lookups_run_off_the_event_loop(self, async_cohere):
+        """SQLite cache reads and writes happen in worker threads, streamed or not"""
+        async_cohere.client.chat.return_value = MagicMock(text='Financial')
+
+        async def chat_stream(**kwargs):
+            yield MagicMock(event_type='text-generation', text='Noted.')
+
+        async_cohere.client.chat_stream = chat_stream
+        cache = async_cohere.service.cache
+        threads = []
+
+        def record(method):
+            def wrapper(*args):
+                threads.append(threading.get_ident())
+                return method(*args)
+            return wrapper
+
+        cache.get, cache.set = record(cache.get), record(cache.set)
+
+        async def run():
+            await async_cohere.classify_email('Invoice attached')
+            [event async for event in async_cohere.generate_reply_stream('Send it', 'Report')]
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(run())
+
+        assert len(threads) == 4
+        assert loop_thread not in threads
+
+    def test_error_returns_fallback(self, async_cohere):
+        async_cohere.client.chat.side_effect = RuntimeError('Cohere down')
+
+        assert asyncio.run(async_cohere.chat_assistant('Hi', {})) == CHAT_FALLBACK
+
+    def test_reply_stream(self, async_cohere):
+        """Streamed deltas end with the full text, which is then cached"""
+        async def chat_stream(**kwargs):
+            for text in ['Thanks, ', 'will do.']:
+                yield MagicMock(event_type='text-generation', text=text)
+
+        async_cohere.client.chat_stream = chat_stream
+
+        async def collect():
+            return [event async for event in async_cohere.generate_reply_stream('Send it', 'Report')]
+
+        events = asyncio.run(collect())
+
+        assert [event['delta'] for event in events[:-1]] == ['Thanks, ', 'will do.']
+        assert events[-1] == {'done': True, 'text': 'Thanks, will do.', 'fallback': False}
+        assert async_cohere.service.generate_reply('Send it', 'Report') == 'Thanks, will do.'
+
+    def test_requests_run_concurrently(self, async_cohere):
+        """Many slow calls overlap instead of queueing behind each other"""
+        async def slow_chat(**kwargs):
+            await asyncio.sleep(0.2)
+            return MagicMock(text='Sure.')
+
+        async_cohere.client.chat.side_effect = slow_chat
+
+        async def run_many():
+            return await asyncio.gather(*(
+                async_cohere.chat_assistant(f'Question {n}', {}) for n in range(200)
+            ))
+
+        started = time.perf_counter()
+        answers = asyncio.run(run_many())
+
+        assert answers == ['Sure.'] * 200
+        assert time.perf_counter() - started < 2
+
+
+class TestAsyncMSGraphService:
+    """Test suite for the asyncio Graph service"""
+
+    def test_fetch_emails(self, async_graph, graph_server):
+        graph_server.add_route('GET', '/v1.0/me/messages?$top=1', {'value': [{
+            'id': 'msg-9', 'subject': 'Hi',
+            'body': {'contentType': 'html', 'content': '<p>Hello</p>'}
+        }]})
+
+        emails = asyncio.run(async_graph.fetch_emails(1))
+
+        assert [(e['id'], e['body']) for e in emails] == [('msg-9', 'Hello')]
+        assert graph_server.requests[-1]['headers']['Authorization'] == 'Bearer test_token'
+
+    def test_sync_matches_sync_service(self, async_graph):
+        """Delta sync returns the same result and stores the same delta link"""
+        result = asyncio.run(async_graph.sync_emails(account_key='user-1'))
+
+        assert result['full_sync'] is True
+        assert [e['id'] for e in result['changed']] == ['msg-1', 'msg-2', 'msg-3']
+        assert result['changed'][0]['body'] == 'Vessel 1 is on schedule.'
+        with open(async_graph.ms_graph.delta_state_file) as f:
+            assert json.load(f)['user-1:inbox'].endswith('$deltatoken=token-1')
+
+    def test_retry_after_is_honoured(self, async_graph, graph_server):
+        """Throttling is retried like the sync transport, into the same stats"""
+        graph_server.add_sequence('GET', '/v1.0/me/messages?$top=5', [THROTTLED, OK])
+
+        assert asyncio.run(async_graph.fetch_emails(5)) == []
+        assert async_graph.transport.sleeps == [2.0]
+        assert async_graph.ms_graph.transport.stats()['GET /v1.0/me/messages']['retries'] == 1
+
+    def test_send_mail(self, async_graph, graph_server):
+        graph_server.add_route('POST', '/v1.0/me/sendMail', {}, status=202)
+
+        result = asyncio.run(async_graph.send_mail('Re: Hi', 'Thanks', 'a@example.com'))
+
+        assert result == {'status': 'sent'}
+        assert graph_server.requests[-1]['body']['message']['toRecipients'] == [
+            {'emailAddress': {'address': 'a@example.com'}}
+        ]
+
+    def test_send_mail_not_resent_on_unavailable(self, async_graph, graph_server):
+        """A sendMail answered 503 without Retry-After may have gone out, so it is not resent"""
+        graph_server.add_sequence('POST', '/v1.0/me/sendMail', [
+            {'status': 503, 'body': {'error': {'code': 'ServiceUnavailable'}}}, {'status': 202, 'body': {}}
+        ])
+
+        with pytest.raises(Exception, match='503'):
+            asyncio.run(async_graph.send_mail('Re: Hi', 'Thanks', 'a@example.com'))
+
+        assert len([r for r in graph_server.requests if r['path'].endswith('sendMail')]) == 1
+        assert async_graph.transport.sleeps == []
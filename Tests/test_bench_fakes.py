@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+
+import pytest
+from cohere.errors import TooManyRequestsError
+from services.cohere_service import CohereService, VALID_CATEGORIES
+from services.ms_graph_service import MSGraphService
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+from fake_servers import Behaviour, FakeCohereServer, FakeGraphServer  # noqa: E402
+
+
+@pytest.fixture
+def cohere_server():
+    """Fake Cohere API with a small fixed latency"""
+    server = FakeCohereServer(Behaviour(latency_ms=1, jitter=0)).start()
+    yield server
+    server.stop()
+
+
+class TestBenchmarkFakes:
+    """The benchmark fakes speak the wire formats the real services expect"""
+
+    def test_cohere_service_against_fake(self, cohere_server):
+        service = CohereService('bench', base_url=cohere_server.base_url)
+
+        assert service.classify_email('Invoice attached') in VALID_CATEGORIES
+        assert service.extract_action_items('Please confirm')[0]['task'] == 'Confirm the schedule'
+        assert len(service.classify_batch(['One', 'Two', 'Three'])) == 3
+        assert service.usage()['input_tokens'] > 0
+        assert cohere_server.counts()['chat'] == 3
+        service.ping(timeout=2)
+        assert cohere_server.counts()['models'] == 1
+
+    def test_streaming_against_fake(self, cohere_server):
+        service = CohereService('bench', base_url=cohere_server.base_url)
+
+        events = list(service.chat_assistant_stream('Hi', {}))
+
+        assert len(events) > 2
+        assert events[-1]['fallback'] is False
+        assert events[-1]['text'] == ''.join(e['delta'] for e in events[:-1]).strip()
+
+    def test_throttling(self):
+        server = FakeCohereServer(Behaviour(latency_ms=1, jitter=0, throttle_rate=1.0)).start()
+        try:
+            service = CohereService('bench', base_url=server.base_url)
+            with pytest.raises(TooManyRequestsError):
+                service._chat('Hi', 0.5)
+            assert server.counts()['throttled'] == 1
+        finally:
+            server.stop()
+
+    def test_graph_fetch_against_fake(self):
+        server = FakeGraphServer(Behaviour(latency_ms=1, jitter=0)).start()
+        try:
+            service = MSGraphService('test_app_id', ['Mail.Read'], base_url=server.base_url)
+            service.get_access_token = lambda: 'bench-token'
+
+            emails = service.fetch_emails(5)
+
+            assert [e['id'] for e in emails][:2] == ['bench-000000', 'bench-000001']
+            assert 'please confirm' in emails[0]['body']
+            assert service.send_mail('Re: Hi', 'Thanks', 'a@example.com') == {'status': 'sent'}
+        finally:
+            server.stop()
@@ -0,0 +1,106 @@
+from pathlib import Path
+
+from services.body_normalizer import normalize_body
+from services.html_extractor import extract_text
+
+HTML_DIR = Path(__file__).parent / 'fixtures' / 'html'
+
+
+class TestBodyNormalizer:
+    """Test suite for quote, signature and footer stripping"""
+
+    def test_plain_body_untouched(self):
+        """Bodies without boilerplate pass through unchanged"""
+        result = normalize_body('Can we meet tomorrow at 10?')
+
+        assert result.text == 'Can we meet tomorrow at 10?'
+        assert result.removed == []
+        assert result.saved_tokens == 0
+
+    def test_strips_on_wrote_header_and_history(self):
+        """Everything from a wrapped "On ... wrote:" line is quoted history"""
+        body = ("Yes, Thursday works.\n"
+                "On Tue, 4 Mar 2025 at 10:02, Alex Chen <\n"
+                "alex@example.com> wrote:\n"
+                "Can we move the sync?")
+
+        result = normalize_body(body)
+
+        assert result.text == 'Yes, Thursday works.'
+        assert [span.kind for span in result.removed] == ['quote']
+        assert body[result.removed[0].start:result.removed[0].end] == result.removed[0].text
+
+    def test_strips_original_message_separator(self):
+        """Outlook's plain-text separator starts quoted history"""
+        body = "See below.\n-----Original Message-----\nFrom: a@example.com\nPlease sign."
+
+        assert normalize_body(body).text == 'See below.'
+
+    def test_strips_outlook_header_block(self):
+        """An HTML Outlook reply loses its From/Sent/To/Subject history"""
+        text = extract_text((HTML_DIR / 'outlook_reply.html').read_text(encoding='utf-8'))
+
+        result = normalize_body(text)
+
+        assert 'revised SOW' in result.text
+        assert 'attached is the draft' not in result.text
+        assert result.saved_tokens > 0
+
+    def test_strips_signature_footer_and_inline_quotes(self):
+        """Signatures, legal footers and "> " runs are removed separately"""
+        body = ("Short answer: yes.\n"
+                "> Can we ship?\n"
+                "> Really?\n"
+                "Ship it today.\n"
+                "-- \n"
+                "Maria Lopez | Finance\n"
+                "CONFIDENTIALITY NOTICE: This email and any attachments are confidential.")
+
+        result = normalize_body(body)
+
+        assert result.text == 'Short answer: yes.\nShip it today.'
+        assert [span.kind for span in result.removed] == ['quote', 'signature', 'footer']
+        assert result.stats()['savedTokens'] == result.original_tokens - result.tokens
+        assert 'removed' not in result.stats()
+        assert result.stats(include_removed=True)['removed'][1]['text'].startswith('-- ')
+
+    def test_legal_wording_in_the_message_is_kept(self):
+        """Only a trailing footer is stripped, not a sentence that sounds legal"""
+        body = ("Hi team,\n"
+                "Note this message is confidential until the announcement on Friday.\n"
+                "Action items: update the price list and brief the sales team.")
+        assert normalize_body(body).text == body
+
+        body = ("Hi team,\n"
+                "If you are not the intended recipient of the invoice, forward it to accounts.\n"
+                "\n"
+                "Thanks,\n"
+                "Maria")
+        assert normalize_body(body).text == body
+
+    def test_trailing_footer_paragraphs_are_stripped(self):
+        """A footer of several paragraphs after the message is removed whole"""
+        body = ("Please approve the PO today.\n"
+                "\n"
+                "This email and any attachments are confidential and may\n"
+                "be privileged.\n"
+                "\n"
+                "Please consider the environment before printing this email.")
+
+        result = normalize_body(body)
+
+        assert result.text == 'Please approve the PO today.'
+        assert [span.kind for span in result.removed] == ['footer']
+
+    def test_mobile_signature(self):
+        """Mobile client taglines count as signatures"""
+        assert normalize_body('On my way.\nSent from my iPhone').text == 'On my way.'
+
+    def test_bare_forward_kept(self):
+        """A body that would be emptied is returned whole"""
+        body = '-----Original Message-----\nFrom: a@example.com\nInvoice attached.'
+
+        result = normalize_body(body)
+
+        assert result.text == body
+        assert result.removed == []
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import Mock, patch, MagicMock
-from services.cohere_service import CohereService
+from services.cohere_service import CohereService, is_degraded
 import os
 
 @pytest.fixture
@@ -144,4 +144,196 @@ class TestCohereService:
             mock_service.side_effect = Exception("Invalid API Key")
             
             with pytest.raises(Exception):
-                CohereService("invalid_key_12345")
\ No newline at end of file
+                CohereService("invalid_key_12345")
+
+class TestFusedClassification:
+    """Test suite for the single-call classify + extract mode"""
+
+    @pytest.fixture
+    def service(self, cohere_service):
+        cohere_service.client = MagicMock()
+        return cohere_service
+
+    def test_fused_parses_structured_response(self, service):
+        """A well-formed JSON object yields category and items in one call"""
+        service.client.chat.return_value = MagicMock(text=(
+            '```json\n{"category": "Meetings", "action_items": '
+            '[{"task": "Prepare updates", "deadline": "Tomorrow", "priority": "High"}]}\n```'
+        ))
+
+        category, items = service.classify_and_extract('Team meeting tomorrow, prepare updates.')
+
+        assert category == 'Meetings'
+        assert items == [{'task': 'Prepare updates', 'deadline': 'Tomorrow', 'priority': 'High'}]
+        assert service.client.chat.call_count == 1
+
+    def test_fused_falls_back_on_malformed_response(self, service):
+        """Malformed output falls back to the two-call path"""
+        service.client.chat.side_effect = [
+            MagicMock(text='Category: Meetings, tasks: prepare'),
+            MagicMock(text='Meetings'),
+            MagicMock(text='[{"task": "Prepare updates"}]'),
+        ]
+
+        category, items = service.classify_and_extract('Team meeting tomorrow, prepare updates.')
+
+        assert category == 'Meetings'
+        assert items[0]['task'] == 'Prepare updates'
+        assert service.client.chat.call_count == 3
+
+    def test_fused_error_returns_degraded_defaults(self, service):
+        """A failed fused call is not retried as two more calls"""
+        service.client.chat.side_effect = Exception('Service unavailable')
+
+        category, items = service.classify_and_extract('Team meeting tomorrow, prepare updates.')
+
+        assert (category, items) == ('Work', [])
+        assert is_degraded(category) and is_degraded(items)
+        assert service.client.chat.call_count == 1
+
+    def test_usage_counts_calls(self, service):
+        """Each chat call is recorded in the usage counters"""
+        service.client.chat.return_value = MagicMock(text='Work')
+        before = service.usage()['calls']
+
+        service.classify_email('Quarterly report attached')
+
+        assert service.usage()['calls'] == before + 1
+
+
+class TestBatchClassification:
+    """Test suite for multi-email batch classification"""
+
+    @pytest.fixture
+    def service(self, cohere_service):
+        cohere_service.client = MagicMock()
+        return cohere_service
+
+    def test_batch_classifies_in_one_call(self, service):
+        """A batch answer maps IDs to normalized categories"""
+        service.client.chat.return_value = MagicMock(
+            text='{"1": "Meetings", "2": "spam", "3": "Financial."}'
+        )
+
+        categories = service.classify_batch(['Meet at 2', 'Win a prize', 'Invoice due'])
+
+        assert categories == ['Meetings', 'Spam', 'Financial']
+        assert service.client.chat.call_count == 1
+
+    def test_missing_and_invalid_labels_retried(self, service):
+        """Missing or invalid labels fall back to single classification"""
+        service.client.chat.side_effect = [
+            MagicMock(text='{"1": "Meetings", "2": "Banana"}'),
+            MagicMock(text='Legal'),
+            MagicMock(text='HR'),
+        ]
+
+        categories = service.classify_batch(['Meet at 2', 'Contract attached', 'Payroll update'])
+
+        assert categories == ['Meetings', 'Legal', 'HR']
+        assert service.client.chat.call_count == 3
+
+    def test_batches_respect_token_budget(self, service):
+        """Planning splits emails once the token budget is exhausted"""
+        service.batch_token_budget = 1000
+        service.batch_max_size = 50
+        bodies = ['x' * 1200] * 10
+
+        batches = service.plan_classification_batches(bodies)
+
+        assert len(batches) > 1
+        assert sorted(i for batch in batches for i in batch) == list(range(10))
+
+    def test_batches_respect_max_size(self, service):
+        """Planning never exceeds the maximum batch size"""
+        service.batch_max_size = 4
+
+        batches = service.plan_classification_batches(['short'] * 10)
+
+        assert [len(b) for b in batches] == [4, 4, 2]
+
+
+class TestTokenBudgets:
+    """Test suite for per-operation input token budgets"""
+
+    @pytest.fixture
+    def service(self):
+        service = CohereService('test_api_key', token_budgets={'classify': 50})
+        service.client = MagicMock()
+        return service
+
+    def test_long_body_truncated_to_budget(self, service):
+        """Only the head and tail of a long body reach the prompt"""
+        service.client.chat.return_value = MagicMock(text='Work')
+        body = ' '.join(f'Line {i} of the report.' for i in range(100))
+
+        service.classify_email(body)
+
+        prompt = service.client.chat.call_args.kwargs['message']
+        assert 'Line 0 of the report.' in prompt
+        assert 'Line 99 of the report.' in prompt
+        assert 'Line 50 of the report.' not in prompt
+        usage = service.usage()
+        assert usage['truncated_inputs'] == 1
+        assert usage['dropped_tokens'] > 0
+
+    def test_short_body_not_recorded(self, service):
+        """Bodies within budget are sent whole and not counted as truncated"""
+        service.client.chat.return_value = MagicMock(text='[]')
+
+        service.extract_action_items('Please send the invoice.')
+
+        assert 'Please send the invoice.' in service.client.chat.call_args.kwargs['message']
+        assert service.usage()['dropped_tokens'] == 0
+        assert service.token_budgets['action_items'] == 1000
+
+
+class TestStreaming:
+    """Test suite for streamed reply generation and chat"""
+
+    @pytest.fixture
+    def service(self, cohere_service):
+        cohere_service.client = MagicMock()
+        return cohere_service
+
+    @staticmethod
+    def stream(*chunks, fail=False):
+        for chunk in chunks:
+            yield MagicMock(event_type='text-generation', text=chunk)
+        if fail:
+            raise RuntimeError('connection reset')
+        billed = MagicMock(input_tokens=12, output_tokens=3)
+        yield MagicMock(event_type='stream-end', response=MagicMock(meta=MagicMock(billed_units=billed)))
+
+    def test_reply_stream_forwards_deltas(self, service):
+        """Deltas arrive in order and the final event has the full text"""
+        service.client.chat_stream.return_value = self.stream('Thanks, ', 'will do.')
+        before = service.usage()
+
+        events = list(service.generate_reply_stream('Please review.', 'Report'))
+
+        assert [e['delta'] for e in events[:-1]] == ['Thanks, ', 'will do.']
+        assert events[-1] == {'done': True, 'text': 'Thanks, will do.', 'fallback': False}
+        assert service.usage()['output_tokens'] == before['output_tokens'] + 3
+        service.client.chat.assert_not_called()
+
+    def test_reply_stream_failure_returns_fallback(self, service):
+        """A failed stream ends with the same fallback as generate_reply"""
+        service.client.chat_stream.side_effect = RuntimeError('unavailable')
+        service.client.chat.side_effect = RuntimeError('unavailable')
+
+        events = list(service.generate_reply_stream('Please review.', 'Report'))
+
+        assert events[-1]['fallback'] is True
+        assert events[-1]['text'] == service.generate_reply('Please review.', 'Report')
+        assert events[0] == {'delta': events[-1]['text']}
+
+    def test_chat_stream_interrupted_midway(self, service):
+        """Partial output is superseded by the fallback in the final event"""
+        service.client.chat_stream.return_value = self.stream('You have ', fail=True)
+
+        events = list(service.chat_assistant_stream('Summarize', {}))
+
+        assert events[0] == {'delta': 'You have '}
+        assert events[-1]['fallback'] is True
+        assert 'trouble' in events[-1]['text']
@@ -0,0 +1,104 @@
+import pytest
+from unittest.mock import MagicMock
+from services.cohere_service import DEFAULT_PROMPTS, CohereService
+from services.drafts import DraftGenerator
+from services.message_store import MessageStore
+from services.prompt_store import PromptStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MessageStore(str(tmp_path / 'messages.sqlite3'))
+    emails = [
+        {'id': 'm1', 'subject': 'Rate confirmation', 'from': 'ops@client.com', 'to': 'you@oceanai.com',
+         'receivedDateTime': '2025-11-19T12:45:00Z', 'body': 'Please confirm the Q1 rates.', 'isRead': False,
+         'category': 'Clients'},
+        {'id': 'm2', 'subject': 'Q4 Planning', 'from': 'calendar@company.com', 'to': 'you@oceanai.com',
+         'receivedDateTime': '2025-11-23T14:30:00Z', 'body': 'You are invited.', 'isRead': True,
+         'category': 'Meetings'},
+        {'id': 'm3', 'subject': 'Weekly news', 'from': 'news@maritimetrends.com', 'to': 'you@oceanai.com',
+         'receivedDateTime': '2025-11-21T07:00:00Z', 'body': 'Top stories.', 'isRead': False,
+         'category': 'Newsletters'},
+    ]
+    store.upsert_messages(emails)
+    store.save_results(emails)
+    return store
+
+
+@pytest.fixture
+def generator(store, tmp_path):
+    service = CohereService('test_api_key')
+    service.prompt_store = PromptStore(str(tmp_path / 'prompts.json'), DEFAULT_PROMPTS)
+    service.client = MagicMock()
+    service.client.chat.return_value = MagicMock(text='Thanks, the rates are confirmed.')
+    return DraftGenerator(store, service)
+
+
+class TestDraftGenerator:
+    """Test suite for stored drafts and their background generation"""
+
+    def test_pregenerates_unread_high_priority_mail(self, generator, store):
+        """Only unread messages in the configured categories get a draft"""
+        assert generator.run_once() == 1
+
+        draft = generator.ready_draft(store.get_messages(['m1'])[0])
+        assert (draft['id'], draft['origin'], draft['body']) == (
+            'draft_m1', 'pregenerated', 'Thanks, the rates are confirmed.')
+        assert [d['originalEmailId'] for d in store.get_drafts()] == ['m1']
+        assert generator.run_once() == 0
+        assert generator.cohere.client.chat.call_count == 1
+
+    def test_changed_email_invalidates_its_draft(self, generator, store):
+        generator.run_once()
+        email = store.get_messages(['m1'])[0]
+        store.upsert_messages([dict(email, body='Please confirm the Q2 rates.')])
+
+        assert store.get_draft('draft_m1') is None
+        assert generator.ready_draft(store.get_messages(['m1'])[0]) is None
+
+    def test_changed_reply_prompt_invalidates_and_regenerates(self, generator, store):
+        generator.run_once()
+        generator.cohere.update_prompts(dict(DEFAULT_PROMPTS, reply_generation='Reply briefly.'))
+
+        assert generator.invalidate() == 1
+        assert store.get_drafts() == []
+        assert generator.run_once() == 1
+        assert store.get_draft('draft_m1')['promptHash'] == PromptStore.template_hash('Reply briefly.')
+
+    def test_edited_drafts_are_kept_and_flagged_stale(self, generator, store):
+        """User edits survive prompt changes and background runs; email changes mark them stale"""
+        generator.run_once()
+        store.update_draft('draft_m1', {'body': 'Confirmed, see you Monday.'})
+        generator.cohere.update_prompts(dict(DEFAULT_PROMPTS, reply_generation='Reply briefly.'))
+        generator.invalidate()
+        email = store.get_messages(['m1'])[0]
+        store.upsert_messages([dict(email, body='Please confirm the Q2 rates.')])
+
+        assert generator.run_once() == 0
+        draft = generator.ready_draft(email)
+        assert (draft['body'], draft['origin'], draft['stale']) == ('Confirmed, see you Monday.', 'edited', True)
+
+    def test_fallback_replies_are_not_stored(self, generator, store):
+        generator.cohere.client.chat.side_effect = Exception('Service unavailable')
+
+        assert generator.run_once() == 0
+        assert store.get_drafts() == []
+
+    def test_claimed_messages_are_skipped(self, generator, store):
+        """A message another worker is drafting is left to that worker"""
+        assert store.claim_draft('m1', 'other-worker', lease_seconds=60)
+
+        assert generator.run_once() == 0
+        assert generator.cohere.client.chat.call_count == 0
+
+    def test_waits_for_limiter_headroom(self, generator):
+        generator.limiter = MagicMock()
+        generator.limiter.status.return_value = {
+            'state': 'closed', 'in_flight': 6, 'concurrency_limit': 8,
+            'requests_available': None, 'requests_per_minute': 0,
+            'tokens_available': None, 'tokens_per_minute': 0,
+        }
+        assert not generator.idle()
+
+        generator.limiter.status.return_value['in_flight'] = 1
+        assert generator.idle()
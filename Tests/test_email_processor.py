@@ -0,0 +1,297 @@
+import threading
+import time
+
+import pytest
+from unittest.mock import MagicMock
+from services.email_processor import EmailProcessor
+from services.ms_graph_service import oceanai_category, with_oceanai_category
+from services.processing_engine import ProcessingEngine
+
+
+@pytest.fixture
+def engine():
+    """Small engine with a tight Cohere concurrency limit"""
+    engine = ProcessingEngine(max_workers=6, provider_limits={'cohere': 2})
+    yield engine
+    engine.shutdown()
+
+
+@pytest.fixture
+def sample_batch():
+    """Provide a batch of parsed emails"""
+    return [
+        {'id': f'email_{i}', 'subject': f'Subject {i}', 'body': f'Body {i}'}
+        for i in range(10)
+    ]
+
+
+class TestProcessingEngine:
+    """Test suite for the bounded-parallel processing engine"""
+
+    def test_map_preserves_input_order(self, engine):
+        """Results come back in input order regardless of completion order"""
+        def work(n):
+            time.sleep(0.01 * (5 - n % 5))
+            return n * 2
+
+        results = engine.map(work, range(10))
+
+        assert [r for r, _ in results] == [n * 2 for n in range(10)]
+
+    def test_map_isolates_failures(self, engine):
+        """One failing item does not fail the batch"""
+        def work(n):
+            if n == 3:
+                raise ValueError("boom")
+            return n
+
+        results = engine.map(work, range(5))
+
+        assert results[3][0] is None
+        assert isinstance(results[3][1], ValueError)
+        assert [r for r, e in results if e is None] == [0, 1, 2, 4]
+
+    def test_provider_limit_caps_concurrency(self, engine):
+        """No more than the configured number of provider calls run at once"""
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def work(_):
+            with engine.limit('cohere'):
+                with lock:
+                    state['active'] += 1
+                    state['peak'] = max(state['peak'], state['active'])
+                time.sleep(0.02)
+                with lock:
+                    state['active'] -= 1
+
+        engine.map(work, range(12))
+
+        assert state['peak'] == 2
+
+
+class TestEmailProcessor:
+    """Test suite for batch email processing"""
+
+    def test_process_emails_classifies_and_extracts(self, engine, sample_batch):
+        """Each email gets a category and action items in input order"""
+        cohere = MagicMock()
+        cohere.classify_email.side_effect = lambda body: 'Spam' if body == 'Body 2' else 'Work'
+        cohere.extract_action_items.return_value = [{'task': 'Reply', 'deadline': 'Not specified', 'priority': 'Low'}]
+        processor = EmailProcessor(MagicMock(), cohere, engine)
+
+        processed = processor.process_emails(sample_batch)
+
+        assert [e['id'] for e in processed] == [e['id'] for e in sample_batch]
+        assert processed[2]['category'] == 'Spam'
+        assert processed[2]['actionItems'] == []
+        assert processed[0]['actionItems'][0]['task'] == 'Reply'
+        assert cohere.extract_action_items.call_count == 9
+
+    def test_process_emails_survives_single_failure(self, engine, sample_batch):
+        """A malformed email is flagged instead of failing the batch"""
+        cohere = MagicMock()
+        cohere.classify_email.return_value = 'Work'
+        cohere.extract_action_items.return_value = []
+        processor = EmailProcessor(MagicMock(), cohere, engine)
+        del sample_batch[4]['body']
+
+        processed = processor.process_emails(sample_batch)
+
+        assert len(processed) == 10
+        assert 'error' in processed[4]
+        assert all('error' not in e for i, e in enumerate(processed) if i != 4)
+
+    def test_fetch_and_process_uses_engine(self, engine, sample_batch):
+        """fetch_and_process goes through the same batch path"""
+        ms_graph = MagicMock()
+        ms_graph.fetch_emails.return_value = sample_batch
+        cohere = MagicMock()
+        cohere.classify_email.return_value = 'Newsletters'
+        processor = EmailProcessor(ms_graph, cohere, engine)
+
+        processed = processor.fetch_and_process(count=10)
+
+        ms_graph.fetch_emails.assert_called_once_with(10)
+        assert len(processed) == 10
+        cohere.extract_action_items.assert_not_called()
+
+    def test_fused_mode_uses_single_call(self, engine, sample_batch):
+        """Fused mode classifies and extracts with one call per email"""
+        cohere = MagicMock()
+        cohere.classify_and_extract.return_value = ('Promotions', [{'task': 'Buy now'}])
+        processor = EmailProcessor(MagicMock(), cohere, engine)
+
+        processed = processor.process_emails(sample_batch, mode='fused')
+
+        assert cohere.classify_and_extract.call_count == 10
+        cohere.classify_email.assert_not_called()
+        assert all(e['actionItems'] == [] for e in processed)
+
+    def test_unknown_mode_rejected(self, engine, sample_batch):
+        """Unknown processing modes raise before any work is done"""
+        processor = EmailProcessor(MagicMock(), MagicMock(), engine)
+
+        with pytest.raises(ValueError):
+            processor.process_emails(sample_batch, mode='turbo')
+
+    def test_batch_mode_classifies_in_groups(self, engine, sample_batch):
+        """Batch mode classifies per group and extracts per email"""
+        cohere = MagicMock()
+        cohere.plan_classification_batches.return_value = [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]]
+        cohere.classify_batch.side_effect = lambda bodies: ['Spam'] + ['Work'] * (len(bodies) - 1)
+        cohere.extract_action_items.return_value = []
+        processor = EmailProcessor(MagicMock(), cohere, engine)
+
+        processed = processor.process_emails(sample_batch, mode='batch')
+
+        assert cohere.classify_batch.call_count == 2
+        assert cohere.extract_action_items.call_count == 8
+        assert [e['category'] for e in processed][:2] == ['Spam', 'Work']
+        assert processed[5]['category'] == 'Spam'
+
+    def test_quoted_history_stripped_before_llm(self, engine):
+        """Cohere sees only the new text; savings and spans are reported"""
+        email = {'id': 'email_1', 'subject': 'Re: Budget',
+                 'body': 'Approved, go ahead.\nOn Mon, 3 Mar 2025, Ann <ann@example.com> wrote:\n> Can I order the laptops?'}
+        cohere = MagicMock()
+        cohere.classify_email.return_value = 'Work'
+        cohere.extract_action_items.return_value = []
+        processor = EmailProcessor(MagicMock(), cohere, engine)
+
+        processed = processor.process_emails([email], include_removed=True)
+
+        cohere.classify_email.assert_called_once_with('Approved, go ahead.')
+        cohere.extract_action_items.assert_called_once_with('Approved, go ahead.')
+        stats = processed[0]['bodyStats']
+        assert stats['savedTokens'] > 0
+        assert stats['removed'][0]['kind'] == 'quote'
+        assert processed[0]['body'].endswith('laptops?')
+
+    def test_thread_mode_classifies_each_conversation_once(self, engine):
+        """One classify call per thread; repeated action items stay on their first message"""
+        thread = [
+            {'id': 't1', 'conversationId': 'c1', 'receivedDateTime': '2025-11-01T09:00:00Z',
+             'body': 'Please send the customs documents.'},
+            {'id': 't3', 'conversationId': 'c1', 'receivedDateTime': '2025-11-03T09:00:00Z',
+             'body': 'Reminder: send the customs documents by Friday.\n'
+                     'On Sat, 2 Nov 2025, Bo <bo@example.com> wrote:\n> Booked the berth for Monday.'},
+            {'id': 't2', 'conversationId': 'c1', 'receivedDateTime': '2025-11-02T09:00:00Z',
+             'body': 'Booked the berth for Monday.'},
+            {'id': 'solo', 'body': 'Lunch on Friday?'},
+        ]
+        items = {
+            'Please send the customs documents.': [
+                {'task': 'Send the customs documents', 'deadline': 'Not specified', 'priority': 'Medium'}],
+            'Reminder: send the customs documents by Friday.': [
+                {'task': 'send customs documents', 'deadline': 'Friday', 'priority': 'High'},
+                {'task': 'Confirm berth booking', 'deadline': 'Monday', 'priority': 'Low'}],
+        }
+        cohere = MagicMock()
+        cohere.classify_email.return_value = 'Work'
+        cohere.extract_action_items.side_effect = lambda body: items.get(body, [])
+        processor = EmailProcessor(MagicMock(), cohere, engine)
+
+        processed = processor.process_emails(thread, mode='thread')
+
+        assert cohere.classify_email.call_count == 2
+        thread_text = cohere.classify_email.call_args_list[0].args[0]
+        assert thread_text.startswith('Reminder') and '> Booked' not in thread_text
+        assert processed[0]['actionItems'] == [
+            {'task': 'Send the customs documents', 'deadline': 'Friday', 'priority': 'High'}]
+        assert processed[1]['actionItems'] == [
+            {'task': 'Confirm berth booking', 'deadline': 'Monday', 'priority': 'Low'}]
+        assert [e['category'] for e in processed] == ['Work'] * 4
+
+    def test_thread_mode_continues_stored_threads(self, engine, tmp_path):
+        """A new reply reuses the stored thread category and skips known items"""
+        from services.message_store import MessageStore
+        store = MessageStore(str(tmp_path / 'messages.sqlite3'))
+        first = {'id': 'r1', 'conversationId': 'c9', 'receivedDateTime': '2025-11-01T09:00:00Z',
+                 'body': 'Please sign the charter contract.'}
+        store.upsert_messages([first])
+        store.save_results([dict(first, category='Legal', actionItems=[{'task': 'Sign the charter contract'}])])
+        cohere = MagicMock()
+        cohere.extract_action_items.return_value = [{'task': 'sign charter contract'}, {'task': 'Return a copy'}]
+        processor = EmailProcessor(MagicMock(), cohere, engine, store=store)
+
+        processed = processor.process_emails(
+            [{'id': 'r2', 'conversationId': 'c9', 'receivedDateTime': '2025-11-02T09:00:00Z',
+              'body': 'Still waiting for the signed contract, and return a copy.'}],
+            mode='thread'
+        )
+
+        cohere.classify_email.assert_not_called()
+        assert processed[0]['category'] == 'Legal'
+        assert [item['task'] for item in processed[0]['actionItems']] == ['Return a copy']
+
+    def test_outlook_tagged_messages_skip_the_llm(self, engine, tmp_path):
+        """A category written back to Outlook is reused with the stored action items"""
+        from services.message_store import MessageStore
+        store = MessageStore(str(tmp_path / 'messages.sqlite3'))
+        email = {'id': 'o1', 'subject': 'Rates', 'body': 'Please confirm the Q1 rates.',
+                 'categories': ['Blue category', 'OceanAI: Clients']}
+        store.upsert_messages([email])
+        store.save_results([dict(email, category='Clients', actionItems=[{'task': 'Confirm Q1 rates'}])])
+        cohere = MagicMock()
+        processor = EmailProcessor(MagicMock(), cohere, engine, store=store)
+
+        processed = processor.process_emails([dict(email), dict(email, id='o2', categories=['OceanAI: Spam'])])
+
+        cohere.classify_email.assert_not_called()
+        cohere.extract_action_items.assert_not_called()
+        assert [(e['category'], e['actionItems']) for e in processed] == [
+            ('Clients', [{'task': 'Confirm Q1 rates'}]), ('Spam', [])]
+
+    def test_unknown_outlook_tag_is_classified(self, engine):
+        """A hand-made 'OceanAI: ...' tag naming no known category is not trusted"""
+        cohere = MagicMock()
+        cohere.classify_email.return_value = 'Work'
+        cohere.extract_action_items.return_value = []
+        processor = EmailProcessor(MagicMock(), cohere, engine)
+
+        processed = processor.process_emails([{'id': 'o3', 'body': 'Status update attached.',
+                                               'categories': ['OceanAI: Urgent stuff']}])
+
+        cohere.classify_email.assert_called_once()
+        assert processed[0]['category'] == 'Work'
+
+    def test_written_tags_are_kept_in_the_store(self, engine, tmp_path):
+        """A message tagged once is not written again when processed from the store"""
+        from services.message_store import MessageStore
+        store = MessageStore(str(tmp_path / 'messages.sqlite3'))
+        store.upsert_messages([{'id': 'w1', 'subject': 'Rates', 'body': 'Please confirm the Q1 rates.',
+                                'categories': []}])
+        cohere = MagicMock()
+        cohere.classify_email.return_value = 'Clients'
+        cohere.extract_action_items.return_value = []
+
+        def write_back(emails, flag_priority):
+            results = []
+            for email in emails:
+                if oceanai_category(email['categories']) != email['category']:
+                    email['categories'] = with_oceanai_category(email['categories'], email['category'])
+                    results.append({'id': email['id'], 'success': True})
+            return results
+
+        ms_graph = MagicMock()
+        ms_graph.write_back_categories.side_effect = write_back
+        processor = EmailProcessor(ms_graph, cohere, engine, store=store, write_back=True)
+
+        processor.process_emails(store.get_messages(['w1']))
+        processor.process_emails(store.get_messages(['w1']))
+
+        assert store.get_messages(['w1'])[0]['categories'] == ['OceanAI: Clients']
+        assert cohere.classify_email.call_count == 1
+
+    def test_results_are_written_back_to_outlook(self, engine, sample_batch):
+        cohere = MagicMock()
+        cohere.classify_email.return_value = 'Work'
+        cohere.extract_action_items.return_value = []
+        ms_graph = MagicMock()
+        ms_graph.write_back_categories.return_value = []
+        processor = EmailProcessor(ms_graph, cohere, engine, write_back=True, flag_priority=True)
+
+        processed = processor.process_emails(sample_batch[:2])
+
+        ms_graph.write_back_categories.assert_called_once_with(processed, True)
@@ -0,0 +1,156 @@
+import json
+import random
+from pathlib import Path
+
+import pytest
+from unittest.mock import MagicMock
+from services.email_processor import EmailProcessor
+from services.fast_classifier import FastClassifier
+from services.processing_engine import ProcessingEngine
+
+MOCK_INBOX = Path(__file__).parent.parent / 'backend' / 'data' / 'mock_inbox.json'
+
+
+@pytest.fixture
+def classifier(tmp_path):
+    """Fast classifier with sampling disabled and a small training floor"""
+    return FastClassifier(str(tmp_path / 'fast.json'), sample_rate=0.0, min_training=20)
+
+
+@pytest.fixture
+def mock_inbox():
+    with open(MOCK_INBOX) as f:
+        return {email['id']: email for email in json.load(f)}
+
+
+def _email(sender, subject, body):
+    return {'from': sender, 'subject': subject, 'body': body}
+
+
+class TestFastClassifier:
+    """Test suite for the local pre-classifier"""
+
+    def test_rules_label_obvious_mail(self, classifier, mock_inbox):
+        """Calendar invites, newsletters, promos and prize spam skip the LLM"""
+        expected = {
+            'email_002': 'Meetings',
+            'email_003': 'Newsletters',
+            'email_004': 'Spam',
+            'email_012': 'Promotions',
+        }
+        for email_id, category in expected.items():
+            prediction = classifier.predict(mock_inbox[email_id])
+            assert prediction.category == category
+            assert prediction.source == 'rule'
+
+    def test_unclear_mail_falls_back_to_llm(self, classifier, mock_inbox):
+        """Ordinary work mail is left for the LLM"""
+        prediction = classifier.predict(mock_inbox['email_011'])
+
+        assert prediction.category is None
+        assert classifier.stats()['llm_fallbacks'] == 1
+
+    def test_list_footer_in_body_is_not_a_newsletter(self, classifier):
+        """An unsubscribe link in the body alone doesn't label work mail"""
+        prediction = classifier.predict(_email(
+            'pm@oceanai.com', 'Re: vessel schedule for next week',
+            'Updated ETAs attached.\n--\nYou received this via the ops list. Unsubscribe: https://lists.example/ops'))
+
+        assert prediction.category is None
+
+    def test_account_notice_is_not_spam(self, classifier):
+        """An IT notice asking to verify an account is left for the LLM"""
+        prediction = classifier.predict(_email(
+            'it-support@oceanai.com', 'Action needed: mailbox migration',
+            'We are moving mailboxes this weekend. Please verify your account details in the portal.'))
+
+        assert prediction.category is None
+
+    def test_unsubscribe_in_subject_is_not_a_newsletter(self, classifier):
+        prediction = classifier.predict(_email(
+            'ops@oceanai.com', 'Re: how do I unsubscribe the vessel alerts?', 'They go to the old team alias.'))
+
+        assert prediction.category is None
+
+    def test_model_learns_from_llm_labels(self, classifier):
+        """The naive Bayes model takes over once trained on LLM labels"""
+        for i in range(30):
+            classifier.observe(_email(f'billing{i}@vendor.com', f'Invoice {i} due',
+                                      'Payment for invoice is due, remit amount'), None, 'Financial')
+            classifier.observe(_email(f'hr{i}@oceanai.com', f'Benefits enrollment {i}',
+                                      'Open enrollment for benefits and payroll forms'), None, 'HR')
+
+        prediction = classifier.predict(_email('ap@supplier.com', 'Invoice 99 due',
+                                               'Payment for invoice is due'))
+
+        assert prediction.category == 'Financial'
+        assert prediction.source == 'model'
+
+    def test_model_without_signal_defers_to_llm(self, classifier):
+        """Labels unrelated to the text never give a confident model prediction"""
+        rng = random.Random(7)
+        words = 'project status update report meeting budget review team client plan'.split()
+        for i in range(300):
+            classifier.observe(_email(f'user{i}@oceanai.com', ' '.join(rng.choices(words, k=3)),
+                                      ' '.join(rng.choices(words, k=20))), None,
+                               rng.choice(['Work', 'Clients', 'HR']))
+
+        for _ in range(20):
+            prediction = classifier.predict(_email('someone@oceanai.com', ' '.join(rng.choices(words, k=3)),
+                                                   ' '.join(rng.choices(words, k=20))))
+            assert prediction.category is None
+            assert prediction.confidence < classifier.threshold
+
+    def test_sampled_disagreement_is_counted(self, tmp_path, mock_inbox):
+        """Sampled fast-path labels are checked against the LLM"""
+        classifier = FastClassifier(str(tmp_path / 'fast.json'), sample_rate=1.0)
+        prediction = classifier.predict(mock_inbox['email_012'])
+        assert prediction.audit
+
+        classifier.observe(mock_inbox['email_012'], prediction, 'Work')
+        stats = classifier.stats()
+
+        assert stats['sampled'] == 1
+        assert stats['disagreements'] == 1
+        assert stats['disagreement_rate'] == 1.0
+
+    def test_model_persists(self, classifier, tmp_path):
+        """Saved counts are restored by a new instance"""
+        classifier.observe(_email('a@b.com', 'Hello', 'Quarterly numbers'), None, 'Work')
+        classifier.save()
+
+        restored = FastClassifier(str(tmp_path / 'fast.json'))
+
+        assert restored.stats()['training_examples'] == 1
+
+    def test_saves_from_workers_are_merged(self, tmp_path):
+        """Each worker's save adds its counts to the file instead of replacing it"""
+        path = str(tmp_path / 'fast.json')
+        first, second = FastClassifier(path), FastClassifier(path)
+        first.observe(_email('a@b.com', 'Invoice', 'Payment due'), None, 'Financial')
+        second.observe(_email('c@d.com', 'Benefits', 'Open enrollment'), None, 'HR')
+        second.observe(_email('e@f.com', 'Payroll', 'Payslips attached'), None, 'HR')
+
+        first.save()
+        second.save()
+        first.save()
+
+        restored = FastClassifier(path)
+        assert restored.stats()['training_examples'] == 3
+        assert restored._class_docs == {'Financial': 1, 'HR': 2}
+        assert first._class_docs == {'Financial': 1, 'HR': 2}
+
+    def test_processor_skips_llm_on_fast_hit(self, classifier, mock_inbox):
+        """EmailProcessor only calls Cohere for emails the fast path cannot label"""
+        cohere = MagicMock()
+        cohere.classify_email.return_value = 'Legal'
+        cohere.extract_action_items.return_value = []
+        engine = ProcessingEngine(max_workers=2)
+        processor = EmailProcessor(MagicMock(), cohere, engine, classifier)
+
+        processed = processor.process_emails([dict(mock_inbox['email_004']), dict(mock_inbox['email_011'])])
+
+        assert [e['category'] for e in processed] == ['Spam', 'Legal']
+        cohere.classify_email.assert_called_once()
+        assert classifier.stats()['trained'] == 1
+        engine.shutdown()
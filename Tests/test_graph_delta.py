@@ -0,0 +1,88 @@
+import json
+from pathlib import Path
+
+import pytest
+from services.ms_graph_service import MSGraphService
+from fake_graph_server import FakeGraphServer
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+@pytest.fixture
+def graph_server():
+    """Local stand-in Graph server serving recorded delta pages"""
+    server = FakeGraphServer()
+    server.load(FIXTURES / 'graph_delta_pages.json')
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def ms_graph(graph_server, tmp_path):
+    """MS Graph service pointed at the stand-in server"""
+    service = MSGraphService('test_app_id', ['Mail.Read'], base_url=graph_server.base_url)
+    service.delta_state_file = str(tmp_path / 'delta_tokens.json')
+    service.get_access_token = lambda: 'test_token'
+    return service
+
+
+class TestDeltaSync:
+    """Test suite for incremental mailbox sync"""
+
+    def test_full_sync_follows_pages(self, ms_graph, graph_server):
+        """The first sync walks every page and stores the delta link"""
+        result = ms_graph.sync_emails(account_key='user-1')
+
+        assert result['full_sync'] is True
+        assert [e['id'] for e in result['changed']] == ['msg-1', 'msg-2', 'msg-3']
+        assert result['changed'][0]['body'] == 'Vessel 1 is on schedule.'
+        assert result['removed'] == []
+        assert len(graph_server.requests) == 2
+        with open(ms_graph.delta_state_file) as f:
+            assert json.load(f)['user-1:inbox'].endswith('$deltatoken=token-1')
+
+    def test_incremental_sync_returns_only_changes(self, ms_graph, graph_server):
+        """The next sync resumes from the stored delta link"""
+        ms_graph.sync_emails(account_key='user-1')
+        graph_server.requests.clear()
+
+        result = ms_graph.sync_emails(account_key='user-1')
+
+        assert result['full_sync'] is False
+        assert [e['id'] for e in result['changed']] == ['msg-2']
+        assert result['changed'][0]['isRead'] is True
+        assert result['removed'] == ['msg-1']
+        assert len(graph_server.requests) == 1
+
+    def test_delta_state_is_per_account(self, ms_graph):
+        """Each account keeps its own delta link"""
+        ms_graph.sync_emails(account_key='user-1')
+
+        result = ms_graph.sync_emails(account_key='user-2')
+
+        assert result['full_sync'] is True
+
+    def test_expired_token_triggers_full_sync(self, ms_graph, graph_server):
+        """A 410 from Graph resets the delta state and resyncs"""
+        ms_graph._save_delta_link('user-1:inbox', graph_server.base_url + 'me/mailFolders/inbox/messages/delta?$deltatoken=expired')
+
+        result = ms_graph.sync_emails(account_key='user-1')
+
+        assert result['full_sync'] is True
+        assert len(result['changed']) == 3
+
+    def test_page_size_is_requested(self, ms_graph, graph_server):
+        """Page size is passed through the odata.maxpagesize preference"""
+        ms_graph.sync_emails(account_key='user-1', page_size=2)
+
+        assert graph_server.requests[0]['headers']['Prefer'] == 'odata.maxpagesize=2'
+
+    def test_text_body_preference_is_combined(self, ms_graph, graph_server):
+        """Delta pages carry the bodies, so the plain-text preference goes on them"""
+        ms_graph.prefer_text_body = True
+        ms_graph.sync_emails(account_key='user-1', page_size=2)
+
+        assert graph_server.requests[0]['headers']['Prefer'] == (
+            'odata.maxpagesize=2, outlook.body-content-type="text"'
+        )
@@ -0,0 +1,217 @@
+import pytest
+import requests
+from unittest.mock import patch
+from services.graph_transport import GraphTransport
+from services.ms_graph_service import MSGraphService
+from fake_graph_server import FakeGraphServer
+
+THROTTLED = {'status': 429, 'body': {'error': {'code': 'TooManyRequests'}}, 'headers': {'Retry-After': '2'}}
+UNAVAILABLE = {'status': 503, 'body': {'error': {'code': 'ServiceUnavailable'}}}
+OK = {'status': 200, 'body': {'value': []}}
+
+
+def batch_response(*items):
+    """``$batch`` response body with ``(status, body, headers)`` per request id, in order"""
+    return {'status': 200, 'body': {'responses': [
+        {'id': str(n), 'status': status, 'body': body, 'headers': headers}
+        for n, (status, body, headers) in enumerate(items)
+    ]}}
+
+
+@pytest.fixture
+def graph_server():
+    """Local stand-in Graph server"""
+    server = FakeGraphServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def transport():
+    """Transport that records sleeps instead of waiting"""
+    transport = GraphTransport(max_retries=3, backoff_base=0.1)
+    transport.sleeps = []
+    transport._sleep = transport.sleeps.append
+    yield transport
+    transport.close()
+
+
+class TestGraphTransport:
+    """Test suite for the pooled Graph transport"""
+
+    def test_retry_after_is_honoured(self, transport, graph_server):
+        """Throttled responses wait for Retry-After before retrying"""
+        graph_server.add_sequence('GET', '/v1.0/me/messages', [THROTTLED, OK])
+
+        response = transport.get(graph_server.base_url + 'me/messages')
+
+        assert response.status_code == 200
+        assert transport.sleeps == [2.0]
+
+    def test_backoff_with_jitter_when_no_header(self, transport, graph_server):
+        """Without Retry-After the delay is jittered exponential backoff"""
+        graph_server.add_sequence('GET', '/v1.0/me/messages', [UNAVAILABLE, UNAVAILABLE, OK])
+
+        transport.get(graph_server.base_url + 'me/messages')
+
+        assert len(transport.sleeps) == 2
+        assert 0 <= transport.sleeps[0] <= 0.1
+        assert 0 <= transport.sleeps[1] <= 0.2
+
+    def test_gives_up_after_max_retries(self, transport, graph_server):
+        """The last throttled response is returned once retries run out"""
+        graph_server.add_route('GET', '/v1.0/me/messages', THROTTLED['body'], status=429)
+
+        response = transport.get(graph_server.base_url + 'me/messages')
+
+        assert response.status_code == 429
+        assert transport.stats()['GET /v1.0/me/messages']['retries'] == 3
+
+    def test_post_not_retried_on_connection_error(self, transport):
+        """A POST that may have reached the server is not resent"""
+        with patch.object(transport.session, 'request', side_effect=requests.ConnectionError()) as send:
+            with pytest.raises(requests.ConnectionError):
+                transport.post('https://graph.example/v1.0/me/sendMail', json={})
+
+        assert send.call_count == 1
+
+    def test_post_not_resent_on_unavailable_without_retry_after(self, transport, graph_server):
+        """A sendMail answered 503/504 may have been delivered, so it is sent once"""
+        graph_server.add_sequence('POST', '/v1.0/me/sendMail', [UNAVAILABLE, {'status': 202, 'body': None}])
+
+        response = transport.post(graph_server.base_url + 'me/sendMail', json={})
+
+        assert response.status_code == 503
+        assert len(graph_server.requests) == 1
+        assert transport.sleeps == []
+
+    def test_post_resent_when_throttled(self, transport, graph_server):
+        graph_server.add_sequence('POST', '/v1.0/me/sendMail', [THROTTLED, {'status': 202, 'body': None}])
+
+        response = transport.post(graph_server.base_url + 'me/sendMail', json={})
+
+        assert response.status_code == 202
+        assert len(graph_server.requests) == 2
+
+    def test_retry_after_is_capped(self, transport, graph_server):
+        transport.retry_after_max = 5.0
+        graph_server.add_sequence('GET', '/v1.0/me/messages', [
+            {'status': 429, 'body': {}, 'headers': {'Retry-After': '3600'}}, OK
+        ])
+
+        transport.get(graph_server.base_url + 'me/messages')
+
+        assert transport.sleeps == [5.0]
+
+    def test_stats_collapse_ids(self, transport, graph_server):
+        """Per-endpoint stats group requests by route, not message id"""
+        for message_id in ('AAMkADM5ZDU1111AAA=', 'AAMkADM5ZDU2222BBB='):
+            graph_server.add_route('GET', f'/v1.0/me/messages/{message_id}', {'id': message_id})
+            transport.get(graph_server.base_url + f'me/messages/{message_id}')
+
+        stats = transport.stats()['GET /v1.0/me/messages/{id}']
+
+        assert stats['requests'] == 2
+        assert stats['errors'] == 0
+        assert stats['latency_ms_avg'] > 0
+
+    def test_service_uses_shared_session(self, transport, graph_server):
+        """MSGraphService routes its calls through the transport"""
+        graph_server.add_route('GET', '/v1.0/me/messages?$top=5', {'value': []})
+        service = MSGraphService('test_app_id', ['Mail.Read'], base_url=graph_server.base_url,
+                                 transport=transport)
+        service.get_access_token = lambda: 'test_token'
+
+        assert service.fetch_emails(5) == []
+        assert 'GET /v1.0/me/messages' in transport.stats()
+
+
+class TestGraphBatch:
+    """Test suite for Graph JSON batching"""
+
+    def test_operations_are_split_into_batches_of_20(self, transport, graph_server):
+        graph_server.add_sequence('POST', '/v1.0/$batch', [
+            batch_response(*[(200, {}, {})] * 20),
+            batch_response(*[(200, {}, {})] * 5),
+        ])
+        operations = [{'method': 'PATCH', 'url': f'/me/messages/m{n}', 'body': {'isRead': True}} for n in range(25)]
+
+        results = transport.batch(graph_server.base_url, operations)
+
+        assert [len(r['body']['requests']) for r in graph_server.requests] == [20, 5]
+        assert graph_server.requests[1]['body']['requests'][0]['url'] == '/me/messages/m20'
+        assert all(result['status'] == 200 for result in results)
+
+    def test_throttled_items_are_resent_after_retry_after(self, transport, graph_server):
+        """Only the throttled items go into the next batch, after their Retry-After"""
+        graph_server.add_sequence('POST', '/v1.0/$batch', [
+            batch_response((202, None, {}), (429, THROTTLED['body'], {'Retry-After': '3'}), (202, None, {})),
+            batch_response((202, None, {})),
+        ])
+        operations = [{'method': 'POST', 'url': '/me/sendMail', 'body': {'n': n}} for n in range(3)]
+
+        results = transport.batch(graph_server.base_url, operations)
+
+        assert [(r['status'], r['retries']) for r in results] == [(202, 0), (202, 1), (202, 0)]
+        assert transport.sleeps == [3.0]
+        assert graph_server.requests[1]['body']['requests'] == [
+            {'id': '0', 'method': 'POST', 'url': '/me/sendMail', 'body': {'n': 1},
+             'headers': {'Content-Type': 'application/json'}}
+        ]
+
+    def test_failed_batch_call_is_not_resent_for_sends(self, transport, graph_server):
+        """A 503 without Retry-After may have delivered the mail: one attempt, reported as failed"""
+        graph_server.add_route('POST', '/v1.0/$batch', UNAVAILABLE['body'], status=503)
+        operations = [{'method': 'POST', 'url': '/me/sendMail', 'body': {'n': n}} for n in range(2)]
+
+        results = transport.batch(graph_server.base_url, operations)
+
+        assert len(graph_server.requests) == 1
+        assert [r['status'] for r in results] == [503, 503]
+
+    def test_failed_batch_call_is_resent_for_idempotent_items(self, transport, graph_server):
+        graph_server.add_route('POST', '/v1.0/$batch', UNAVAILABLE['body'], status=503)
+        operations = [{'method': 'PATCH', 'url': '/me/messages/m1', 'body': {'isRead': True}}]
+
+        results = transport.batch(graph_server.base_url, operations)
+
+        assert len(graph_server.requests) == 1 + transport.max_retries
+        assert results[0]['retries'] == transport.max_retries
+
+    def test_send_mails_reports_each_message(self, transport, graph_server):
+        graph_server.add_route('POST', '/v1.0/$batch', batch_response(
+            (202, None, {}),
+            (400, {'error': {'code': 'ErrorInvalidRecipients', 'message': 'Invalid recipient'}}, {}),
+        )['body'])
+        service = MSGraphService('test_app_id', ['Mail.Send'], base_url=graph_server.base_url,
+                                 transport=transport)
+        service.get_access_token = lambda: 'test_token'
+
+        results = service.send_mails([
+            {'subject': 'Re: Rates', 'body': 'Confirmed.', 'to': 'ops@client.com'},
+            {'subject': 'Re: Rates', 'body': 'Confirmed.', 'to': 'not-an-address'},
+        ])
+
+        assert [(r['success'], r['status'], r['error']) for r in results] == [
+            (True, 202, None), (False, 400, 'Invalid recipient')]
+        assert graph_server.requests[0]['headers']['Authorization'] == 'Bearer test_token'
+
+    def test_categories_written_back_keep_the_users_own(self, transport, graph_server):
+        """Only untagged or retagged messages are patched; High priority ones are flagged"""
+        graph_server.add_route('POST', '/v1.0/$batch', batch_response((200, {}, {}))['body'])
+        service = MSGraphService('test_app_id', ['Mail.ReadWrite'], base_url=graph_server.base_url,
+                                 transport=transport)
+        service.get_access_token = lambda: 'test_token'
+        emails = [
+            {'id': 'm1', 'category': 'Clients', 'categories': ['Red category', 'OceanAI: Work'],
+             'actionItems': [{'task': 'Confirm rates', 'priority': 'High'}]},
+            {'id': 'm2', 'category': 'Work', 'categories': ['OceanAI: Work']},
+            {'id': 'm3', 'category': 'Work', 'categories': [], 'degraded': True},
+        ]
+
+        results = service.write_back_categories(emails, flag_priority=True)
+
+        assert [(r['id'], r['success']) for r in results] == [('m1', True)]
+        assert graph_server.requests[0]['body']['requests'][0]['body'] == {
+            'categories': ['Red category', 'OceanAI: Clients'], 'flag': {'flagStatus': 'flagged'}}
+        assert emails[0]['categories'] == ['Red category', 'OceanAI: Clients']
@@ -0,0 +1,102 @@
+import random
+from pathlib import Path
+
+import pytest
+from services.html_extractor import EXTRACTORS, extract_text, extract_text_bs4, extract_text_stream
+from services.ms_graph_service import MSGraphService
+from fake_graph_server import FakeGraphServer
+
+HTML_DIR = Path(__file__).parent / 'fixtures' / 'html'
+CORPUS = sorted(HTML_DIR.glob('*.html'))
+
+# Building blocks for randomly generated, frequently malformed markup
+FRAGMENTS = [
+    '<body>', '</body>', '<p>', '</p>', '<br>', '</br>', '<br/>', '<pre>', '</pre>',
+    '<script>var a = "<b>x</b>";</script>', '<style>p {}</style>', '<template>', '</template>',
+    '<rt>', '</rt>', '<b>', '</b>', '<div>', '</div>', '<!-- note -->', '<![CDATA[raw]]>',
+    '<?xml version="1.0"?>', '<!DOCTYPE html>', ' ', '\n', '  \n ', '\t', 'text', '&amp;',
+    '&nbsp;', '&#150;', '&#x41;', '&bogus;', '&', '<', '>', '<img src="x">', '</img>',
+    '<textarea>', '</textarea>', '<hr/>', '\r\n', '<a href="x">', '</a>', '<td>', '</td>', 'café',
+]
+
+
+def read(path):
+    return path.read_text(encoding='utf-8')
+
+
+class TestHtmlExtractor:
+    """Test suite for the pluggable HTML-to-text extractors"""
+
+    @pytest.mark.parametrize('path', CORPUS, ids=lambda p: p.stem)
+    def test_stream_matches_bs4_on_corpus(self, path):
+        """The streaming engine reproduces the reference output exactly"""
+        html = read(path)
+
+        assert extract_text(html, engine='stream') == extract_text(html, engine='bs4')
+
+    def test_stream_matches_bs4_on_random_markup(self):
+        """Tag soup, stray end tags and entities are handled the same way"""
+        rnd = random.Random(1234)
+        for _ in range(500):
+            html = ''.join(rnd.choice(FRAGMENTS) for _ in range(rnd.randint(1, 30)))
+            assert extract_text_stream(html) == extract_text_bs4(html), html
+
+    def test_drops_head_scripts_and_comments(self):
+        """Only visible body text survives"""
+        text = extract_text(read(HTML_DIR / 'marketing_newsletter.html'))
+
+        assert 'Spring\xa0Sale – 30% off' in text
+        assert 'Don’t miss out!' in text
+        assert 'tracking' not in text
+        assert 'margin:0' not in text
+
+    def test_text_body_skips_parsing(self):
+        """Plain-text bodies are returned as-is apart from newline cleanup"""
+        body = '  Use <b> literally & keep it\r\n\r\nSecond line  '
+
+        assert extract_text(body, 'text') == 'Use <b> literally & keep it\nSecond line'
+        assert extract_text(body, 'Text') == extract_text(body, 'text')
+
+    def test_empty_and_unknown_engine(self):
+        """Empty bodies short-circuit and unknown engines are rejected"""
+        assert extract_text('') == ''
+        assert extract_text(None) == ''
+        with pytest.raises(ValueError):
+            extract_text('<p>x</p>', engine='missing')
+        assert set(EXTRACTORS) >= {'bs4', 'stream'}
+
+
+class TestTextBodyPreference:
+    """Test suite for asking Graph for plain-text bodies"""
+
+    @pytest.fixture
+    def graph_server(self):
+        server = FakeGraphServer()
+        server.add_route('GET', '/v1.0/me/messages?$top=1', {'value': [{
+            'id': 'msg-1',
+            'subject': 'Hello',
+            'body': {'contentType': 'text', 'content': 'a < b\r\n\r\nc'}
+        }]})
+        server.start()
+        yield server
+        server.stop()
+
+    def test_prefer_header_and_text_body(self, graph_server):
+        """The Prefer header is sent and the text body is not parsed as HTML"""
+        service = MSGraphService('test_app_id', ['Mail.Read'], base_url=graph_server.base_url,
+                                 prefer_text_body=True)
+        service.get_access_token = lambda: 'test_token'
+
+        emails = service.fetch_emails(1)
+
+        assert emails[0]['body'] == 'a < b\nc'
+        assert graph_server.requests[0]['headers']['Prefer'] == 'outlook.body-content-type="text"'
+
+    def test_no_prefer_header_by_default(self, graph_server):
+        """HTML bodies stay the default"""
+        service = MSGraphService('test_app_id', ['Mail.Read'], base_url=graph_server.base_url)
+        service.get_access_token = lambda: 'test_token'
+
+        service.fetch_emails(1)
+
+        assert 'Prefer' not in graph_server.requests[0]['headers']
@@ -0,0 +1,155 @@
+import time
+
+import pytest
+from unittest.mock import MagicMock
+from services.job_queue import JobQueue
+from services.job_worker import JobWorker
+from services.message_store import MessageStore
+
+
+@pytest.fixture
+def queue(tmp_path):
+    """Job queue backed by a temporary SQLite file"""
+    return JobQueue(str(tmp_path / 'jobs.sqlite3'), lease_seconds=60)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Message store holding a few parsed emails"""
+    store = MessageStore(str(tmp_path / 'messages.sqlite3'))
+    store.upsert_messages([
+        {'id': f'email_{i}', 'subject': f'Subject {i}', 'body': f'Body {i}'}
+        for i in range(5)
+    ])
+    return store
+
+
+@pytest.fixture
+def processor(store):
+    """EmailProcessor stand-in that labels every email as Work"""
+    processor = MagicMock()
+    processor.store = store
+
+    def process_emails(emails, mode='standard'):
+        for email in emails:
+            email['category'] = 'Work'
+            email['actionItems'] = []
+        return emails
+
+    processor.process_emails.side_effect = process_emails
+    return processor
+
+
+class TestJobQueue:
+    """Test suite for the durable job queue"""
+
+    def test_submit_and_claim(self, queue):
+        """A submitted job is claimed once, with its payload"""
+        job_id = queue.submit('process', {'ids': ['a', 'b'], 'mode': 'batch'})
+
+        assert queue.get(job_id)['status'] == 'queued'
+        assert queue.get(job_id)['total'] == 2
+        claimed = queue.claim('worker-1')
+        assert claimed == (job_id, 'process', {'ids': ['a', 'b'], 'mode': 'batch'}, 0)
+        assert queue.claim('worker-2') is None
+        assert queue.get(job_id)['status'] == 'running'
+
+    def test_unknown_type_rejected(self, queue):
+        with pytest.raises(ValueError):
+            queue.submit('delete_everything', {})
+
+    def test_results_are_incremental(self, queue):
+        """Results are numbered so clients can fetch only new ones"""
+        job_id = queue.submit('process', {'ids': ['a', 'b', 'c']})
+        queue.claim('worker-1')
+
+        queue.add_results(job_id, [{'id': 'a'}, {'id': 'b', 'error': 'boom'}])
+        queue.add_results(job_id, [{'id': 'c'}])
+
+        job = queue.get(job_id)
+        assert (job['done'], job['failed']) == (2, 1)
+        assert [r['id'] for r in queue.results(job_id)] == ['a', 'b', 'c']
+        assert [r['seq'] for r in queue.results(job_id, after=2)] == [3]
+
+    def test_expired_lease_resumes_after_saved_results(self, queue):
+        """A job whose worker died is reclaimed from where it stopped"""
+        job_id = queue.submit('process', {'ids': ['a', 'b', 'c']})
+        queue.claim('worker-1')
+        queue.add_results(job_id, [{'id': 'a'}])
+        queue.lease_seconds = -1
+        queue.heartbeat(job_id, 'worker-1')
+
+        claimed = queue.claim('worker-2')
+
+        assert claimed[0] == job_id
+        assert claimed[3] == 1
+        assert queue.heartbeat(job_id, 'worker-1') is False
+
+    def test_cancel(self, queue):
+        """Cancelled jobs are not claimed and stop heartbeating"""
+        job_id = queue.submit('process', {'ids': ['a']})
+
+        assert queue.cancel(job_id) is True
+        assert queue.claim('worker-1') is None
+        assert queue.get(job_id)['status'] == 'cancelled'
+        assert queue.cancel(job_id) is False
+
+
+class TestJobWorker:
+    """Test suite for running jobs through the email processor"""
+
+    def test_process_job_in_chunks(self, queue, processor):
+        """Every chunk is saved and the job completes"""
+        job_id = queue.submit('process', {'ids': ['email_0', 'email_1', 'missing', 'email_3'], 'mode': 'fused'})
+        worker = JobWorker(queue, processor, chunk_size=2)
+
+        assert worker.run_once() is True
+
+        job = queue.get(job_id)
+        assert job['status'] == 'completed'
+        assert (job['done'], job['failed']) == (3, 1)
+        results = queue.results(job_id)
+        assert [r['id'] for r in results] == ['email_0', 'email_1', 'missing', 'email_3']
+        assert results[2]['error'] == 'Message not found'
+        assert processor.process_emails.call_count == 2
+        assert processor.process_emails.call_args.args[1] == 'fused'
+        assert worker.run_once() is False
+
+    def test_fetch_and_process_pins_ids(self, queue, processor, store):
+        """Fetched messages are stored and the job remembers their IDs"""
+        processor.ms_graph.fetch_emails.return_value = [
+            {'id': 'new_1', 'subject': 'Hi', 'body': 'Hello'}
+        ]
+        job_id = queue.submit('fetch_and_process', {'count': 1})
+
+        JobWorker(queue, processor).run_once()
+
+        processor.ms_graph.fetch_emails.assert_called_once_with(1)
+        assert store.get_messages(['new_1'])[0]['subject'] == 'Hi'
+        assert queue.get(job_id)['total'] == 1
+        assert queue.results(job_id)[0]['category'] == 'Work'
+
+    def test_failure_marks_job_failed(self, queue, processor):
+        """An unexpected error fails the job with its message"""
+        processor.process_emails.side_effect = RuntimeError('Cohere down')
+        job_id = queue.submit('process', {'ids': ['email_0']})
+
+        JobWorker(queue, processor).run_once()
+
+        job = queue.get(job_id)
+        assert job['status'] == 'failed'
+        assert job['error'] == 'Cohere down'
+
+    def test_background_threads(self, queue, processor):
+        """In-process worker threads pick up submitted jobs"""
+        worker = JobWorker(queue, processor, threads=2, poll_interval=0.05)
+        worker.start()
+        try:
+            job_id = queue.submit('process', {'ids': ['email_0', 'email_1']})
+            deadline = time.time() + 5
+            while queue.get(job_id)['status'] != 'completed' and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            worker.stop(timeout=5)
+
+        assert queue.get(job_id)['status'] == 'completed'
@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from services.llm_cache import LLMCache
+from services.cohere_service import CohereService
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Create an isolated on-disk cache"""
+    return LLMCache(str(tmp_path / 'llm_cache.sqlite3'), max_entries=3, ttl_seconds=60)
+
+
+@pytest.fixture
+def cohere_service(cache):
+    """Cohere service wired to the cache with a mocked client"""
+    service = CohereService('test_api_key', cache=cache)
+    service.client = MagicMock()
+    return service
+
+
+class TestLLMCache:
+    """Test suite for the content-addressed LLM cache"""
+
+    def test_set_and_get(self, cache):
+        """Stored values round-trip through JSON"""
+        key = LLMCache.make_key('classify', 'model', 'tmpl', 'body', 0.2)
+        cache.set(key, ['a', {'b': 1}], 'classify', 'classification')
+
+        assert cache.get(key) == ['a', {'b': 1}]
+        assert cache.stats()['hits'] == 1
+
+    def test_key_depends_on_every_component(self):
+        """Changing any key component changes the address"""
+        base = LLMCache.make_key('classify', 'model', 'tmpl', 'body', 0.2)
+
+        assert base != LLMCache.make_key('reply', 'model', 'tmpl', 'body', 0.2)
+        assert base != LLMCache.make_key('classify', 'other', 'tmpl', 'body', 0.2)
+        assert base != LLMCache.make_key('classify', 'model', 'tmpl2', 'body', 0.2)
+        assert base != LLMCache.make_key('classify', 'model', 'tmpl', 'body!', 0.2)
+        assert base != LLMCache.make_key('classify', 'model', 'tmpl', 'body', 0.3)
+
+    def test_ttl_expiry(self, cache):
+        """Entries older than the TTL are misses"""
+        cache.set('k', 'v', 'classify', 'classification')
+        with patch('services.llm_cache.time.time', return_value=10 ** 12):
+            assert cache.get('k') is None
+
+    def test_lru_eviction(self, cache):
+        """Least recently used entries go first when over the cap"""
+        for key in ('a', 'b', 'c', 'd'):
+            cache.set(key, key, 'classify', 'classification')
+        cache.get('a')
+        cache.evict()
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 'a'
+        assert cache.stats()['entries'] == 3
+
+    def test_invalidate_template(self, cache):
+        """Invalidation only drops entries for the named template"""
+        cache.set('k1', 'Work', 'classify', 'classification')
+        cache.set('k2', [], 'action_items', 'action_items')
+
+        assert cache.invalidate_template('classification') == 1
+        assert cache.get('k1') is None
+        assert cache.get('k2') == []
+
+
+class TestCohereServiceCaching:
+    """Test suite for CohereService cache integration"""
+
+    def test_repeat_classification_hits_cache(self, cohere_service):
+        """The second classification of the same body skips the API"""
+        cohere_service.client.chat.return_value = MagicMock(text='Meetings')
+
+        assert cohere_service.classify_email('Meet tomorrow at 2') == 'Meetings'
+        assert cohere_service.classify_email('Meet tomorrow at 2') == 'Meetings'
+        assert cohere_service.client.chat.call_count == 1
+
+    def test_failures_are_not_cached(self, cohere_service):
+        """Fallback replies from API errors are never stored"""
+        cohere_service.client.chat.side_effect = Exception('rate limited')
+        cohere_service.generate_reply('Hello', 'Hi')
+        cohere_service.client.chat.side_effect = None
+        cohere_service.client.chat.return_value = MagicMock(text='Real reply')
+
+        assert cohere_service.generate_reply('Hello', 'Hi') == 'Real reply'
+
+    def test_prompt_update_invalidates_changed_template(self, cohere_service, cache):
+        """Updating one template only invalidates its own entries"""
+        cohere_service.client.chat.return_value = MagicMock(text='Work')
+        cohere_service.classify_email('Status update')
+        cohere_service.client.chat.return_value = MagicMock(text='[]')
+        cohere_service.extract_action_items('Status update')
+        prompts = dict(cohere_service.get_prompts())
+
+        try:
+            updated = dict(prompts, classification=prompts['classification'] + '\nBe strict.')
+            cohere_service.update_prompts(updated)
+
+            assert cache.stats()['entries'] == 1
+        finally:
+            cohere_service.update_prompts(prompts)
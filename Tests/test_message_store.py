@@ -0,0 +1,123 @@
+import pytest
+from services.message_store import MessageStore, content_hash
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Create an isolated message store"""
+    return MessageStore(str(tmp_path / 'messages.sqlite3'))
+
+
+@pytest.fixture
+def parsed_emails():
+    """Emails in the shape produced by MSGraphService._parse_email"""
+    return [
+        {'id': 'm1', 'subject': 'Invoice due', 'from': 'billing@freightco.com', 'to': 'you@oceanai.com',
+         'receivedDateTime': '2025-11-19T12:45:00Z', 'body': 'Invoice #7890 is due.', 'isRead': False,
+         'importance': 'high'},
+        {'id': 'm2', 'subject': 'Q4 Planning', 'from': 'calendar@company.com', 'to': 'you@oceanai.com',
+         'receivedDateTime': '2025-11-23T14:30:00Z', 'body': 'You are invited.', 'isRead': True,
+         'importance': 'normal'},
+        {'id': 'm3', 'subject': 'Weekly news', 'from': 'news@maritimetrends.com', 'to': 'you@oceanai.com',
+         'receivedDateTime': '2025-11-21T07:00:00Z', 'body': 'Top stories.', 'isRead': False,
+         'importance': 'low'},
+    ]
+
+
+class TestMessageStore:
+    """Test suite for the persistent message store"""
+
+    def test_uses_wal_mode(self, store):
+        """The database runs in WAL mode for concurrent readers"""
+        (mode,) = store._conn.execute('PRAGMA journal_mode').fetchone()
+        assert mode == 'wal'
+
+    def test_round_trip_preserves_shape(self, store, parsed_emails):
+        """Stored messages come back in the parsed email shape, in request order"""
+        store.upsert_messages(parsed_emails)
+
+        emails = store.get_messages(['m3', 'missing', 'm1'])
+
+        assert [e['id'] for e in emails] == ['m3', 'm1']
+        assert emails[1]['from'] == 'billing@freightco.com'
+        assert emails[1]['actionItems'] == []
+
+    def test_results_survive_metadata_refresh(self, store, parsed_emails):
+        """Re-fetching an unchanged message keeps its classification"""
+        store.upsert_messages(parsed_emails)
+        store.save_results([dict(parsed_emails[0], category='Financial',
+                                 actionItems=[{'task': 'Pay invoice'}])])
+
+        store.upsert_messages([dict(parsed_emails[0], isRead=True)])
+        email = store.get_messages(['m1'])[0]
+
+        assert email['category'] == 'Financial'
+        assert email['isRead'] is True
+
+    def test_category_write_back_keeps_results_and_drafts(self, store, parsed_emails):
+        """A delta echo of a written-back category is not a content change"""
+        store.upsert_messages(parsed_emails)
+        store.save_results([dict(parsed_emails[0], category='Financial', actionItems=[])])
+        store.save_draft({'id': 'draft_m1', 'originalEmailId': 'm1', 'subject': 'Re: Invoice due',
+                          'body': 'Paid today.', 'recipient': 'billing@freightco.com', 'createdAt': '',
+                          'sourceHash': content_hash(parsed_emails[0]), 'promptHash': 'p1',
+                          'origin': 'generated'})
+
+        store.set_outlook_categories({'m1': ['OceanAI: Financial']})
+        assert store.get_messages(['m1'])[0]['categories'] == ['OceanAI: Financial']
+        store.upsert_messages([dict(parsed_emails[0], categories=['OceanAI: Financial'])])
+
+        assert store.get_messages(['m1'])[0]['category'] == 'Financial'
+        assert store.get_draft('draft_m1') is not None
+
+    def test_body_change_clears_results(self, store, parsed_emails):
+        """A changed body invalidates the stored classification"""
+        store.upsert_messages(parsed_emails)
+        store.save_results([dict(parsed_emails[0], category='Financial', actionItems=[])])
+
+        store.upsert_messages([dict(parsed_emails[0], body='Updated invoice text')])
+
+        assert store.get_messages(['m1'])[0]['category'] is None
+
+    def test_list_filters_use_indexes(self, store, parsed_emails):
+        """Listing filters by category, sender and read state, newest first"""
+        store.upsert_messages(parsed_emails)
+        store.save_results([dict(parsed_emails[0], category='Financial', actionItems=[])])
+
+        assert [e['id'] for e in store.list_messages()] == ['m2', 'm3', 'm1']
+        assert [e['id'] for e in store.list_messages(category='Financial')] == ['m1']
+        assert [e['id'] for e in store.list_messages(is_read=False)] == ['m3', 'm1']
+        assert [e['id'] for e in store.list_messages(sender='calendar@company.com')] == ['m2']
+        plan = ' '.join(str(tuple(r)) for r in store._conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM messages WHERE category = ? ORDER BY received_at DESC',
+            ('Financial',)))
+        assert 'idx_messages_category' in plan
+
+    def test_delete_removes_messages_and_drafts(self, store, parsed_emails):
+        """Removed messages take their drafts with them"""
+        store.upsert_messages(parsed_emails)
+        store.save_draft({'id': 'draft_m1', 'originalEmailId': 'm1', 'subject': 'Re: Invoice due',
+                          'body': 'Scheduled.', 'recipient': 'billing@freightco.com'})
+
+        store.delete_messages(['m1'])
+
+        assert store.get_messages(['m1']) == []
+        assert store.get_drafts() == []
+
+    def test_adds_conversation_column_to_old_databases(self, tmp_path, parsed_emails):
+        """Databases created before conversationId was stored are migrated on open"""
+        import sqlite3
+        path = str(tmp_path / 'old.sqlite3')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE messages (id TEXT PRIMARY KEY, subject TEXT, sender TEXT, recipient TEXT,'
+                     ' received_at TEXT, body TEXT, is_read INTEGER NOT NULL DEFAULT 0, importance TEXT,'
+                     ' category TEXT, action_items TEXT, processed_at REAL, updated_at REAL NOT NULL)')
+        conn.close()
+        store = MessageStore(path)
+
+        store.upsert_messages([dict(email, conversationId='c1') for email in parsed_emails[:2]])
+        store.save_results([dict(parsed_emails[0], category='Financial', actionItems=[{'task': 'Pay'}])])
+
+        assert store.get_messages(['m2'])[0]['conversationId'] == 'c1'
+        assert store.get_thread_results(['c1'], exclude_ids=['m2']) == {
+            'c1': {'category': 'Financial', 'actionItems': [{'task': 'Pay'}]}}
@@ -142,3 +142,85 @@ class TestMSGraphService:
             
             with pytest.raises(Exception):
                 ms_graph_service.get_emails("invalid_token")
+
+
+ACCOUNT_CACHE = {
+    'Account': {
+        'uid.utid-login.microsoftonline.com-common': {
+            'home_account_id': 'uid.utid',
+            'environment': 'login.microsoftonline.com',
+            'realm': 'common',
+            'local_account_id': 'uid',
+            'username': 'ops@oceanai.com',
+            'authority_type': 'MSSTS'
+        }
+    }
+}
+
+
+class TestTokenCaching:
+    """Test suite for process-wide MSAL client and token reuse"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        service = MSGraphService('test_app_id', ['Mail.Read'])
+        service.token_cache_file = str(tmp_path / 'ms_token_cache.json')
+        return service
+
+    def _write_cache(self, service, content):
+        import json
+        with open(service.token_cache_file, 'w') as f:
+            json.dump(content, f)
+
+    def test_auth_check_needs_no_client(self, service):
+        """Auth checks read the in-memory cache without building an MSAL client"""
+        self._write_cache(service, ACCOUNT_CACHE)
+        with patch('services.ms_graph_service.msal.PublicClientApplication',
+                   side_effect=AssertionError('client built')):
+            assert service.check_authentication() is True
+            assert service.check_authentication() is True
+
+    def test_cache_file_read_once(self, service):
+        """The token cache is only re-read when the file changes"""
+        self._write_cache(service, ACCOUNT_CACHE)
+        service.check_authentication()
+        with patch('builtins.open', side_effect=AssertionError('file re-read')):
+            for _ in range(10):
+                assert service.check_authentication() is True
+
+    def test_external_change_is_picked_up(self, service):
+        """A logout or login by another worker is seen on the next check"""
+        assert service.check_authentication() is False
+
+        self._write_cache(service, ACCOUNT_CACHE)
+
+        assert service.check_authentication() is True
+
+    def test_access_token_reused_until_near_expiry(self, service):
+        """A still-valid access token is served without calling MSAL"""
+        client = MagicMock()
+        client.get_accounts.return_value = [{'username': 'ops@oceanai.com'}]
+        client.acquire_token_silent.return_value = {'access_token': 'token-1', 'expires_in': 3600}
+        with patch.object(service, '_get_client', return_value=client):
+            assert service.get_access_token() == 'token-1'
+            assert service.get_access_token() == 'token-1'
+            assert client.acquire_token_silent.call_count == 1
+
+            client.acquire_token_silent.return_value = {'access_token': 'token-2', 'expires_in': 60}
+            service._access_token_expires_at = 0
+            assert service.get_access_token() == 'token-2'
+            assert service.get_access_token() == 'token-2'
+            assert client.acquire_token_silent.call_count == 3
+
+    def test_cache_persisted_only_when_changed(self, service):
+        """The cache file is written only when MSAL reports a state change"""
+        import os
+        cache = service._get_token_cache()
+        cache.has_state_changed = False
+        service._save_token_cache(cache)
+        assert not os.path.exists(service.token_cache_file)
+
+        cache.has_state_changed = True
+        service._save_token_cache(cache)
+        assert os.path.exists(service.token_cache_file)
+        assert cache.has_state_changed is False
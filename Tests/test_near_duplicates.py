@@ -0,0 +1,85 @@
+import pytest
+from unittest.mock import MagicMock
+from services.cohere_service import DEFAULT_PROMPTS, CohereService
+from services.near_duplicates import NearDuplicateIndex
+from services.prompt_store import PromptStore
+
+ALERT = ("ALERT: Reefer container {cid} at Terminal 4 reported temperature {temp}C at {time}. "
+         "The set point is -18C. Check the power supply and acknowledge this alert in the "
+         "monitoring portal. Ticket {ticket}.")
+
+
+@pytest.fixture
+def index(tmp_path):
+    return NearDuplicateIndex(str(tmp_path / 'near.sqlite3'), sample_rate=0)
+
+
+@pytest.fixture
+def service(index):
+    service = CohereService('test_api_key', near_duplicates=index)
+    service.client = MagicMock()
+    return service
+
+
+def alert(n):
+    return ALERT.format(cid=f'MSCU{4412000 + n}', temp=-2 + n, time=f'0{n}:15 UTC', ticket=f'INC-{9000 + n}')
+
+
+class TestNearDuplicateIndex:
+    """Test suite for MinHash reuse in front of classify and extract"""
+
+    def test_templated_alerts_reuse_the_classification(self, service, index):
+        service.client.chat.return_value = MagicMock(text='Alerts')
+
+        categories = [service.classify_email(alert(n)) for n in range(5)]
+
+        assert categories == ['Alerts'] * 5
+        assert service.client.chat.call_count == 1
+        assert index.stats()['operations']['classify']['reused'] == 4
+        assert index.decisions(limit=1)[0]['similarity'] >= 0.9
+
+    def test_different_mail_is_not_reused(self, service):
+        service.client.chat.side_effect = [MagicMock(text='Alerts'), MagicMock(text='Meetings')]
+
+        service.classify_email(alert(1))
+        category = service.classify_email('Can we move the quarterly planning meeting to Thursday afternoon?')
+
+        assert category == 'Meetings'
+        assert service.client.chat.call_count == 2
+
+    def test_action_items_quoting_other_ids_are_not_reused(self, service, index):
+        """Reuse is rejected when the prior items mention values missing from the new email"""
+        service.client.chat.side_effect = [
+            MagicMock(text='[{"task": "Acknowledge ticket INC-9001", "priority": "High"}]'),
+            MagicMock(text='[{"task": "Acknowledge ticket INC-9002", "priority": "High"}]'),
+        ]
+
+        service.extract_action_items(alert(1))
+        items = service.extract_action_items(alert(2))
+
+        assert items[0]['task'] == 'Acknowledge ticket INC-9002'
+        assert index.decisions(limit=1)[0]['decision'] == 'rejected'
+
+    def test_sampled_reuse_is_audited_against_the_llm(self, service, index):
+        index.sample_rate = 1.0
+        service.client.chat.side_effect = [MagicMock(text='Alerts'), MagicMock(text='Technical Support')]
+
+        service.classify_email(alert(1))
+        category = service.classify_email(alert(2))
+
+        assert category == 'Technical Support'
+        decision = index.decisions(limit=1)[0]
+        assert (decision['decision'], decision['reused'], decision['answer']) == (
+            'audit', 'Alerts', 'Technical Support')
+        assert decision['agreed'] is False
+        assert index.stats()['operations']['classify']['disagreements'] == 1
+
+    def test_prompt_change_stops_reuse(self, service, tmp_path):
+        service.prompt_store = PromptStore(str(tmp_path / 'prompts.json'), DEFAULT_PROMPTS)
+        service.client.chat.return_value = MagicMock(text='Alerts')
+
+        service.classify_email(alert(1))
+        service.update_prompts(dict(DEFAULT_PROMPTS, classification='Label this email.'))
+        service.classify_email(alert(2))
+
+        assert service.client.chat.call_count == 2
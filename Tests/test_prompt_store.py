@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+from services.prompt_store import PromptStore
+
+DEFAULTS = {'classification': 'Classify this email.', 'action_items': 'Extract tasks.'}
+
+
+@pytest.fixture
+def prompts_path(tmp_path):
+    """Path to a prompts file inside an isolated data directory"""
+    return str(tmp_path / 'data' / 'prompts.json')
+
+
+class TestPromptStore:
+    """Test suite for the in-memory prompt template store"""
+
+    def test_creates_defaults_when_missing(self, prompts_path):
+        """A missing file is created from the defaults"""
+        store = PromptStore(prompts_path, DEFAULTS)
+
+        assert dict(store.snapshot()) == DEFAULTS
+        with open(prompts_path) as f:
+            assert json.load(f) == DEFAULTS
+
+    def test_recreates_defaults_when_invalid(self, prompts_path):
+        """A corrupt file is replaced by the defaults"""
+        os.makedirs(os.path.dirname(prompts_path))
+        with open(prompts_path, 'w') as f:
+            f.write('{not json')
+
+        store = PromptStore(prompts_path, DEFAULTS)
+
+        assert store.get('classification') == DEFAULTS['classification']
+
+    def test_snapshot_is_read_only(self, prompts_path):
+        """Callers cannot mutate the shared snapshot"""
+        store = PromptStore(prompts_path, DEFAULTS)
+
+        with pytest.raises(TypeError):
+            store.snapshot()['classification'] = 'changed'
+
+    def test_hot_path_does_not_reread_file(self, prompts_path, monkeypatch):
+        """Lookups inside the check interval never touch the filesystem"""
+        store = PromptStore(prompts_path, DEFAULTS, check_interval=60)
+        monkeypatch.setattr(os, 'stat', lambda *a, **k: pytest.fail('stat called'))
+
+        for _ in range(100):
+            store.get('classification')
+
+    def test_picks_up_external_edit(self, prompts_path):
+        """A change written by another worker is loaded on the next check"""
+        store = PromptStore(prompts_path, DEFAULTS, check_interval=0)
+        version = store.version
+        with open(prompts_path, 'w') as f:
+            json.dump(dict(DEFAULTS, classification='Edited elsewhere, longer text.'), f)
+
+        assert store.get('classification') == 'Edited elsewhere, longer text.'
+        assert store.version == version + 1
+
+    def test_update_is_atomic(self, prompts_path):
+        """Updates replace the file in one step and leave no temp files"""
+        store = PromptStore(prompts_path, DEFAULTS)
+        old_snapshot = store.snapshot()
+
+        store.update(dict(DEFAULTS, action_items='New tasks prompt'))
+
+        assert old_snapshot['action_items'] == 'Extract tasks.'
+        assert store.get('action_items') == 'New tasks prompt'
+        assert os.listdir(os.path.dirname(prompts_path)) == ['prompts.json']
+
+    def test_template_hash_tracks_text(self):
+        """Template hashes change with the template text"""
+        assert PromptStore.template_hash('a') == PromptStore.template_hash('a')
+        assert PromptStore.template_hash('a') != PromptStore.template_hash('b')
@@ -0,0 +1,182 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from cohere.errors import BadRequestError, TooManyRequestsError
+from services.async_cohere_service import AsyncCohereService
+from services.cohere_service import CohereService, is_degraded
+from services.email_processor import EmailProcessor
+from services.llm_cache import LLMCache
+from services.message_store import MessageStore
+from services.rate_limiter import (
+    AIMDConcurrency, CircuitBreaker, CircuitOpenError, CohereLimiter, RateLimitTimeout, TokenBucket
+)
+
+
+@pytest.fixture
+def limited_service(tmp_path):
+    """Cohere service with a cache, a limiter and a mocked client"""
+    service = CohereService(
+        'test_api_key',
+        cache=LLMCache(str(tmp_path / 'cache.sqlite3')),
+        limiter=CohereLimiter(max_concurrency=4, failure_threshold=2, reset_timeout=60)
+    )
+    service.client = MagicMock()
+    return service
+
+
+class TestLimiterParts:
+    """Test suite for the token bucket, AIMD limit and circuit breaker"""
+
+    def test_bucket_paces_after_burst(self):
+        """The burst is free, the next request waits for refill"""
+        bucket = TokenBucket(per_minute=60)
+
+        assert bucket.reserve(60) == 0
+        assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+    def test_bucket_fails_fast_past_max_wait(self):
+        bucket = TokenBucket(per_minute=60)
+        bucket.reserve(60)
+
+        with pytest.raises(RateLimitTimeout):
+            bucket.reserve(30, max_wait=5)
+        # Nothing was taken by the rejected request
+        assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+    def test_aimd_halves_on_throttle_and_grows_back(self):
+        limit = AIMDConcurrency(max_limit=8)
+        limit.acquire()
+        limit.release(throttled=True)
+        assert int(limit.limit) == 4
+
+        for _ in range(20):
+            limit.acquire()
+            limit.release(succeeded=True)
+        assert 4 < limit.limit <= 8
+
+    def test_breaker_opens_then_half_opens(self):
+        """Consecutive failures open the circuit; one trial call closes it"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure('boom')
+        breaker.record_failure('boom')
+
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+        time.sleep(0.06)
+        breaker.allow()
+        assert breaker.state == 'half_open'
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+        breaker.record_success()
+        assert breaker.state == 'closed'
+
+
+class TestCohereLimiting:
+    """Test suite for the limiter in front of CohereService"""
+
+    def test_throttling_reduces_concurrency(self, limited_service):
+        limited_service.client.chat.side_effect = TooManyRequestsError(body={})
+
+        assert is_degraded(limited_service.classify_email('Invoice attached'))
+        status = limited_service.limiter.status()
+        assert status['concurrency_limit'] == 2
+        assert status['throttled'] == 1
+
+    def test_open_circuit_fails_fast_and_is_not_cached(self, limited_service):
+        """After repeated failures no call is made and fallbacks are not cached"""
+        limited_service.client.chat.side_effect = ConnectionError('down')
+        limited_service.classify_email('First')
+        limited_service.classify_email('Second')
+        limited_service.client.chat.reset_mock()
+
+        category = limited_service.classify_email('Third')
+
+        assert category == 'Work' and is_degraded(category)
+        limited_service.client.chat.assert_not_called()
+        assert limited_service.limiter.status()['state'] == 'open'
+        assert limited_service.cache.get(
+            limited_service._cache_key('classify', limited_service.get_prompts()['classification'],
+                                       'Third', 0.2)
+        ) is None
+
+    def test_only_provider_errors_count_towards_the_breaker(self, limited_service):
+        """Our own bugs and bad requests don't open the circuit; timeouts and 5xx do"""
+        limited_service.client.chat.side_effect = [
+            TypeError('bad argument'), KeyError('text'), BadRequestError(body={}), httpx.ReadTimeout('slow'),
+        ]
+        for text in ('First', 'Second', 'Third'):
+            limited_service.classify_email(text)
+        assert limited_service.limiter.status()['failures'] == 0
+
+        limited_service.classify_email('Fourth')
+        assert limited_service.limiter.status()['failures'] == 1
+
+    def test_successful_answers_are_not_degraded(self, limited_service):
+        limited_service.client.chat.return_value = MagicMock(text='Financial')
+
+        category = limited_service.classify_email('Invoice attached')
+
+        assert category == 'Financial' and not is_degraded(category)
+        assert limited_service.limiter.status()['admitted'] == 1
+
+    def test_async_calls_share_the_limiter(self, limited_service):
+        async_service = AsyncCohereService(limited_service, client=MagicMock(
+            chat=AsyncMock(side_effect=ConnectionError('down'))
+        ))
+
+        async def run():
+            return [await async_service.chat_assistant('Hi', {}) for _ in range(3)]
+
+        answers = asyncio.run(run())
+
+        assert all(is_degraded(answer) for answer in answers)
+        assert async_service.client.chat.call_count == 2
+        assert limited_service.limiter.status()['rejected'] == 1
+
+    def test_abandoned_streams_are_recorded_as_cancelled(self, limited_service):
+        """A client disconnect frees the slot without counting as success or failure"""
+        limited_service.client.chat_stream.return_value = iter(
+            [MagicMock(event_type='text-generation', text=text) for text in ('Thanks, ', 'will do.')]
+        )
+        events = limited_service.generate_reply_stream('Send it', 'Report')
+        next(events)
+        events.close()
+
+        async def chat_stream(**kwargs):
+            yield MagicMock(event_type='text-generation', text='Thanks, ')
+            await asyncio.sleep(10)
+
+        async_service = AsyncCohereService(limited_service, client=MagicMock(chat_stream=chat_stream))
+
+        async def abandon():
+            async def consume():
+                async for _ in async_service.chat_assistant_stream('Hi', {}):
+                    pass
+            task = asyncio.create_task(consume())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(abandon())
+        status = limited_service.limiter.status()
+
+        assert (status['cancelled'], status['failures'], status['in_flight']) == (2, 0, 0)
+        assert limited_service.usage()['calls'] == 0
+
+    def test_processor_marks_degraded_emails(self, limited_service, tmp_path):
+        """Degraded emails are flagged and their results are not stored"""
+        limited_service.client.chat.side_effect = ConnectionError('down')
+        store = MessageStore(str(tmp_path / 'messages.sqlite3'))
+        email = {'id': 'e1', 'subject': 'Hi', 'body': 'Please call'}
+        store.upsert_messages([email])
+        processor = EmailProcessor(MagicMock(), limited_service, store=store)
+
+        processed = processor.process_emails([dict(email)])
+
+        assert processed[0]['degraded'] is True
+        assert processed[0]['category'] == 'Work'
+        assert store.get_messages(['e1'])[0].get('category') is None
@@ -0,0 +1,84 @@
+import pytest
+from unittest.mock import MagicMock
+from services.cohere_service import CohereService
+from services.message_store import MessageStore
+from services.search_index import SearchIndex
+
+MAILBOX = [
+    {'id': 'm1', 'subject': 'Berth delay at Terminal 4', 'from': 'ops@portauthority.example',
+     'receivedDateTime': '2025-11-03T09:00:00Z',
+     'body': 'The port authority confirmed the vessel is delayed by 36 hours due to weather.'},
+    {'id': 'm2', 'subject': 'Invoice 1042', 'from': 'billing@carrier.example',
+     'receivedDateTime': '2025-11-02T09:00:00Z',
+     'body': 'Please find attached the invoice for October freight charges.'},
+    {'id': 'm3', 'subject': 'Team lunch', 'from': 'hr@oceanai.example',
+     'receivedDateTime': '2025-11-01T09:00:00Z',
+     'body': 'Lunch is on Friday at noon in the main office.'},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.sqlite3'))
+    index.add(MAILBOX)
+    return index
+
+
+class TestSearchIndex:
+    """Test suite for the BM25 + hashed-embedding mailbox index"""
+
+    def test_ranks_relevant_message_first(self, index):
+        results = index.search('what did the port authority say about the delay?', k=2)
+
+        assert results[0]['id'] == 'm1'
+        assert results[0]['from'] == 'ops@portauthority.example'
+        assert 'delayed by 36 hours' in results[0]['body']
+
+    def test_embeddings_catch_near_spellings(self, index):
+        """No BM25 term matches 'invoices', the hashed trigrams still do"""
+        assert index.search('invoicing', k=1)[0]['id'] == 'm2'
+
+    def test_changed_and_removed_messages(self, index):
+        assert index.add(MAILBOX) == 0
+
+        index.add([dict(MAILBOX[2], body='Lunch moved: customs inspection at noon instead.')])
+        index.remove(['m1'])
+
+        assert [r['id'] for r in index.search('customs inspection')] == ['m3']
+        assert all(r['id'] != 'm1' for r in index.search('port authority delay'))
+        assert index.count() == 2
+
+    def test_workers_share_the_index(self, tmp_path):
+        """A second process sees messages indexed and removed by the first one"""
+        path = str(tmp_path / 'search.sqlite3')
+        writer, reader = SearchIndex(path), SearchIndex(path)
+        writer.add(MAILBOX[:1])
+        assert reader.search('terminal delay')[0]['id'] == 'm1'
+
+        writer.add(MAILBOX[1:])
+        assert reader.search('freight invoice')[0]['id'] == 'm2'
+
+        writer.remove(['m1'])
+        assert all(r['id'] != 'm1' for r in reader.search('terminal delay'))
+
+    def test_message_store_keeps_index_current(self, tmp_path):
+        index = SearchIndex(str(tmp_path / 'search.sqlite3'))
+        store = MessageStore(str(tmp_path / 'messages.sqlite3'), search_index=index)
+
+        store.upsert_messages(MAILBOX)
+        store.delete_messages(['m2'])
+
+        assert index.count() == 2
+        assert index.search('lunch')[0]['id'] == 'm3'
+
+    def test_retrieved_messages_fit_the_prompt_budget(self, index):
+        service = CohereService('test_api_key', token_budgets={'retrieval': 60})
+        service.client = MagicMock()
+        documents = index.search('delay', k=3)
+        documents[0]['body'] = 'Vessel delayed. ' * 200
+
+        prompt = service._assistant_prompt('Any delays?', {}, documents)
+
+        assert 'Relevant emails from the mailbox:' in prompt
+        assert '[1] 2025-11-03T09:00:00Z | From: ops@portauthority.example' in prompt
+        assert len(prompt) < len(service._assistant_prompt('Any delays?', {})) + 60 * 4 + 40
@@ -0,0 +1,149 @@
+import json
+import os
+import time
+
+import pytest
+from unittest.mock import MagicMock
+from services import telemetry
+from services.cohere_service import CohereService
+from services.llm_cache import LLMCache
+from services.processing_engine import ProcessingEngine
+from services.telemetry import DependencyProbe, MetricsRegistry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Fresh in-memory registry behind the module-level helpers"""
+    fresh = MetricsRegistry()
+    monkeypatch.setattr(telemetry, 'registry', fresh)
+    return fresh
+
+
+def counter(registry, name, **labels):
+    counters, _ = registry.collect()
+    return counters.get((name, telemetry._label_key(labels)), 0)
+
+
+class TestMetricsRegistry:
+    """Test suite for the Prometheus registry and its cross-worker merge"""
+
+    def test_render_prometheus_text(self, registry):
+        registry.inc('oceanai_llm_calls_total', operation='classify', outcome='ok')
+        registry.observe('oceanai_llm_call_seconds', 0.2, operation='classify')
+        registry.observe('oceanai_llm_call_seconds', 3.0, operation='classify')
+
+        text = registry.render()
+
+        assert '# TYPE oceanai_llm_calls_total counter' in text
+        assert 'oceanai_llm_calls_total{operation="classify",outcome="ok"} 1' in text
+        assert 'oceanai_llm_call_seconds_bucket{operation="classify",le="0.25"} 1' in text
+        assert 'oceanai_llm_call_seconds_bucket{operation="classify",le="+Inf"} 2' in text
+        assert 'oceanai_llm_call_seconds_count{operation="classify"} 2' in text
+        assert 'oceanai_llm_call_seconds_sum{operation="classify"} 3.2' in text
+
+    def test_merges_other_worker_snapshots(self, tmp_path):
+        """Each worker writes <pid>.json; any worker renders the total"""
+        other = MetricsRegistry()
+        other.inc('oceanai_json_parse_total', 3, result='ok')
+        other.observe('oceanai_stage_seconds', 0.01, stage='html_extract')
+        (tmp_path / f'{os.getppid()}.json').write_text(json.dumps(other.snapshot()))
+
+        registry = MetricsRegistry(str(tmp_path), flush_interval=0)
+        registry.inc('oceanai_json_parse_total', result='ok')
+
+        assert (tmp_path / f'{os.getpid()}.json').exists()
+        assert counter(registry, 'oceanai_json_parse_total', result='ok') == 4
+        assert 'oceanai_stage_seconds_count{stage="html_extract"} 1' in registry.render()
+
+    def test_idle_worker_counts_are_flushed(self, tmp_path):
+        """Counts recorded just after a flush are written even if nothing else is recorded"""
+        registry = MetricsRegistry(str(tmp_path), flush_interval=0.1)
+        registry.inc('oceanai_json_parse_total', result='ok')
+        registry.inc('oceanai_json_parse_total', result='ok')
+
+        other = MetricsRegistry()
+        for _ in range(50):
+            snapshot = json.loads((tmp_path / f'{os.getpid()}.json').read_text())
+            counters, histograms = {}, {}
+            other._merge_into(counters, histograms, snapshot)
+            if counters.get(('oceanai_json_parse_total', (('result', 'ok'),))) == 2:
+                break
+            time.sleep(0.05)
+        else:
+            pytest.fail('idle counts were never flushed')
+        registry.configure(None)
+
+    def test_exited_workers_are_pruned(self, tmp_path):
+        """Snapshots of workers that are gone are deleted and not merged"""
+        registry = MetricsRegistry(str(tmp_path), flush_interval=0)
+        other = MetricsRegistry()
+        other.inc('oceanai_json_parse_total', 3, result='ok')
+        (tmp_path / '99999999.json').write_text(json.dumps(other.snapshot()))
+        registry.inc('oceanai_json_parse_total', result='ok')
+
+        assert counter(registry, 'oceanai_json_parse_total', result='ok') == 1
+        assert sorted(path.name for path in tmp_path.iterdir()) == [f'{os.getpid()}.json']
+
+
+class TestTracing:
+    """Test suite for spans, traces and dependency probes"""
+
+    def test_spans_from_engine_workers_join_the_trace(self, registry):
+        engine = ProcessingEngine(max_workers=4)
+        trace, token = telemetry.start_trace('POST /api/emails/process')
+
+        def work(n):
+            with telemetry.span('html_extract', item=n):
+                return n
+
+        try:
+            engine.map(work, range(5))
+        finally:
+            telemetry.end_trace(token)
+            engine.shutdown()
+
+        assert sorted(s['item'] for s in trace.spans) == [0, 1, 2, 3, 4]
+        assert telemetry.current_trace() is None
+        _, histograms = registry.collect()
+        assert histograms[('oceanai_stage_seconds', (('stage', 'html_extract'),))]['count'] == 5
+
+    def test_llm_calls_record_tokens_cache_and_parsing(self, registry, tmp_path):
+        service = CohereService('test_api_key', cache=LLMCache(str(tmp_path / 'cache.sqlite3')))
+        service.client = MagicMock()
+        service.client.chat.return_value = MagicMock(
+            text='[{"task": "Send report"}]',
+            meta=MagicMock(billed_units=MagicMock(input_tokens=120, output_tokens=15))
+        )
+        trace, token = telemetry.start_trace('test')
+        try:
+            service.extract_action_items('Please send the report')
+            service.extract_action_items('Please send the report')
+        finally:
+            telemetry.end_trace(token)
+
+        labels = {'operation': 'action_items'}
+        assert counter(registry, 'oceanai_llm_calls_total', outcome='ok', **labels) == 1
+        assert counter(registry, 'oceanai_llm_tokens_total', kind='prompt', **labels) == 120
+        assert counter(registry, 'oceanai_llm_tokens_total', kind='completion', **labels) == 15
+        assert counter(registry, 'oceanai_llm_cache_total', result='miss', **labels) == 1
+        assert counter(registry, 'oceanai_llm_cache_total', result='hit', **labels) == 1
+        assert counter(registry, 'oceanai_json_parse_total', result='ok') == 1
+        call = next(s for s in trace.spans if s['stage'] == 'llm_call')
+        assert call['prompt_tokens'] == 120 and call['outcome'] == 'ok'
+
+    def test_dependency_probe_times_and_caches_checks(self):
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise ConnectionError('unreachable')
+
+        probe = DependencyProbe({'ok': lambda: 'active', 'down': failing}, ttl=60)
+
+        results = probe.results()
+        probe.results()
+
+        assert results['ok']['status'] == 'active'
+        assert results['down'] == {'status': 'error', 'error': 'unreachable',
+                                   'latency_ms': results['down']['latency_ms']}
+        assert len(calls) == 1
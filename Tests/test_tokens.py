@@ -0,0 +1,63 @@
+from services.tokens import TRUNCATION_MARKER, estimate_tokens, truncate_to_budget
+
+
+class TestEstimateTokens:
+    """Test suite for the local token estimator"""
+
+    def test_english_prose(self):
+        """Plain ASCII text uses the four-characters-per-token average"""
+        assert estimate_tokens('') == 0
+        assert estimate_tokens('a' * 40) == 10
+
+    def test_cjk_counts_per_character(self):
+        """CJK text is not undercounted by the character average"""
+        text = '来週の会議の議題を送ってください'
+
+        assert estimate_tokens(text) >= len(text)
+
+    def test_urls_are_denser(self):
+        """Tracking URLs cost more than prose of the same length"""
+        url = 'https://example.com/track?utm_source=mail&utm_campaign=spring&id=8f3a9c'
+
+        assert estimate_tokens(url) > estimate_tokens('x' * len(url))
+
+
+class TestTruncateToBudget:
+    """Test suite for head+tail truncation at sentence boundaries"""
+
+    def test_short_text_untouched(self):
+        """Text within budget is returned as-is"""
+        result = truncate_to_budget('Please confirm by Friday.', 100)
+
+        assert result.text == 'Please confirm by Friday.'
+        assert result.dropped_tokens == 0
+
+    def test_keeps_whole_sentences_from_both_ends(self):
+        """The middle is dropped and the cut falls between sentences"""
+        sentences = [f'Sentence number {i} is here.' for i in range(200)]
+        result = truncate_to_budget(' '.join(sentences), 100)
+
+        head, tail = result.text.split(TRUNCATION_MARKER)
+        assert head.startswith('Sentence number 0 is here.')
+        assert head.endswith('is here.')
+        assert tail.endswith('Sentence number 199 is here.')
+        assert tail.startswith('Sentence number')
+        assert result.tokens <= 100
+        assert result.dropped_tokens == result.original_tokens - result.tokens > 0
+
+    def test_cjk_budget_respected(self):
+        """CJK mail is truncated by estimated tokens, not characters"""
+        result = truncate_to_budget('这是一个很长的句子。' * 300, 120)
+
+        assert result.tokens <= 120
+        assert result.text.startswith('这是一个很长的句子。')
+        assert result.text.endswith('这是一个很长的句子。')
+
+    def test_unbroken_text_cut_at_words(self):
+        """A single oversized sentence is cut at word breaks on both sides"""
+        result = truncate_to_budget('word ' * 3000, 100)
+
+        head, tail = result.text.split(TRUNCATION_MARKER)
+        assert head.split() and set(head.split()) == {'word'}
+        assert tail.split() and set(tail.split()) == {'word'}
+        assert result.tokens <= 100
@@ -1,23 +1,191 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import json
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 from services.ms_graph_service import MSGraphService
-from services.cohere_service import CohereService
-from services.email_processor import EmailProcessor
+from services.cohere_service import CohereService, is_degraded
+from services.email_processor import EmailProcessor, PROCESSING_MODES
+from services.graph_transport import GraphTransport
+from services.processing_engine import ProcessingEngine
+from services.llm_cache import LLMCache
+from services.near_duplicates import NearDuplicateIndex
+from services.fast_classifier import FastClassifier
+from services.message_store import MessageStore
+from services.drafts import DraftGenerator, ready_events
+from services.job_queue import JobQueue, JOB_KINDS, TERMINAL_STATUSES
+from services.job_worker import JobWorker
+from services.rate_limiter import CohereLimiter
+from services.search_index import SearchIndex
+from services.threads import thread_summaries
+from services import telemetry
+from config import Config
 app = Flask(__name__)
 CORS(app)
 
+telemetry.configure(Config.METRICS_DIR, flush_interval=Config.METRICS_FLUSH_SECONDS)
+
 # Initialize services
 ms_graph = MSGraphService(
     app_id=os.getenv("APPLICATION_ID"),
-    scopes=['Mail.Read', 'Mail.ReadWrite', 'Mail.ReadBasic']
+    scopes=['Mail.Read', 'Mail.ReadWrite', 'Mail.ReadBasic'],
+    base_url=Config.GRAPH_BASE_URL,
+    prefer_text_body=Config.GRAPH_PREFER_TEXT_BODY,
+    html_engine=Config.HTML_EXTRACTOR,
+    transport=GraphTransport(
+        pool_size=Config.GRAPH_POOL_SIZE,
+        connect_timeout=Config.GRAPH_CONNECT_TIMEOUT,
+        read_timeout=Config.GRAPH_READ_TIMEOUT,
+        max_retries=Config.GRAPH_MAX_RETRIES
+    )
+)
+llm_cache = LLMCache(
+    Config.LLM_CACHE_FILE,
+    max_entries=Config.LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=Config.LLM_CACHE_TTL_SECONDS
+) if Config.LLM_CACHE_ENABLED else None
+near_duplicates = NearDuplicateIndex(
+    Config.NEAR_DUPLICATE_FILE,
+    thresholds={
+        'classify': Config.NEAR_DUPLICATE_CLASSIFY_THRESHOLD,
+        'action_items': Config.NEAR_DUPLICATE_EXTRACT_THRESHOLD
+    },
+    sample_rate=Config.NEAR_DUPLICATE_SAMPLE_RATE,
+    max_entries=Config.NEAR_DUPLICATE_MAX_ENTRIES
+) if Config.NEAR_DUPLICATE_ENABLED else None
+cohere_limiter = CohereLimiter(
+    requests_per_minute=Config.COHERE_REQUESTS_PER_MINUTE,
+    tokens_per_minute=Config.COHERE_TOKENS_PER_MINUTE,
+    max_concurrency=Config.COHERE_ADAPTIVE_MAX_CONCURRENCY,
+    failure_threshold=Config.COHERE_BREAKER_THRESHOLD,
+    reset_timeout=Config.COHERE_BREAKER_RESET_SECONDS,
+    max_wait=Config.COHERE_LIMITER_MAX_WAIT
+)
+cohere_service = CohereService(
+    api_key=os.getenv("COHERE_API_KEY"),
+    base_url=Config.COHERE_BASE_URL,
+    limiter=cohere_limiter,
+    cache=llm_cache,
+    near_duplicates=near_duplicates,
+    batch_token_budget=Config.CLASSIFY_BATCH_TOKEN_BUDGET,
+    batch_max_size=Config.CLASSIFY_BATCH_MAX_SIZE,
+    token_budgets={
+        'classify': Config.CLASSIFY_TOKEN_BUDGET,
+        'action_items': Config.EXTRACT_TOKEN_BUDGET,
+        'reply': Config.REPLY_TOKEN_BUDGET,
+        'retrieval': Config.CHAT_RETRIEVAL_TOKEN_BUDGET
+    }
+)
+processing_engine = ProcessingEngine(
+    max_workers=Config.PROCESS_WORKERS,
+    provider_limits={'cohere': Config.COHERE_MAX_CONCURRENCY}
+)
+fast_classifier = FastClassifier(
+    Config.FAST_CLASSIFIER_FILE,
+    threshold=Config.FAST_CLASSIFIER_THRESHOLD,
+    sample_rate=Config.FAST_CLASSIFIER_SAMPLE_RATE
+) if Config.FAST_CLASSIFIER_ENABLED else None
+search_index = SearchIndex(
+    Config.SEARCH_INDEX_FILE,
+    embeddings=Config.SEARCH_EMBEDDINGS_ENABLED,
+    dim=Config.SEARCH_EMBEDDING_DIM
+) if Config.SEARCH_INDEX_ENABLED else None
+message_store = MessageStore(Config.MESSAGE_STORE_FILE, search_index=search_index)
+draft_generator = DraftGenerator(
+    message_store, cohere_service,
+    limiter=cohere_limiter,
+    categories=Config.DRAFT_PREGENERATE_CATEGORIES,
+    normalize_bodies=Config.BODY_NORMALIZATION_ENABLED,
+    idle_fraction=Config.DRAFT_PREGENERATE_IDLE_FRACTION,
+    batch_size=Config.DRAFT_PREGENERATE_BATCH_SIZE,
+    poll_interval=Config.DRAFT_PREGENERATE_POLL_SECONDS
+)
+email_processor = EmailProcessor(
+    ms_graph, cohere_service, processing_engine, fast_classifier, message_store,
+    normalize_bodies=Config.BODY_NORMALIZATION_ENABLED,
+    drafts=draft_generator if Config.DRAFT_PREGENERATE_ENABLED else None,
+    write_back=Config.OUTLOOK_CATEGORY_WRITEBACK,
+    flag_priority=Config.OUTLOOK_FLAG_HIGH_PRIORITY
+)
+job_queue = JobQueue(Config.JOB_STORE_FILE, lease_seconds=Config.JOB_LEASE_SECONDS)
+job_worker = JobWorker(
+    job_queue, email_processor,
+    threads=Config.JOB_WORKER_THREADS,
+    chunk_size=Config.JOB_CHUNK_SIZE
 )
-cohere_service = CohereService(api_key=os.getenv("COHERE_API_KEY"))
-email_processor = EmailProcessor(ms_graph, cohere_service)
+if Config.JOB_WORKER_MODE == 'inprocess':
+    # Otherwise jobs are run by a separate `python worker.py` process
+    job_worker.start()
+if Config.DRAFT_PREGENERATE_ENABLED:
+    # Runs in every app and worker process; claims keep them off each other's messages
+    draft_generator.start()
+
+def check_ms_graph():
+    if not ms_graph.check_authentication():
+        return "disconnected"
+    ms_graph.ping(timeout=Config.HEALTH_PROBE_TIMEOUT)
+    return "connected"
+
+def check_cohere():
+    cohere_service.ping(timeout=Config.HEALTH_PROBE_TIMEOUT)
+    return "active" if cohere_limiter.breaker.state == 'closed' else "degraded"
+
+dependency_probe = telemetry.DependencyProbe(
+    {"ms_graph": check_ms_graph, "cohere": check_cohere},
+    ttl=Config.HEALTH_PROBE_TTL
+)
+
+@app.before_request
+def start_trace():
+    g.trace, g.trace_token = telemetry.start_trace(f"{request.method} {request.path}")
+
+@app.after_request
+def finish_trace(response):
+    trace = g.get('trace')
+    if trace is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    telemetry.finish_trace(trace, request.method, route, response.status_code, Config.TRACE_SLOW_MS)
+    response.headers['X-Trace-Id'] = trace.id
+    return response
+
+@app.teardown_request
+def end_trace(error=None):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        telemetry.end_trace(token)
+
+def sse_response(events, on_done=None):
+    """Stream ``{'delta'}``/``{'done'}`` events as server-sent events.
+
+    The final event also reports time-to-first-token; ``on_done(text)`` may
+    return extra fields for it (e.g. the saved draft).
+    """
+    started = time.perf_counter()
+
+    def generate():
+        first_token_ms = None
+        for event in events:
+            if first_token_ms is None and 'delta' in event:
+                first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+            if event.get('done'):
+                event['ttft_ms'] = first_token_ms
+                if on_done is not None:
+                    try:
+                        event.update(on_done(event['text']))
+                    except Exception as e:
+                        print(f"Stream completion error: {e}")
+            yield f"data: {json.dumps(event)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 # ============= Authentication Endpoints =============
 
@@ -64,6 +232,7 @@ def fetch_emails():
         count = data.get('count', 20)
         
         emails = ms_graph.fetch_emails(count)
+        message_store.upsert_messages(emails)
         
         return jsonify({
             "success": True,
@@ -76,33 +245,97 @@ def fetch_emails():
             "error": str(e)
         }), 500
 
+@app.route('/api/emails', methods=['GET'])
+def list_emails():
+    """List stored emails, newest first, with optional indexed filters"""
+    try:
+        is_read = request.args.get('isRead')
+        emails = message_store.list_messages(
+            category=request.args.get('category'),
+            sender=request.args.get('sender'),
+            is_read=None if is_read is None else is_read.lower() == 'true',
+            since=request.args.get('since'),
+            limit=min(int(request.args.get('limit', 50)), 500),
+            offset=int(request.args.get('offset', 0))
+        )
+        return jsonify({
+            "success": True,
+            "emails": emails,
+            "count": len(emails)
+        })
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/api/emails/sync', methods=['POST'])
+def sync_emails():
+    """Incrementally sync the mailbox via Graph delta queries"""
+    try:
+        data = request.json or {}
+        if data.get('reset'):
+            ms_graph.reset_sync(data.get('folder', 'inbox'))
+        result = ms_graph.sync_emails(
+            folder=data.get('folder', 'inbox'),
+            page_size=data.get('pageSize', 50)
+        )
+        message_store.upsert_messages(result['changed'])
+        message_store.delete_messages(result['removed'])
+        
+        return jsonify({
+            "success": True,
+            "emails": result['changed'],
+            "removed": result['removed'],
+            "fullSync": result['full_sync'],
+            "count": len(result['changed'])
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @app.route('/api/emails/process', methods=['POST'])
 def process_emails():
     """Process emails with Cohere AI - classify and extract action items"""
     try:
         data = request.json
-        emails = data.get('emails', [])
-        
-        processed_emails = []
-        
-        for email in emails:
-            # Classify email
-            category = cohere_service.classify_email(email['body'])
-            email['category'] = category
-            
-            # Extract action items (skip for spam and newsletters)
-            if category not in ['Spam', 'Newsletters', 'Promotions']:
-                action_items = cohere_service.extract_action_items(email['body'])
-                email['actionItems'] = action_items
-            else:
-                email['actionItems'] = []
-            
-            processed_emails.append(email)
+        if data.get('ids'):
+            # Process messages already held server-side instead of re-uploaded bodies
+            emails = message_store.get_messages(data['ids'])
+        else:
+            emails = data.get('emails', [])
+            message_store.upsert_messages(emails)
+        mode = data.get('mode', 'standard')
+        if mode not in PROCESSING_MODES:
+            return jsonify({
+                "success": False,
+                "error": f"Unknown mode '{mode}', expected one of {list(PROCESSING_MODES)}"
+            }), 400
         
-        return jsonify({
+        usage_before = cohere_service.usage()
+        started = time.perf_counter()
+        processed_emails = email_processor.process_emails(
+            emails, mode, include_removed=bool(data.get('includeRemoved'))
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        usage_after = cohere_service.usage()
+        
+        response = {
             "success": True,
-            "processed_emails": processed_emails
-        })
+            "processed_emails": processed_emails,
+            "mode": mode,
+            "stats": {
+                "elapsed_ms": round(elapsed_ms, 1),
+                "llm_calls": usage_after['calls'] - usage_before['calls'],
+                "input_tokens": usage_after['input_tokens'] - usage_before['input_tokens'],
+                "output_tokens": usage_after['output_tokens'] - usage_before['output_tokens'],
+                "dropped_tokens": usage_after['dropped_tokens'] - usage_before['dropped_tokens'],
+                "saved_tokens": sum(e.get('bodyStats', {}).get('savedTokens', 0) for e in processed_emails),
+                "degraded": sum(1 for e in processed_emails if e.get('degraded'))
+            }
+        }
+        if mode == 'thread':
+            response["threads"] = thread_summaries(processed_emails)
+        return jsonify(response)
     except Exception as e:
         return jsonify({
             "success": False,
@@ -115,6 +348,11 @@ def generate_reply():
     try:
         data = request.json
         email = data.get('email')
+        if email is None and data.get('emailId'):
+            stored = message_store.get_messages([data['emailId']])
+            if not stored:
+                return jsonify({"success": False, "error": "Email not found"}), 404
+            email = stored[0]
         
         # Skip reply generation for spam
         if email.get('category') == 'Spam':
@@ -123,21 +361,33 @@ def generate_reply():
                 "message": "Reply generation skipped for spam emails"
             })
         
+        if not data.get('regenerate'):
+            ready = draft_generator.ready_draft(email)
+            if ready is not None:
+                if data.get('stream'):
+                    return sse_response(
+                        iter(ready_events(ready)),
+                        on_done=lambda reply_body: {"draft": ready, "ready": True}
+                    )
+                return jsonify({"success": True, "draft": ready, "degraded": False, "ready": True})
+        
+        body = draft_generator.reply_body(email)
+        prompt_hash = draft_generator.prompt_hash()
+        
+        if data.get('stream'):
+            return sse_response(
+                cohere_service.generate_reply_stream(body, email['subject']),
+                on_done=lambda reply_body: {"draft": draft_generator.save(email, reply_body, prompt_hash)}
+            )
+        
         # Generate reply
-        reply_body = cohere_service.generate_reply(email['body'], email['subject'])
-        
-        draft = {
-            "id": f"draft_{email['id']}",
-            "originalEmailId": email['id'],
-            "subject": f"Re: {email['subject']}",
-            "body": reply_body,
-            "recipient": email['from'],
-            "createdAt": email['receivedDateTime']
-        }
+        reply_body = cohere_service.generate_reply(body, email['subject'])
+        draft = draft_generator.save(email, reply_body, prompt_hash)
         
         return jsonify({
             "success": True,
-            "draft": draft
+            "draft": draft,
+            "degraded": is_degraded(reply_body)
         })
     except Exception as e:
         return jsonify({
@@ -145,6 +395,30 @@ def generate_reply():
             "error": str(e)
         }), 500
 
+@app.route('/api/drafts', methods=['GET'])
+def list_drafts():
+    """Stored reply drafts, most recently updated first"""
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "drafts": message_store.get_drafts(limit)})
+
+@app.route('/api/drafts/<draft_id>', methods=['PUT'])
+def update_draft(draft_id):
+    """Save user edits to a draft; background generation no longer replaces it"""
+    data = request.json or {}
+    draft = message_store.update_draft(draft_id, data)
+    if draft is None:
+        return jsonify({"success": False, "error": "Draft not found"}), 404
+    return jsonify({"success": True, "draft": draft})
+
+@app.route('/api/drafts/<draft_id>', methods=['DELETE'])
+def delete_draft(draft_id):
+    if not message_store.delete_draft(draft_id):
+        return jsonify({"success": False, "error": "Draft not found"}), 404
+    return jsonify({"success": True})
+
 @app.route('/api/emails/send-reply', methods=['POST'])
 def send_reply():
     """Send a generated reply draft via MS Graph."""
@@ -162,8 +436,138 @@ def send_reply():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/emails/send-replies', methods=['POST'])
+def send_replies():
+    """Send many drafts through Graph $batch; reports a result per draft.
+
+    Accepts ``drafts`` (draft objects) and/or ``draftIds`` (stored drafts).
+    Sent drafts are removed from the store.
+    """
+    try:
+        data = request.json or {}
+        drafts = list(data.get('drafts') or [])
+        for draft_id in data.get('draftIds') or []:
+            drafts.append(message_store.get_draft(draft_id) or {"id": draft_id, "missing": True})
+        if not drafts:
+            return jsonify({"success": False, "error": "No drafts to send"}), 400
+
+        results = [{"id": draft.get('id'), "success": False} for draft in drafts]
+        to_send = []
+        for result, draft in zip(results, drafts):
+            if draft.get('missing'):
+                result["error"] = "Draft not found"
+            elif not (draft.get('subject') and draft.get('body') and draft.get('recipient')):
+                result["error"] = "Missing subject, body, or recipient"
+            else:
+                to_send.append((result, draft))
+        sent = ms_graph.send_mails([
+            {"subject": draft['subject'], "body": draft['body'], "to": draft['recipient']}
+            for _, draft in to_send
+        ]) if to_send else []
+        for (result, draft), outcome in zip(to_send, sent):
+            result.update(outcome)
+            if outcome['success'] and draft.get('id'):
+                message_store.delete_draft(draft['id'])
+
+        sent_count = sum(1 for result in results if result['success'])
+        return jsonify({
+            "success": sent_count == len(results),
+            "sent": sent_count,
+            "failed": len(results) - sent_count,
+            "results": results
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/emails/mark-read', methods=['POST'])
+def mark_read():
+    """Set the read state of many messages in Outlook through Graph $batch"""
+    try:
+        data = request.json or {}
+        ids = data.get('ids') or []
+        if not ids:
+            return jsonify({"success": False, "error": "No message ids"}), 400
+        is_read = data.get('isRead', True)
+        if not isinstance(is_read, bool):
+            return jsonify({"success": False, "error": "isRead must be true or false"}), 400
+        outcomes = ms_graph.mark_as_read(ids, is_read)
+        updated = [message_id for message_id, outcome in zip(ids, outcomes) if outcome['success']]
+        message_store.set_read(updated, is_read)
+        return jsonify({
+            "success": len(updated) == len(ids),
+            "updated": len(updated),
+            "results": [dict(outcome, id=message_id) for message_id, outcome in zip(ids, outcomes)]
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/classifier/stats', methods=['GET'])
+def classifier_stats():
+    """Fast-path pre-classifier hit rate and sampled LLM disagreement"""
+    if fast_classifier is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(fast_classifier.stats(), enabled=True))
+
+@app.route('/api/llm/near-duplicates', methods=['GET'])
+def near_duplicate_decisions():
+    """Near-duplicate reuse counts and the latest decisions, for auditing"""
+    if near_duplicates is None:
+        return jsonify({"enabled": False})
+    try:
+        decisions = near_duplicates.decisions(
+            limit=min(int(request.args.get('limit', 50)), 500),
+            operation=request.args.get('operation')
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify(dict(near_duplicates.stats(), enabled=True, decisions=decisions))
+
 # ============= Chat Agent Endpoint =============
 
+def retrieve(query, k=None):
+    """Stored messages most relevant to ``query`` (empty when the index is off)"""
+    if search_index is None or not query:
+        return []
+    try:
+        with telemetry.span('retrieval'):
+            return search_index.search(query, k or Config.CHAT_RETRIEVAL_TOP_K)
+    except Exception as e:
+        print(f"Search index error: {e}")
+        return []
+
+def source_summary(document):
+    return {key: document[key] for key in ('id', 'subject', 'from', 'receivedDateTime', 'score')}
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """Search stored messages (BM25 + hashed embeddings)"""
+    if search_index is None:
+        return jsonify({"success": False, "error": "Search index is disabled"}), 404
+    query = request.args.get('q', '')
+    try:
+        k = min(int(request.args.get('k', 10)), 100)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    results = [
+        dict(source_summary(document), preview=(document['body'] or '')[:200])
+        for document in retrieve(query, k)
+    ]
+    return jsonify({"success": True, "results": results, "count": len(results)})
+
+@app.route('/api/search/reindex', methods=['POST'])
+def reindex():
+    """Index every stored message (for mailboxes stored before the index existed)"""
+    if search_index is None:
+        return jsonify({"success": False, "error": "Search index is disabled"}), 404
+    indexed, offset = 0, 0
+    while True:
+        emails = message_store.list_messages(limit=500, offset=offset)
+        if not emails:
+            break
+        indexed += search_index.add(emails)
+        offset += len(emails)
+    return jsonify({"success": True, "indexed": indexed, "total": search_index.count()})
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Chat with Cohere AI assistant"""
@@ -171,12 +575,22 @@ def chat():
         data = request.json
         message = data.get('message')
         context = data.get('context', {})
+        documents = retrieve(message)
+        sources = [source_summary(document) for document in documents]
+        
+        if data.get('stream'):
+            return sse_response(
+                cohere_service.chat_assistant_stream(message, context, documents),
+                on_done=lambda text: {"sources": sources}
+            )
         
-        response = cohere_service.chat_assistant(message, context)
+        response = cohere_service.chat_assistant(message, context, documents)
         
         return jsonify({
             "success": True,
-            "response": response
+            "response": response,
+            "sources": sources,
+            "degraded": is_degraded(response)
         })
     except Exception as e:
         return jsonify({
@@ -184,6 +598,110 @@ def chat():
             "error": str(e)
         }), 500
 
+# ============= Background Jobs =============
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a bulk process or fetch-and-process job and return its ID"""
+    try:
+        data = request.json or {}
+        kind = data.get('type', 'process')
+        mode = data.get('mode', 'standard')
+        if kind not in JOB_KINDS:
+            return jsonify({"success": False, "error": f"Unknown job type '{kind}', expected one of {list(JOB_KINDS)}"}), 400
+        if mode not in PROCESSING_MODES:
+            return jsonify({"success": False, "error": f"Unknown mode '{mode}', expected one of {list(PROCESSING_MODES)}"}), 400
+        
+        payload = {"mode": mode}
+        if kind == 'process':
+            if data.get('emails'):
+                message_store.upsert_messages(data['emails'])
+                payload['ids'] = [email['id'] for email in data['emails'] if email.get('id')]
+            else:
+                payload['ids'] = list(data.get('ids') or [])
+        else:
+            try:
+                payload['count'] = int(data.get('count', 20))
+            except (TypeError, ValueError):
+                return jsonify({"success": False, "error": f"count must be an integer, got {data.get('count')!r}"}), 400
+        
+        job_id = job_queue.submit(kind, payload)
+        return jsonify({"success": True, "job": job_queue.get(job_id)}), 202
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Most recent jobs, newest first"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "jobs": job_queue.list_jobs(limit)})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job progress plus results with sequence numbers after ?after=N"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    try:
+        after = int(request.args.get('after', 0))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "job": job, "results": job_queue.results(job_id, after)})
+
+def job_event(job_id, after):
+    """Next job events message: (SSE text, new ``after``, whether the stream is over).
+
+    Each message carries the last result ``seq`` as its ``id``, so a
+    reconnecting EventSource resumes from ``Last-Event-ID``.
+    """
+    job = job_queue.get(job_id)
+    results = job_queue.results(job_id, after)
+    if results:
+        after = results[-1]['seq']
+    text = f"id: {after}\ndata: {json.dumps({'job': job, 'results': results})}\n\n"
+    return text, after, job['status'] in TERMINAL_STATUSES and not results
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent progress and partial results, for at most JOB_EVENTS_MAX_SECONDS.
+
+    A sync worker is held for the whole stream, so it ends early and the
+    client reconnects with ``?after=`` (or ``Last-Event-ID``) to continue;
+    asgi.py serves this route without the limit.
+    """
+    if job_queue.get(job_id) is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    try:
+        after = int(request.args.get('after', request.headers.get('Last-Event-ID', 0)))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    def generate(after):
+        deadline = time.monotonic() + Config.JOB_EVENTS_MAX_SECONDS
+        while True:
+            text, after, finished = job_event(job_id, after)
+            yield text
+            if finished or time.monotonic() >= deadline:
+                return
+            time.sleep(Config.JOB_EVENTS_INTERVAL)
+    
+    return Response(
+        stream_with_context(generate(after)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job; finished chunks keep their results"""
+    if job_queue.get(job_id) is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    cancelled = job_queue.cancel(job_id)
+    return jsonify({"success": cancelled, "job": job_queue.get(job_id)})
+
 # ============= Prompts Management =============
 
 @app.route('/api/prompts', methods=['GET'])
@@ -196,18 +714,42 @@ def get_prompts():
 def update_prompts():
     """Update prompt templates"""
     data = request.json
+    previous = draft_generator.prompt_hash()
     cohere_service.update_prompts(data)
+    if draft_generator.prompt_hash() != previous:
+        draft_generator.invalidate()
     return jsonify({"success": True, "message": "Prompts updated"})
 
+@app.route('/api/llm/status', methods=['GET'])
+def llm_status():
+    """Cohere limiter state: circuit breaker, adaptive concurrency and buckets"""
+    return jsonify(cohere_limiter.status())
+
+@app.route('/api/graph/stats', methods=['GET'])
+def graph_stats():
+    """Per-endpoint latency and retry counters for Graph calls"""
+    return jsonify(ms_graph.transport.stats())
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics aggregated across all worker processes"""
+    return Response(telemetry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # ============= Health Check =============
 
 @app.route('/api/health', methods=['GET'])
 def health():
+    """Service status with live dependency checks (cached for HEALTH_PROBE_TTL)"""
+    dependencies = dependency_probe.results()
+    dependencies["cohere"]["circuit"] = cohere_limiter.breaker.state
+    healthy = (
+        dependencies["ms_graph"]["status"] != "error"
+        and dependencies["cohere"]["status"] == "active"
+    )
     return jsonify({
-        "status": "healthy",
+        "status": "healthy" if healthy else "degraded",
         "service": "OceanAI Email Agent",
-        "ms_graph": "connected" if ms_graph.check_authentication() else "disconnected",
-        "cohere": "active"
+        **dependencies
     })
 
 if __name__ == '__main__':
@@ -0,0 +1,287 @@
+"""
+ASGI entry point: serves the same /api/* routes as app.py from an event loop.
+
+The I/O-bound routes (Graph fetch/sync/send, reply generation, chat and job
+events) are native async handlers built on ``AsyncMSGraphService`` and
+``AsyncCohereService``, so one process can keep hundreds of them in flight.
+Every other route is delegated to the Flask app running in a thread pool,
+which keeps the JSON contracts identical. Run with:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 4 asgi:app
+"""
+import asyncio
+import json
+import os
+import time
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as flask_app
+from app import cohere_service, draft_generator, message_store, ms_graph
+from config import Config
+from services.async_cohere_service import AsyncCohereService
+from services.async_graph_transport import AsyncGraphTransport
+from services.async_ms_graph_service import AsyncMSGraphService
+from services import telemetry
+from services.cohere_service import is_degraded
+from services.drafts import ready_events
+
+async_cohere = AsyncCohereService(cohere_service, api_key=os.getenv("COHERE_API_KEY"))
+async_graph = AsyncMSGraphService(
+    ms_graph,
+    transport=AsyncGraphTransport(
+        ms_graph.transport, max_connections=Config.ASYNC_GRAPH_MAX_CONNECTIONS
+    )
+)
+
+
+def traced_route(path, handler, methods=('POST',)):
+    """Native route with the same tracing as app.py's request hooks."""
+    async def endpoint(request):
+        trace, token = telemetry.start_trace(f"{request.method} {request.url.path}")
+        try:
+            response = await handler(request)
+        finally:
+            telemetry.end_trace(token)
+        telemetry.finish_trace(trace, request.method, path, response.status_code, Config.TRACE_SLOW_MS)
+        response.headers['X-Trace-Id'] = trace.id
+        return response
+
+    return Route(path, endpoint, methods=list(methods))
+
+
+async def read_json(request):
+    """Request body as JSON, or None (like Flask's ``request.json`` on an empty body)."""
+    body = await request.body()
+    return json.loads(body) if body else None
+
+
+async def iterate(events):
+    for event in events:
+        yield event
+
+
+def sse_response(events, on_done=None):
+    """Async ``app.sse_response``: same event format, headers and ``ttft_ms``."""
+    started = time.perf_counter()
+
+    async def generate():
+        first_token_ms = None
+        async for event in events:
+            if first_token_ms is None and 'delta' in event:
+                first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+            if event.get('done'):
+                event['ttft_ms'] = first_token_ms
+                if on_done is not None:
+                    try:
+                        event.update(await asyncio.to_thread(on_done, event['text']))
+                    except Exception as e:
+                        print(f"Stream completion error: {e}")
+            yield f"data: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# ============= Email Management Endpoints =============
+
+async def fetch_emails(request):
+    """Fetch emails from Outlook via MS Graph API"""
+    try:
+        data = await read_json(request)
+        count = data.get('count', 20)
+
+        emails = await async_graph.fetch_emails(count)
+        await asyncio.to_thread(message_store.upsert_messages, emails)
+
+        return JSONResponse({
+            "success": True,
+            "emails": emails,
+            "count": len(emails)
+        })
+    except Exception as e:
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
+async def sync_emails(request):
+    """Incrementally sync the mailbox via Graph delta queries"""
+    try:
+        data = await read_json(request) or {}
+        if data.get('reset'):
+            await asyncio.to_thread(ms_graph.reset_sync, data.get('folder', 'inbox'))
+        result = await async_graph.sync_emails(
+            folder=data.get('folder', 'inbox'),
+            page_size=data.get('pageSize', 50)
+        )
+        await asyncio.to_thread(message_store.upsert_messages, result['changed'])
+        await asyncio.to_thread(message_store.delete_messages, result['removed'])
+
+        return JSONResponse({
+            "success": True,
+            "emails": result['changed'],
+            "removed": result['removed'],
+            "fullSync": result['full_sync'],
+            "count": len(result['changed'])
+        })
+    except Exception as e:
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
+async def generate_reply(request):
+    """Generate reply draft using Cohere AI"""
+    try:
+        data = await read_json(request)
+        email = data.get('email')
+        if email is None and data.get('emailId'):
+            stored = await asyncio.to_thread(message_store.get_messages, [data['emailId']])
+            if not stored:
+                return JSONResponse({"success": False, "error": "Email not found"}, status_code=404)
+            email = stored[0]
+
+        # Skip reply generation for spam
+        if email.get('category') == 'Spam':
+            return JSONResponse({
+                "success": False,
+                "message": "Reply generation skipped for spam emails"
+            })
+
+        if not data.get('regenerate'):
+            ready = await asyncio.to_thread(draft_generator.ready_draft, email)
+            if ready is not None:
+                if data.get('stream'):
+                    return sse_response(
+                        iterate(ready_events(ready)),
+                        on_done=lambda reply_body: {"draft": ready, "ready": True}
+                    )
+                return JSONResponse({"success": True, "draft": ready, "degraded": False, "ready": True})
+
+        body = draft_generator.reply_body(email)
+        prompt_hash = draft_generator.prompt_hash()
+
+        def save_draft(reply_body):
+            return draft_generator.save(email, reply_body, prompt_hash)
+
+        if data.get('stream'):
+            return sse_response(
+                async_cohere.generate_reply_stream(body, email['subject']),
+                on_done=lambda reply_body: {"draft": save_draft(reply_body)}
+            )
+
+        reply_body = await async_cohere.generate_reply(body, email['subject'])
+        draft = await asyncio.to_thread(save_draft, reply_body)
+
+        return JSONResponse({
+            "success": True,
+            "draft": draft,
+            "degraded": is_degraded(reply_body)
+        })
+    except Exception as e:
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
+async def send_reply(request):
+    """Send a generated reply draft via MS Graph."""
+    try:
+        data = await read_json(request)
+        draft = data.get('draft') or {}
+        subject = draft.get('subject') or data.get('subject')
+        body = draft.get('body') or data.get('body')
+        recipient = draft.get('recipient') or data.get('recipient')
+
+        if not (subject and body and recipient):
+            return JSONResponse({"success": False, "error": "Missing subject, body, or recipient"}, status_code=400)
+        result = await async_graph.send_mail(subject, body, recipient)
+        return JSONResponse({"success": True, "result": result})
+    except Exception as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+# ============= Chat Agent Endpoint =============
+
+async def chat(request):
+    """Chat with Cohere AI assistant"""
+    try:
+        data = await read_json(request)
+        message = data.get('message')
+        context = data.get('context', {})
+        documents = await asyncio.to_thread(flask_app.retrieve, message)
+        sources = [flask_app.source_summary(document) for document in documents]
+
+        if data.get('stream'):
+            return sse_response(
+                async_cohere.chat_assistant_stream(message, context, documents),
+                on_done=lambda text: {"sources": sources}
+            )
+
+        response = await async_cohere.chat_assistant(message, context, documents)
+
+        return JSONResponse({
+            "success": True,
+            "response": response,
+            "sources": sources,
+            "degraded": is_degraded(response)
+        })
+    except Exception as e:
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
+
+async def job_events(request):
+    """Async ``app.job_events``: same messages, kept open until the job finishes."""
+    job_id = request.path_params['job_id']
+    if await asyncio.to_thread(flask_app.job_queue.get, job_id) is None:
+        return JSONResponse({"success": False, "error": "Job not found"}, status_code=404)
+    try:
+        after = int(request.query_params.get('after', request.headers.get('last-event-id', 0)))
+    except ValueError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+
+    async def generate(after):
+        while True:
+            text, after, finished = await asyncio.to_thread(flask_app.job_event, job_id, after)
+            yield text
+            if finished:
+                return
+            await asyncio.sleep(Config.JOB_EVENTS_INTERVAL)
+
+    return StreamingResponse(
+        generate(after),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def shutdown():
+    await async_graph.close()
+
+
+app = Starlette(
+    routes=[
+        traced_route('/api/emails/fetch', fetch_emails),
+        traced_route('/api/emails/sync', sync_emails),
+        traced_route('/api/emails/generate-reply', generate_reply),
+        traced_route('/api/emails/send-reply', send_reply),
+        traced_route('/api/chat', chat),
+        traced_route('/api/jobs/{job_id}/events', job_events, methods=['GET']),
+        # Everything else (auth, process, jobs, prompts, stats, health) is served
+        # by the Flask app in worker threads
+        Mount('/', app=WSGIMiddleware(flask_app.app, workers=Config.ASGI_WSGI_THREADS)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    on_shutdown=[shutdown],
+)
@@ -14,20 +14,121 @@ class Config:
     MS_APP_ID = os.getenv('APPLICATION_ID')
     MS_AUTHORITY = 'https://login.microsoftonline.com/common/'
     MS_SCOPES = ['Mail.Read', 'Mail.ReadWrite', 'Mail.ReadBasic']
+    GRAPH_BASE_URL = os.getenv('GRAPH_BASE_URL', 'https://graph.microsoft.com/v1.0/')
+    GRAPH_POOL_SIZE = int(os.getenv('GRAPH_POOL_SIZE', '10'))
+    GRAPH_CONNECT_TIMEOUT = float(os.getenv('GRAPH_CONNECT_TIMEOUT', '5'))
+    GRAPH_READ_TIMEOUT = float(os.getenv('GRAPH_READ_TIMEOUT', '30'))
+    GRAPH_MAX_RETRIES = int(os.getenv('GRAPH_MAX_RETRIES', '4'))
+    GRAPH_PREFER_TEXT_BODY = os.getenv('GRAPH_PREFER_TEXT_BODY', 'False') == 'True'
+    HTML_EXTRACTOR = os.getenv('HTML_EXTRACTOR', 'stream')
     
     # Cohere
     COHERE_API_KEY = os.getenv('COHERE_API_KEY')
     COHERE_MODEL = 'command-r-plus-08-2024'
+    # Alternative API endpoint, e.g. the fake server used by benchmarks/bench_load.py
+    COHERE_BASE_URL = os.getenv('COHERE_BASE_URL') or None
     
     # Storage
     DATA_DIR = 'data'
     TOKEN_CACHE_FILE = os.path.join(DATA_DIR, 'ms_token_cache.json')
     PROMPTS_FILE = os.path.join(DATA_DIR, 'prompts.json')
+    MESSAGE_STORE_FILE = os.path.join(DATA_DIR, 'messages.sqlite3')
+    
+    # Local pre-classifier
+    FAST_CLASSIFIER_ENABLED = os.getenv('FAST_CLASSIFIER_ENABLED', 'True') == 'True'
+    FAST_CLASSIFIER_FILE = os.path.join(DATA_DIR, 'fast_classifier.json')
+    FAST_CLASSIFIER_THRESHOLD = float(os.getenv('FAST_CLASSIFIER_THRESHOLD', '0.9'))
+    FAST_CLASSIFIER_SAMPLE_RATE = float(os.getenv('FAST_CLASSIFIER_SAMPLE_RATE', '0.05'))
+    
+    # LLM result cache
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True') == 'True'
+    LLM_CACHE_FILE = os.getenv('LLM_CACHE_FILE', os.path.join(DATA_DIR, 'llm_cache.sqlite3'))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+    
+    # Near-duplicate reuse: classification/action items of a sufficiently
+    # similar processed email (estimated Jaccard over normalized shingles)
+    NEAR_DUPLICATE_ENABLED = os.getenv('NEAR_DUPLICATE_ENABLED', 'True') == 'True'
+    NEAR_DUPLICATE_FILE = os.getenv('NEAR_DUPLICATE_FILE', os.path.join(DATA_DIR, 'near_duplicates.sqlite3'))
+    NEAR_DUPLICATE_CLASSIFY_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_CLASSIFY_THRESHOLD', '0.9'))
+    NEAR_DUPLICATE_EXTRACT_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_EXTRACT_THRESHOLD', '0.95'))
+    NEAR_DUPLICATE_SAMPLE_RATE = float(os.getenv('NEAR_DUPLICATE_SAMPLE_RATE', '0.05'))
+    NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv('NEAR_DUPLICATE_MAX_ENTRIES', '20000'))
+    
+    # Background jobs ('inprocess' runs workers inside each app process,
+    # 'external' leaves them to `python worker.py`)
+    JOB_STORE_FILE = os.getenv('JOB_STORE_FILE', os.path.join(DATA_DIR, 'jobs.sqlite3'))
+    JOB_WORKER_MODE = os.getenv('JOB_WORKER_MODE', 'inprocess')
+    JOB_WORKER_THREADS = int(os.getenv('JOB_WORKER_THREADS', '1'))
+    JOB_CHUNK_SIZE = int(os.getenv('JOB_CHUNK_SIZE', '10'))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '300'))
+    JOB_EVENTS_INTERVAL = float(os.getenv('JOB_EVENTS_INTERVAL', '1.0'))
+    # Longest a WSGI /api/jobs/<id>/events stream stays open before the
+    # client has to reconnect (keep it well under the gunicorn --timeout)
+    JOB_EVENTS_MAX_SECONDS = float(os.getenv('JOB_EVENTS_MAX_SECONDS', '25'))
+    
+    # Write each processed category back to Outlook as an 'OceanAI: <category>'
+    # category (batched PATCH); messages already tagged skip classification.
+    # Off by default: it writes to the user's mailbox, and every tagged message
+    # comes back in the next delta sync. Optionally also flag messages with a
+    # High priority action item
+    OUTLOOK_CATEGORY_WRITEBACK = os.getenv('OUTLOOK_CATEGORY_WRITEBACK', 'False') == 'True'
+    OUTLOOK_FLAG_HIGH_PRIORITY = os.getenv('OUTLOOK_FLAG_HIGH_PRIORITY', 'False') == 'True'
+    
+    # Reply drafts generated in the background for unread mail in these
+    # categories, while the Cohere limiter has this share of its capacity free
+    DRAFT_PREGENERATE_ENABLED = os.getenv('DRAFT_PREGENERATE_ENABLED', 'True') == 'True'
+    DRAFT_PREGENERATE_CATEGORIES = [
+        c.strip() for c in os.getenv('DRAFT_PREGENERATE_CATEGORIES', 'Clients,Meetings,Work').split(',') if c.strip()
+    ]
+    DRAFT_PREGENERATE_IDLE_FRACTION = float(os.getenv('DRAFT_PREGENERATE_IDLE_FRACTION', '0.5'))
+    DRAFT_PREGENERATE_BATCH_SIZE = int(os.getenv('DRAFT_PREGENERATE_BATCH_SIZE', '10'))
+    DRAFT_PREGENERATE_POLL_SECONDS = float(os.getenv('DRAFT_PREGENERATE_POLL_SECONDS', '60'))
+    
+    # ASGI entry point (`uvicorn asgi:app`): async Graph connection pool and
+    # threads serving the routes that are delegated to the Flask app
+    ASYNC_GRAPH_MAX_CONNECTIONS = int(os.getenv('ASYNC_GRAPH_MAX_CONNECTIONS', '100'))
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '16'))
     
     # API Settings
     MAX_EMAILS_FETCH = 100
     DEFAULT_EMAIL_COUNT = 20
     
+    # Processing engine
+    PROCESS_WORKERS = int(os.getenv('PROCESS_WORKERS', '8'))
+    COHERE_MAX_CONCURRENCY = int(os.getenv('COHERE_MAX_CONCURRENCY', '4'))
+    CLASSIFY_BATCH_TOKEN_BUDGET = int(os.getenv('CLASSIFY_BATCH_TOKEN_BUDGET', '6000'))
+    CLASSIFY_BATCH_MAX_SIZE = int(os.getenv('CLASSIFY_BATCH_MAX_SIZE', '25'))
+    CLASSIFY_TOKEN_BUDGET = int(os.getenv('CLASSIFY_TOKEN_BUDGET', '400'))
+    EXTRACT_TOKEN_BUDGET = int(os.getenv('EXTRACT_TOKEN_BUDGET', '1000'))
+    REPLY_TOKEN_BUDGET = int(os.getenv('REPLY_TOKEN_BUDGET', '1000'))
+    BODY_NORMALIZATION_ENABLED = os.getenv('BODY_NORMALIZATION_ENABLED', 'True') == 'True'
+    
+    # Shared Cohere limiter (per process; 0 disables a bucket)
+    COHERE_REQUESTS_PER_MINUTE = int(os.getenv('COHERE_REQUESTS_PER_MINUTE', '500'))
+    COHERE_TOKENS_PER_MINUTE = int(os.getenv('COHERE_TOKENS_PER_MINUTE', '0'))
+    COHERE_ADAPTIVE_MAX_CONCURRENCY = int(os.getenv('COHERE_ADAPTIVE_MAX_CONCURRENCY', '16'))
+    COHERE_BREAKER_THRESHOLD = int(os.getenv('COHERE_BREAKER_THRESHOLD', '5'))
+    COHERE_BREAKER_RESET_SECONDS = float(os.getenv('COHERE_BREAKER_RESET_SECONDS', '30'))
+    COHERE_LIMITER_MAX_WAIT = float(os.getenv('COHERE_LIMITER_MAX_WAIT', '30'))
+    
+    # Mailbox search index for the chat assistant (BM25 plus optional hashed
+    # embeddings); top-k messages go into the prompt
+    SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'True') == 'True'
+    SEARCH_INDEX_FILE = os.getenv('SEARCH_INDEX_FILE', 'data/search_index.sqlite3')
+    SEARCH_EMBEDDINGS_ENABLED = os.getenv('SEARCH_EMBEDDINGS_ENABLED', 'True') == 'True'
+    SEARCH_EMBEDDING_DIM = int(os.getenv('SEARCH_EMBEDDING_DIM', '128'))
+    CHAT_RETRIEVAL_TOP_K = int(os.getenv('CHAT_RETRIEVAL_TOP_K', '5'))
+    CHAT_RETRIEVAL_TOKEN_BUDGET = int(os.getenv('CHAT_RETRIEVAL_TOKEN_BUDGET', '1500'))
+    
+    # Tracing and metrics: per-worker snapshots merged by /api/metrics;
+    # requests slower than TRACE_SLOW_MS are logged with their spans (-1 disables)
+    METRICS_DIR = os.getenv('METRICS_DIR', 'data/metrics')
+    METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+    TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '2000'))
+    HEALTH_PROBE_TTL = float(os.getenv('HEALTH_PROBE_TTL', '30'))
+    HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '2'))
+    
     @staticmethod
     def validate():
         """Validate required configuration"""
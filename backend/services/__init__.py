@@ -6,5 +6,8 @@ Contains MS Graph, Cohere, and Email Processing services
 from .ms_graph_service import MSGraphService
 from .cohere_service import CohereService
 from .email_processor import EmailProcessor
+from .processing_engine import ProcessingEngine
+from .llm_cache import LLMCache
+from .fast_classifier import FastClassifier
 
-__all__ = ['MSGraphService', 'CohereService', 'EmailProcessor']
\ No newline at end of file
+__all__ = ['MSGraphService', 'CohereService', 'EmailProcessor', 'ProcessingEngine', 'LLMCache', 'FastClassifier']
\ No newline at end of file
@@ -0,0 +1,178 @@
+import asyncio
+import time
+
+from cohere import AsyncClient
+
+from . import telemetry
+from .cohere_service import CHAT_FALLBACK, REPLY_FALLBACK, degraded
+from .tokens import estimate_tokens
+
+
+class AsyncCohereService:
+    """asyncio counterpart of ``CohereService`` for the ASGI entry point.
+
+    Wraps an existing ``CohereService`` and shares its prompts, cache, token
+    budgets and usage counters; only the Cohere calls differ. Operations are
+    the same ``*_steps`` generators the sync service runs, driven here with
+    ``cohere.AsyncClient`` so hundreds of requests can wait on Cohere from a
+    single event loop. The steps between calls (cache and near-duplicate
+    lookups, prompt loading, truncation) block, so they run in worker threads.
+    """
+
+    def __init__(self, service, api_key=None, client=None):
+        self.service = service
+        self.client = client if client is not None else AsyncClient(
+            api_key=api_key, base_url=service.base_url
+        )
+
+    @property
+    def model(self):
+        return self.service.model
+
+    def get_prompts(self):
+        return self.service.get_prompts()
+
+    def update_prompts(self, prompts):
+        self.service.update_prompts(prompts)
+
+    def usage(self):
+        return self.service.usage()
+
+    def plan_classification_batches(self, email_bodies):
+        return self.service.plan_classification_batches(email_bodies)
+
+    async def _chat(self, prompt, temperature, operation='chat'):
+        """Single async Cohere chat call; records call and token usage."""
+        with telemetry.span('llm_call', operation=operation) as attrs:
+            reserved = await self._acquire(prompt)
+            started = time.perf_counter()
+            try:
+                chat_response = await self.client.chat(
+                    model=self.model,
+                    message=prompt,
+                    temperature=temperature,
+                )
+            except Exception as e:
+                self.service._release(reserved, error=e)
+                self.service._observe_call(operation, started, attrs, error=e)
+                raise
+            self.service._release(reserved, self.service._record_usage(chat_response))
+            self.service._observe_call(operation, started, attrs, chat_response)
+        return chat_response.text.strip()
+
+    async def _acquire(self, prompt):
+        """Wait for the sync service's limiter without blocking the loop."""
+        limiter = self.service.limiter
+        if limiter is None:
+            return 0
+        tokens = estimate_tokens(prompt)
+        await limiter.acquire_async(tokens)
+        return tokens
+
+    async def _run(self, steps):
+        """Drive a ``CohereService`` ``*_steps`` generator with async chat calls."""
+        answer, error = None, None
+        while True:
+            done, request = await asyncio.to_thread(_advance, steps, answer, error)
+            if done:
+                return request
+            try:
+                answer, error = await self._chat(*request), None
+            except Exception as e:
+                answer, error = None, e
+
+    async def _chat_stream(self, prompt, temperature, operation='chat'):
+        with telemetry.span('llm_call', operation=operation, stream=True) as attrs:
+            reserved = await self._acquire(prompt)
+            started = time.perf_counter()
+            used_tokens, error, final = None, None, None
+            try:
+                async for event in self.client.chat_stream(
+                    model=self.model,
+                    message=prompt,
+                    temperature=temperature,
+                ):
+                    event_type = getattr(event, 'event_type', None)
+                    if event_type == 'text-generation':
+                        yield event.text
+                    elif event_type == 'stream-end':
+                        final = getattr(event, 'response', None)
+                        used_tokens = self.service._record_usage(final)
+            except BaseException as e:
+                # Includes GeneratorExit and CancelledError: the client disconnected
+                error = e
+                raise
+            finally:
+                self.service._release(reserved, used_tokens, error)
+                self.service._observe_call(operation, started, attrs, final, error)
+
+    async def _stream_events(self, chunks, fallback, label, on_complete=None):
+        """Async ``CohereService._stream_events``: same events, same fallback."""
+        parts = []
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    parts.append(chunk)
+                    yield {'delta': chunk}
+        except Exception as e:
+            print(f"{label} error (chat stream): {e}")
+            if not parts:
+                yield {'delta': fallback}
+            yield {'done': True, 'text': degraded(fallback), 'fallback': True}
+            return
+        text = ''.join(parts).strip()
+        if on_complete is not None:
+            await asyncio.to_thread(on_complete, text)
+        yield {'done': True, 'text': text, 'fallback': False}
+
+    async def classify_email(self, email_body):
+        return await self._run(self.service._classify_email_steps(email_body))
+
+    async def classify_batch(self, email_bodies):
+        return await self._run(self.service._classify_batch_steps(email_bodies))
+
+    async def extract_action_items(self, email_body):
+        return await self._run(self.service._extract_action_items_steps(email_body))
+
+    async def classify_and_extract(self, email_body):
+        return await self._run(self.service._classify_and_extract_steps(email_body))
+
+    async def generate_reply(self, email_body, subject):
+        return await self._run(self.service._generate_reply_steps(email_body, subject))
+
+    async def chat_assistant(self, message, context, documents=None):
+        return await self._run(self.service._chat_assistant_steps(message, context, documents))
+
+    async def generate_reply_stream(self, email_body, subject):
+        """Async generator of ``{'delta'}`` events then ``{'done'}``."""
+        service = self.service
+        prompt, cache_key = await asyncio.to_thread(service._reply_prompt, email_body, subject)
+        cached = await asyncio.to_thread(service._cache_get, cache_key, 'reply')
+        if cached is not None:
+            events = self._stream_events(_aiter([cached]), REPLY_FALLBACK, 'Reply generation')
+        else:
+            events = self._stream_events(
+                self._chat_stream(prompt, 0.4, 'reply'), REPLY_FALLBACK, 'Reply generation',
+                on_complete=lambda reply: service._cache_set(cache_key, reply, 'reply', 'reply_generation')
+            )
+        async for event in events:
+            yield event
+
+    async def chat_assistant_stream(self, message, context, documents=None):
+        """Async generator of ``{'delta'}`` events then ``{'done'}``."""
+        prompt = await asyncio.to_thread(self.service._assistant_prompt, message, context, documents)
+        async for event in self._stream_events(self._chat_stream(prompt, 0.5), CHAT_FALLBACK, 'Chat'):
+            yield event
+
+
+def _advance(steps, answer, error):
+    """Resume ``steps`` with the last answer or error; returns (done, request or result)."""
+    try:
+        return False, steps.throw(error) if error is not None else steps.send(answer)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import httpx
+
+from .graph_transport import IDEMPOTENT_METHODS, GraphTransport, may_resend
+
+
+class AsyncGraphTransport:
+    """asyncio counterpart of ``GraphTransport`` built on ``httpx.AsyncClient``.
+
+    Retry policy, backoff and per-endpoint counters come from the wrapped
+    ``GraphTransport``, so ``stats()`` covers sync and async traffic alike.
+    The client is created lazily inside the running event loop (and again if
+    a different loop starts using the transport).
+    """
+
+    def __init__(self, transport=None, max_connections=100):
+        self.transport = transport or GraphTransport()
+        self.max_connections = max_connections
+        self._client = None
+        self._loop = None
+        self._sleep = asyncio.sleep
+
+    def _get_client(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            connect_timeout, read_timeout = self.transport.timeout
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    async def request(self, method, url, **kwargs):
+        """Send a request, retrying throttled and transient failures."""
+        method = method.upper()
+        transport = self.transport
+        endpoint = transport.endpoint_name(method, url)
+        client = self._get_client()
+        retries = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                response = await client.request(method, url, **kwargs)
+            except (httpx.TransportError, httpx.TimeoutException):
+                if method not in IDEMPOTENT_METHODS or retries >= transport.max_retries:
+                    transport._record(endpoint, time.perf_counter() - started, retries, True)
+                    raise
+                await self._sleep(transport._retry_delay(retries))
+                retries += 1
+                continue
+            if retries < transport.max_retries and may_resend(
+                method, response.status_code, response.headers.get('Retry-After')
+            ):
+                await self._sleep(transport._retry_delay(retries, response))
+                retries += 1
+                continue
+            transport._record(endpoint, time.perf_counter() - started, retries, response.status_code >= 400)
+            return response
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def patch(self, url, **kwargs):
+        return await self.request('PATCH', url, **kwargs)
+
+    def stats(self):
+        return self.transport.stats()
+
+    async def close(self):
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
@@ -0,0 +1,82 @@
+import asyncio
+
+from .async_graph_transport import AsyncGraphTransport
+
+
+class AsyncMSGraphService:
+    """asyncio counterpart of the mail operations of ``MSGraphService``.
+
+    Authentication, delta state and email parsing stay with the wrapped
+    ``MSGraphService``; token lookups (MSAL, file locks), delta state file
+    I/O and email parsing run in worker threads so they never block the
+    event loop.
+    """
+
+    def __init__(self, ms_graph, transport=None):
+        self.ms_graph = ms_graph
+        self.transport = transport or AsyncGraphTransport(ms_graph.transport)
+
+    @property
+    def base_url(self):
+        return self.ms_graph.base_url
+
+    async def get_access_token(self):
+        return await asyncio.to_thread(self.ms_graph.get_access_token)
+
+    async def fetch_emails(self, count=20):
+        """Fetch emails from Outlook"""
+        access_token = await self.get_access_token()
+        endpoint = f"{self.base_url}me/messages?$top={count}"
+        headers = self.ms_graph._body_headers({
+            'Authorization': f'Bearer {access_token}'
+        })
+
+        response = await self.transport.get(endpoint, headers=headers)
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch emails: {response.text}")
+
+        items = response.json().get('value', [])
+        return await asyncio.to_thread(
+            lambda: [self.ms_graph._parse_email(item) for item in items]
+        )
+
+    async def sync_emails(self, folder='inbox', page_size=50, account_key=None):
+        """Async ``MSGraphService.sync_emails``; same result and delta state."""
+        ms_graph = self.ms_graph
+        access_token = await self.get_access_token()
+        account_key = account_key or await asyncio.to_thread(ms_graph._current_account_key)
+        state_key = f"{account_key}:{folder}"
+        headers = ms_graph._delta_headers(access_token, page_size)
+
+        url, full_sync = await asyncio.to_thread(ms_graph._delta_start, state_key, folder)
+
+        changed, removed = {}, set()
+        delta_link = None
+        while url:
+            response = await self.transport.get(url, headers=headers)
+            if response.status_code == 410 and not full_sync:
+                # Delta token expired or was invalidated: start over
+                await asyncio.to_thread(ms_graph._save_delta_link, state_key, None)
+                return await self.sync_emails(folder, page_size, account_key)
+            url, delta_link = ms_graph._merge_delta_page(response, changed, removed, delta_link)
+
+        return await asyncio.to_thread(
+            ms_graph._finish_delta, state_key, changed, removed, delta_link, full_sync
+        )
+
+    async def send_mail(self, subject, body, to_address):
+        """Send an email via MS Graph API."""
+        access_token = await self.get_access_token()
+        endpoint = f"{self.base_url}me/sendMail"
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
+        }
+        message = self.ms_graph._mail_message(subject, body, to_address)
+        response = await self.transport.post(endpoint, headers=headers, json=message)
+        if response.status_code not in (202, 200):
+            raise Exception(f"Failed to send mail: {response.status_code} {response.text}")
+        return {"status": "sent"}
+
+    async def close(self):
+        await self.transport.close()
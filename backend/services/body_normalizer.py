@@ -0,0 +1,168 @@
+"""
+Body normalization ahead of LLM calls.
+
+Removes quoted reply history, signatures and legal footers from plain-text
+email bodies so the tokens sent to Cohere carry the new content of the
+message. Everything removed is kept as ``RemovedSpan`` records with offsets
+into the original text.
+"""
+import re
+from collections import namedtuple
+
+from .tokens import estimate_tokens
+
+RemovedSpan = namedtuple('RemovedSpan', ['kind', 'start', 'end', 'text'])
+
+
+class NormalizedBody(namedtuple('NormalizedBody', ['text', 'removed', 'original_tokens', 'tokens'])):
+    __slots__ = ()
+
+    @property
+    def saved_tokens(self):
+        return self.original_tokens - self.tokens
+
+    def stats(self, include_removed=False):
+        """JSON-friendly summary attached to processed emails."""
+        stats = {
+            'originalTokens': self.original_tokens,
+            'tokens': self.tokens,
+            'savedTokens': self.saved_tokens
+        }
+        if include_removed:
+            stats['removed'] = [{'kind': span.kind, 'text': span.text} for span in self.removed]
+        return stats
+
+
+# Lines that introduce quoted history; everything from here on is old mail
+QUOTE_HEADERS = [
+    re.compile(r'^-{2,}\s*(Original Message|Forwarded message|Mensaje original|Message d\'origine)\s*-{2,}', re.I),
+    re.compile(r'^_{10,}\s*$'),
+    re.compile(r'^On\b.{0,300}\bwrote:\s*$', re.I | re.S),
+    re.compile(r'^Le\b.{0,300}\ba écrit\s*:\s*$', re.I | re.S),
+    re.compile(r'^Am\b.{0,300}\bschrieb\b.{0,120}:\s*$', re.I | re.S),
+    re.compile(r'^El\b.{0,300}\bescribió\s*:\s*$', re.I | re.S),
+]
+# Outlook-style header block: "From:" followed closely by "Sent:"/"Date:" and "Subject:"
+HEADER_FROM = re.compile(r'^\*?(From|De|Von)\s*:', re.I)
+HEADER_FIELDS = re.compile(r'^\*?(Sent|Date|Subject|To|Cc|Envoyé|Objet|Gesendet|Betreff)\s*:', re.I)
+QUOTED_LINE = re.compile(r'^\s*>')
+
+SIGNATURE_DELIMITER = re.compile(r'^--\s*$')
+MOBILE_SIGNATURES = re.compile(
+    r'^(Sent from my \w+|Sent from (Outlook|Mail) for \w+|Get Outlook for \w+|Sent from Yahoo Mail)',
+    re.I
+)
+# Only the last lines of the new content are searched for a signature
+MAX_SIGNATURE_LINES = 12
+
+# A legal footer starts a line with one of these and runs to the end of the
+# body; the same words inside a sentence of the message are content
+LEGAL_FOOTERS = re.compile(
+    r'[*_\s]*(confidentiality notice|disclaimer\s*:|this (e-?mail|message)( and any (files|attachments)[^.]*)? '
+    r'(is|are|may be) (strictly )?(confidential|privileged|intended (solely|only))|'
+    r'if you are not the intended recipient|intended only for the (person|use)|'
+    r'please consider the environment before printing)',
+    re.I
+)
+# Only the last lines of the new content are searched for a footer
+MAX_FOOTER_LINES = 15
+
+# How many following lines to look at when joining wrapped quote headers
+HEADER_LOOKAHEAD = 3
+
+
+def _line_offsets(lines):
+    offsets, position = [], 0
+    for line in lines:
+        offsets.append(position)
+        position += len(line) + 1
+    return offsets
+
+
+def _find_quote_header(lines):
+    """Index of the first line that starts quoted history, or None."""
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        for extra in range(HEADER_LOOKAHEAD):
+            candidate = ' '.join(l.strip() for l in lines[i:i + extra + 1])
+            if any(pattern.match(candidate) for pattern in QUOTE_HEADERS):
+                return i
+        if HEADER_FROM.match(stripped):
+            window = [l.strip() for l in lines[i + 1:i + 10]]
+            fields = {m.group(1).lower() for m in (HEADER_FIELDS.match(l) for l in window) if m}
+            if len(fields) >= 2 and fields & {'sent', 'date', 'envoyé', 'gesendet'}:
+                return i
+    return None
+
+
+def _find_signature(lines):
+    for i in range(max(0, len(lines) - MAX_SIGNATURE_LINES - 1), len(lines)):
+        if SIGNATURE_DELIMITER.match(lines[i]) or MOBILE_SIGNATURES.match(lines[i].strip()):
+            return i
+    return None
+
+
+def _find_footer(lines):
+    for i in range(max(1, len(lines) - MAX_FOOTER_LINES), len(lines)):
+        if LEGAL_FOOTERS.match(lines[i]) and _footer_runs_to_end(lines, i):
+            return i
+    return None
+
+
+def _footer_runs_to_end(lines, start):
+    """True when every paragraph after the one at ``start`` is legal text too."""
+    for i in range(start + 1, len(lines)):
+        if lines[i].strip() and not lines[i - 1].strip() and not LEGAL_FOOTERS.match(lines[i]):
+            return False
+    return True
+
+
+def normalize_body(text):
+    """Split ``text`` into the new content and the removed boilerplate.
+
+    Bodies that would be left empty (e.g. a bare forward) are returned
+    unchanged so there is always something to classify.
+    """
+    text = text or ''
+    original_tokens = estimate_tokens(text)
+    lines = text.split('\n')
+    offsets = _line_offsets(lines)
+    keep = [True] * len(lines)
+    removed = []
+
+    def remove(kind, start, end):
+        for i in range(start, end):
+            keep[i] = False
+        span_start = offsets[start]
+        span_end = offsets[end - 1] + len(lines[end - 1])
+        removed.append(RemovedSpan(kind, span_start, span_end, text[span_start:span_end]))
+
+    # Trailing sections, outermost first: quoted history, then the footer and
+    # signature of what is left
+    end = len(lines)
+    for kind, finder in (('quote', _find_quote_header), ('footer', _find_footer),
+                         ('signature', _find_signature)):
+        start = finder(lines[:end])
+        if start is not None:
+            remove(kind, start, end)
+            end = start
+
+    # Inline "> " quoted runs inside the new content
+    i = 0
+    while i < end:
+        if QUOTED_LINE.match(lines[i]):
+            j = i
+            while j < end and (QUOTED_LINE.match(lines[j]) or not lines[j].strip()):
+                j += 1
+            remove('quote', i, j)
+            i = j
+        else:
+            i += 1
+
+    kept = '\n'.join(line for line, flag in zip(lines, keep) if flag).strip()
+    if not removed or not kept:
+        return NormalizedBody(text, [], original_tokens, original_tokens)
+    removed.sort(key=lambda span: span.start)
+    return NormalizedBody(kept, removed, original_tokens, estimate_tokens(kept))
@@ -1,25 +1,17 @@
 from cohere import Client
 import json
 import os
+import threading
+import time
 
-class CohereService:
-    def __init__(self, api_key):
-        self.client = Client(api_key=api_key)
-        # Updated to use Cohere Chat API (Generate removed Sept 15 2025)
-        self.model = "command-r-plus-08-2024"
-        self.prompts_file = 'data/prompts.json'
-
-        # Ensure data directory exists
-        os.makedirs('data', exist_ok=True)
+from . import telemetry
+from .llm_cache import LLMCache
+from .prompt_store import PromptStore
+from .rate_limiter import is_cancellation
+from .tokens import estimate_tokens, truncate_to_budget
 
-        # Load or create prompts
-        if not os.path.exists(self.prompts_file):
-            self._create_default_prompts()
-    
-    def _create_default_prompts(self):
-        """Create default prompt templates"""
-        default_prompts = {
-            "classification": """You are an expert email classifier for a maritime logistics company (OceanAI).
+DEFAULT_PROMPTS = {
+    "classification": """You are an expert email classifier for a maritime logistics company (OceanAI).
 
 Classify the following email into ONE of these categories:
 - Work: Business operations, projects, coordination
@@ -36,8 +28,8 @@ Classify the following email into ONE of these categories:
 - Spam: Unsolicited, suspicious, or unwanted emails
 
 Respond with ONLY the category name, nothing else.""",
-            
-            "action_items": """Extract specific action items from this email.
+    
+    "action_items": """Extract specific action items from this email.
 
 Identify concrete tasks that require action. Return a JSON array.
 
@@ -51,8 +43,8 @@ Each task should have:
 If no action items, return: []
 
 Email:""",
-            
-            "reply_generation": """You are an email assistant for OceanAI, a maritime logistics company.
+    
+    "reply_generation": """You are an email assistant for OceanAI, a maritime logistics company.
 
 Draft a professional reply to this email. Guidelines:
 - Professional and concise tone
@@ -63,8 +55,8 @@ Draft a professional reply to this email. Guidelines:
 - For inquiries: provide helpful response
 
 Write ONLY the email body, no subject line.""",
-            
-            "chat_assistant": """You are an intelligent email assistant for OceanAI, a maritime logistics company.
+    
+    "chat_assistant": """You are an intelligent email assistant for OceanAI, a maritime logistics company.
 
 Help users:
 - Summarize emails and inbox
@@ -74,111 +66,598 @@ Help users:
 - Provide actionable insights
 
 Be concise, professional, and helpful."""
+}
+
+VALID_CATEGORIES = [
+    'Work', 'Meetings', 'Clients', 'Newsletters', 'HR',
+    'Financial', 'Alerts', 'Technical Support', 'Promotions',
+    'Personal', 'Legal', 'Spam'
+]
+
+# Output contract for the single-call classify + extract mode
+FUSED_INSTRUCTION = """Instead of the answer formats above, return ONLY a JSON object:
+{"category": "<one category name from the list>", "action_items": [{"task": "...", "deadline": "...", "priority": "High/Medium/Low"}]}
+Use an empty action_items array when there are no tasks."""
+
+# Output contract for multi-email batch classification
+BATCH_INSTRUCTION = """Classify EACH email below independently. Return ONLY a JSON object mapping every email ID to its category name, e.g. {"1": "Work", "2": "Spam"}."""
+
+# Input token budget for the email text of each operation (CJK/URL aware,
+# see tokens.estimate_tokens); longer bodies keep their head and tail
+DEFAULT_TOKEN_BUDGETS = {
+    'classify': 400,
+    'action_items': 1000,
+    'reply': 1000,
+    # Shared by all messages retrieved for one chat query
+    'retrieval': 1500,
+}
+
+# Returned (or streamed) when the model cannot be reached
+REPLY_FALLBACK = "Thank you for your email. I will review and respond shortly."
+CHAT_FALLBACK = "I apologize, but I'm having trouble processing your request. Please try again."
+
+# Cache namespaces built from more than one template
+DERIVED_TEMPLATES = {
+    'classify_and_extract': ('classification', 'action_items'),
+}
+
+
+class DegradedStr(str):
+    """Fallback text returned in place of a model answer."""
+    degraded = True
+
+
+class DegradedList(list):
+    """Fallback list returned in place of a model answer."""
+    degraded = True
+
+
+def degraded(value):
+    """Mark a fallback value so it is reported, and never cached, as an answer."""
+    return DegradedList(value) if isinstance(value, list) else DegradedStr(value)
+
+
+def is_degraded(value):
+    return getattr(value, 'degraded', False)
+
+
+class CohereService:
+    def __init__(self, api_key, cache=None, batch_token_budget=6000, batch_max_size=25,
+                 token_budgets=None, limiter=None, base_url=None, near_duplicates=None):
+        # base_url points the client at another endpoint (e.g. the benchmark fake)
+        self.base_url = base_url
+        self.client = Client(api_key=api_key, base_url=base_url)
+        # Updated to use Cohere Chat API (Generate removed Sept 15 2025)
+        self.model = "command-r-plus-08-2024"
+        self.prompts_file = 'data/prompts.json'
+        # Optional LLMCache; None disables result caching
+        self.cache = cache
+        self._usage = {
+            'calls': 0, 'input_tokens': 0, 'output_tokens': 0,
+            'truncated_inputs': 0, 'dropped_tokens': 0
         }
-        
-        with open(self.prompts_file, 'w') as f:
-            json.dump(default_prompts, f, indent=2)
+        self._usage_lock = threading.Lock()
+        # Batch classification packs emails until either limit is reached
+        self.batch_token_budget = batch_token_budget
+        self.batch_max_size = batch_max_size
+        self.token_budgets = dict(DEFAULT_TOKEN_BUDGETS, **(token_budgets or {}))
+        # Optional CohereLimiter shared by every call (sync, async and streaming)
+        self.limiter = limiter
+        # Optional NearDuplicateIndex consulted after an exact cache miss
+        self.near_duplicates = near_duplicates
+
+        # Ensure data directory exists
+        os.makedirs('data', exist_ok=True)
+
+        # Templates are served from memory; the file is only re-read when it changes
+        self.prompt_store = PromptStore(self.prompts_file, DEFAULT_PROMPTS)
     
     def get_prompts(self):
-        """Load prompts from file, regenerating defaults if file is missing or invalid"""
-        try:
-            with open(self.prompts_file, 'r') as f:
-                content = f.read().strip()
-                if not content:
-                    # Empty file – recreate defaults
-                    raise json.JSONDecodeError("empty", content, 0)
-                return json.loads(content)
-        except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
-            # Recreate defaults on any parse error or missing file
-            self._create_default_prompts()
-            with open(self.prompts_file, 'r') as f:
-                return json.load(f)
+        """Return a copy of the current prompt templates"""
+        return dict(self.prompt_store.snapshot())
     
     def update_prompts(self, prompts):
-        """Update prompts file"""
-        with open(self.prompts_file, 'w') as f:
-            json.dump(prompts, f, indent=2)
+        """Update prompts file, invalidating cached results of changed templates"""
+        previous = self.prompt_store.snapshot()
+        self.prompt_store.update(prompts)
+        if self.cache is not None:
+            changed = {
+                name for name in set(previous) | set(prompts)
+                if previous.get(name) != prompts.get(name)
+            }
+            changed |= {
+                derived for derived, sources in DERIVED_TEMPLATES.items()
+                if changed.intersection(sources)
+            }
+            for name in changed:
+                self.cache.invalidate_template(name)
+    
+    def _cache_key(self, operation, template, text, temperature):
+        if self.cache is None:
+            return None
+        template_hash = PromptStore.template_hash(template)
+        return LLMCache.make_key(operation, self.model, template_hash, text, temperature)
+    
+    def _cache_get(self, key, operation):
+        if key is None:
+            return None
+        with telemetry.span('llm_cache', operation=operation) as attrs:
+            try:
+                value = self.cache.get(key)
+            except Exception as e:
+                print(f"LLM cache read error: {e}")
+                value = None
+            attrs['result'] = 'miss' if value is None else 'hit'
+        telemetry.inc('oceanai_llm_cache_total', operation=operation, result=attrs['result'])
+        return value
+    
+    def _cache_set(self, key, value, operation, template_name):
+        if key is None or is_degraded(value):
+            return
+        try:
+            self.cache.set(key, value, operation, template_name)
+        except Exception as e:
+            print(f"LLM cache write error: {e}")
+    
+    def _near_duplicate(self, operation, template, text):
+        """Answer reusable from a near-identical earlier input, or None."""
+        if self.near_duplicates is None:
+            return None
+        try:
+            return self.near_duplicates.lookup(operation, PromptStore.template_hash(template), text)
+        except Exception as e:
+            print(f"Near-duplicate lookup error: {e}")
+            return None
+
+    def _near_duplicate_add(self, operation, template, text, value, match=None):
+        """Index a model answer, or report it for a reuse sampled for audit."""
+        if self.near_duplicates is None or is_degraded(value):
+            return
+        try:
+            if match is not None:
+                self.near_duplicates.record_audit(match, value)
+            else:
+                self.near_duplicates.add(operation, PromptStore.template_hash(template), text, value)
+        except Exception as e:
+            print(f"Near-duplicate write error: {e}")
+
+    def _chat(self, prompt, temperature, operation='chat'):
+        """Single Cohere chat call; records call and token usage."""
+        with telemetry.span('llm_call', operation=operation) as attrs:
+            reserved = self._acquire(prompt)
+            started = time.perf_counter()
+            try:
+                chat_response = self.client.chat(
+                    model=self.model,
+                    message=prompt,
+                    temperature=temperature,
+                )
+            except Exception as e:
+                self._release(reserved, error=e)
+                self._observe_call(operation, started, attrs, error=e)
+                raise
+            self._release(reserved, self._record_usage(chat_response))
+            self._observe_call(operation, started, attrs, chat_response)
+        return chat_response.text.strip()
+    
+    def ping(self, timeout=5):
+        """Cheap authenticated round trip to Cohere (lists one model), for health checks."""
+        self.client.models.list(page_size=1, request_options={'timeout_in_seconds': timeout})
+    
+    def _acquire(self, prompt):
+        """Wait for the limiter; returns the tokens reserved for ``prompt``."""
+        if self.limiter is None:
+            return 0
+        tokens = estimate_tokens(prompt)
+        self.limiter.acquire(tokens)
+        return tokens
+    
+    def _release(self, reserved, used_tokens=None, error=None):
+        if self.limiter is not None:
+            self.limiter.release(reserved, used_tokens, error)
+    
+    @staticmethod
+    def _billed_tokens(chat_response):
+        """``(input_tokens, output_tokens)`` billed for a call, or None when not reported."""
+        billed = getattr(getattr(chat_response, 'meta', None), 'billed_units', None)
+        if billed is None:
+            return None
+        return (int(getattr(billed, 'input_tokens', 0) or 0),
+                int(getattr(billed, 'output_tokens', 0) or 0))
+
+    def _record_usage(self, chat_response):
+        """Count one call; returns its billed tokens, or None when not reported."""
+        billed = self._billed_tokens(chat_response)
+        input_tokens, output_tokens = billed or (0, 0)
+        with self._usage_lock:
+            self._usage['calls'] += 1
+            self._usage['input_tokens'] += input_tokens
+            self._usage['output_tokens'] += output_tokens
+        return input_tokens + output_tokens if billed is not None else None
+
+    def _observe_call(self, operation, started, attrs, chat_response=None, error=None):
+        """Export one call's latency, outcome and tokens, and add them to its span."""
+        elapsed = time.perf_counter() - started
+        attrs.update(latency_ms=round(elapsed * 1000, 2),
+                     outcome='ok' if error is None else type(error).__name__)
+        telemetry.observe('oceanai_llm_call_seconds', elapsed, operation=operation)
+        if error is None:
+            outcome = 'ok'
+        elif is_cancellation(error):
+            outcome = 'cancelled'
+        else:
+            outcome = 'error'
+        telemetry.inc('oceanai_llm_calls_total', operation=operation, outcome=outcome)
+        billed = self._billed_tokens(chat_response) if chat_response is not None else None
+        if billed is not None:
+            attrs.update(prompt_tokens=billed[0], completion_tokens=billed[1])
+            telemetry.inc('oceanai_llm_tokens_total', billed[0], operation=operation, kind='prompt')
+            telemetry.inc('oceanai_llm_tokens_total', billed[1], operation=operation, kind='completion')
+    
+    def _run(self, steps):
+        """Drive an operation's ``*_steps`` generator with blocking chat calls.
+
+        Operations are written once as generators that yield ``(prompt,
+        temperature, operation)`` and receive the answer text, or get the call's
+        exception raised at the ``yield``. ``AsyncCohereService`` drives the
+        same generators with the async client.
+        """
+        answer, error = None, None
+        while True:
+            try:
+                request = steps.throw(error) if error is not None else steps.send(answer)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                answer, error = self._chat(*request), None
+            except Exception as e:
+                answer, error = None, e
+    
+    def _chat_stream(self, prompt, temperature, operation='chat'):
+        """Streaming Cohere chat call yielding text deltas; records usage at the end."""
+        with telemetry.span('llm_call', operation=operation, stream=True) as attrs:
+            reserved = self._acquire(prompt)
+            started = time.perf_counter()
+            used_tokens, error, final = None, None, None
+            try:
+                for event in self.client.chat_stream(
+                    model=self.model,
+                    message=prompt,
+                    temperature=temperature,
+                ):
+                    event_type = getattr(event, 'event_type', None)
+                    if event_type == 'text-generation':
+                        yield event.text
+                    elif event_type == 'stream-end':
+                        final = getattr(event, 'response', None)
+                        used_tokens = self._record_usage(final)
+            except BaseException as e:
+                # Includes GeneratorExit: the client disconnected mid-stream
+                error = e
+                raise
+            finally:
+                self._release(reserved, used_tokens, error)
+                self._observe_call(operation, started, attrs, final, error)
+
+    def _stream_events(self, chunks, fallback, label, on_complete=None):
+        """Wrap text deltas as ``{'delta'}`` events plus a final ``{'done'}`` event.
+
+        The final event always carries the complete text. On failure it is
+        the same fallback the non-streaming call returns, flagged with
+        ``fallback: True`` so clients replace any partial output.
+        """
+        parts = []
+        try:
+            for chunk in chunks:
+                if chunk:
+                    parts.append(chunk)
+                    yield {'delta': chunk}
+        except Exception as e:
+            print(f"{label} error (chat stream): {e}")
+            if not parts:
+                yield {'delta': fallback}
+            yield {'done': True, 'text': degraded(fallback), 'fallback': True}
+            return
+        text = ''.join(parts).strip()
+        if on_complete is not None:
+            on_complete(text)
+        yield {'done': True, 'text': text, 'fallback': False}
+
+    def _fit(self, operation, text, record=True):
+        """Truncate ``text`` to the operation's token budget."""
+        truncation = truncate_to_budget(text or '', self.token_budgets[operation])
+        if record:
+            self._record_truncation(truncation)
+        return truncation
+
+    def _record_truncation(self, truncation):
+        if truncation.dropped_tokens:
+            with self._usage_lock:
+                self._usage['truncated_inputs'] += 1
+                self._usage['dropped_tokens'] += truncation.dropped_tokens
+
+    def usage(self):
+        """Cumulative LLM calls, billed tokens and truncated input for this process."""
+        with self._usage_lock:
+            return dict(self._usage)
+    
+    @staticmethod
+    def _normalize_category(text):
+        """Map a model answer onto a valid category, or None if none matches."""
+        category = (text or '').strip().strip('."\'')
+        if category in VALID_CATEGORIES:
+            return category
+        return next(
+            (cat for cat in VALID_CATEGORIES if cat.lower() in category.lower()),
+            None
+        )
+    
+    @staticmethod
+    def _parse_json(text, expected_type):
+        """Parse a JSON payload from a model answer, tolerating code fences and prose."""
+        with telemetry.span('json_parse', expected=expected_type.__name__) as attrs:
+            parsed = CohereService._decode_json(text, expected_type)
+            attrs['result'] = 'invalid' if parsed is None else 'ok'
+        telemetry.inc('oceanai_json_parse_total', result=attrs['result'])
+        return parsed
+
+    @staticmethod
+    def _decode_json(text, expected_type):
+        result = (text or '').strip()
+        if result.startswith('```'):
+            result = result.strip('`').strip()
+            if result.lower().startswith('json'):
+                result = result[4:].strip()
+        opener, closer = ('[', ']') if expected_type is list else ('{', '}')
+        try:
+            parsed = json.loads(result)
+        except ValueError:
+            start, end = result.find(opener), result.rfind(closer)
+            if start == -1 or end <= start:
+                return None
+            try:
+                parsed = json.loads(result[start:end + 1])
+            except ValueError:
+                return None
+        return parsed if isinstance(parsed, expected_type) else None
+    
+    @staticmethod
+    def _normalize_action_items(items):
+        return [
+            {
+                'task': item.get('task') or item.get('action') or '',
+                'deadline': item.get('deadline', 'Not specified'),
+                'priority': item.get('priority', 'Medium')
+            }
+            for item in items if isinstance(item, dict)
+        ]
     
     def classify_email(self, email_body):
         """Classify email using Cohere Chat API (single message signature)."""
-        prompts = self.get_prompts()
+        return self._run(self._classify_email_steps(email_body))
+    
+    def _classify_email_steps(self, email_body, match=False):
+        # ``match`` is the result of a near-duplicate lookup the caller already
+        # made (None: no match); False looks it up here
+        prompts = self.prompt_store.snapshot()
         classification_prompt = prompts['classification']
-        prompt = f"{classification_prompt}\n\nEmail:\n{email_body[:1500]}\n\nReturn ONLY the category." 
+        body = self._fit('classify', email_body).text
+        cache_key = self._cache_key('classify', classification_prompt, body, 0.2)
+        cached = self._cache_get(cache_key, 'classify')
+        if cached is not None:
+            return cached
+        if match is False:
+            match = self._near_duplicate('classify', classification_prompt, body)
+            if match is not None and not match.audit:
+                return match.value
+        prompt = f"{classification_prompt}\n\nEmail:\n{body}\n\nReturn ONLY the category." 
         try:
-            chat_response = self.client.chat(
-                model=self.model,
-                message=prompt,
-                temperature=0.2,
-            )
-            category = chat_response.text.strip()
-            valid_categories = [
-                'Work', 'Meetings', 'Clients', 'Newsletters', 'HR',
-                'Financial', 'Alerts', 'Technical Support', 'Promotions',
-                'Personal', 'Legal', 'Spam'
-            ]
-            if category not in valid_categories:
-                for cat in valid_categories:
-                    if cat.lower() in category.lower():
-                        return cat
-                return 'Work'
+            category = self._normalize_category((yield prompt, 0.2, 'classify')) or 'Work'
+            self._cache_set(cache_key, category, 'classify', 'classification')
+            self._near_duplicate_add('classify', classification_prompt, body, category, match)
             return category
         except Exception as e:
             print(f"Classification error (chat): {e}")
-            return 'Work'
+            return degraded('Work')
+    
+    def plan_classification_batches(self, email_bodies):
+        """Group email indexes into batches that fit the classification token budget."""
+        template = self.prompt_store.snapshot()['classification']
+        overhead = estimate_tokens(template) + estimate_tokens(BATCH_INSTRUCTION)
+        budget = self.token_budgets['classify']
+        batches, current, used = [], [], overhead
+        for index, body in enumerate(email_bodies):
+            cost = min(estimate_tokens(body), budget) + 8
+            if current and (used + cost > self.batch_token_budget or len(current) >= self.batch_max_size):
+                batches.append(current)
+                current, used = [], overhead
+            current.append(index)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+    
+    def classify_batch(self, email_bodies):
+        """Classify several emails with a single chat request.
+
+        Returns categories in input order. Cached emails are not re-sent, and
+        any email missing from the answer or given an invalid label is
+        retried individually through ``classify_email``.
+        """
+        return self._run(self._classify_batch_steps(email_bodies))
+    
+    def _classify_batch_steps(self, email_bodies):
+        prompts = self.prompt_store.snapshot()
+        classification_prompt = prompts['classification']
+        truncations = [self._fit('classify', body, record=False) for body in email_bodies]
+        bodies = [truncation.text for truncation in truncations]
+        keys = [self._cache_key('classify', classification_prompt, body, 0.2) for body in bodies]
+        categories = [self._cache_get(key, 'classify') for key in keys]
+        matches = {}
+        for i, category in enumerate(categories):
+            if category is None:
+                match = self._near_duplicate('classify', classification_prompt, bodies[i])
+                if match is not None and not match.audit:
+                    categories[i] = match.value
+                elif match is not None:
+                    matches[i] = match
+        pending = [i for i, category in enumerate(categories) if category is None]
+        if len(pending) == 1:
+            categories[pending[0]] = yield from self._classify_email_steps(
+                email_bodies[pending[0]], matches.get(pending[0])
+            )
+            return categories
+        if pending:
+            for i in pending:
+                self._record_truncation(truncations[i])
+            sections = "\n\n".join(f"### Email {n}\n{bodies[i]}" for n, i in enumerate(pending, 1))
+            prompt = f"{classification_prompt}\n\n{BATCH_INSTRUCTION}\n\n{sections}"
+            try:
+                labels = self._parse_json((yield prompt, 0.2, 'classify_batch'), dict) or {}
+            except Exception as e:
+                print(f"Batch classification error (chat): {e}")
+                labels = {}
+            for n, i in enumerate(pending, 1):
+                category = self._normalize_category(str(labels.get(str(n), '')))
+                if category is None:
+                    categories[i] = yield from self._classify_email_steps(email_bodies[i], matches.get(i))
+                else:
+                    categories[i] = category
+                    self._cache_set(keys[i], category, 'classify', 'classification')
+                    self._near_duplicate_add('classify', classification_prompt, bodies[i], category,
+                                             matches.get(i))
+        return categories
     
     def extract_action_items(self, email_body):
         """Extract action items using Cohere Chat API returning JSON array."""
-        prompts = self.get_prompts()
+        return self._run(self._extract_action_items_steps(email_body))
+    
+    def _extract_action_items_steps(self, email_body):
+        prompts = self.prompt_store.snapshot()
         action_prompt = prompts['action_items']
         instruction = "Return ONLY a valid JSON array ([] if none)."
-        prompt = f"{action_prompt}\n\n{email_body[:4000]}\n\n{instruction}"
+        body = self._fit('action_items', email_body).text
+        cache_key = self._cache_key('action_items', action_prompt, body, 0.3)
+        cached = self._cache_get(cache_key, 'action_items')
+        if cached is not None:
+            return cached
+        match = self._near_duplicate('action_items', action_prompt, body)
+        if match is not None and not match.audit:
+            return match.value
+        prompt = f"{action_prompt}\n\n{body}\n\n{instruction}"
         try:
-            chat_response = self.client.chat(
-                model=self.model,
-                message=prompt,
-                temperature=0.3,
-            )
-            result = chat_response.text.strip()
-            if result.startswith('```'):
-                result = result.strip('`')
-            try:
-                action_items = json.loads(result)
-                if isinstance(action_items, list):
-                    norm = []
-                    for item in action_items:
-                        if isinstance(item, dict):
-                            norm.append({
-                                'task': item.get('task') or item.get('action') or '',
-                                'deadline': item.get('deadline', 'Not specified'),
-                                'priority': item.get('priority', 'Medium')
-                            })
-                    return norm
-                return []
-            except Exception:
+            action_items = self._parse_json((yield prompt, 0.3, 'action_items'), list)
+            if action_items is None:
                 return []
+            norm = self._normalize_action_items(action_items)
+            self._cache_set(cache_key, norm, 'action_items', 'action_items')
+            self._near_duplicate_add('action_items', action_prompt, body, norm, match)
+            return norm
         except Exception as e:
             print(f"Action extraction error (chat): {e}")
-            return []
+            return degraded([])
+    
+    def classify_and_extract(self, email_body):
+        """Classify and extract action items in one structured call.
+
+        Returns ``(category, action_items)``. Falls back to the two-call path
+        when the combined answer is not a usable JSON object.
+        """
+        return self._run(self._classify_and_extract_steps(email_body))
+    
+    def _classify_and_extract_steps(self, email_body):
+        prompts = self.prompt_store.snapshot()
+        classification_prompt = prompts['classification']
+        action_prompt = prompts['action_items']
+        body = self._fit('action_items', email_body).text
+        template = f"{classification_prompt}\n\n{action_prompt}"
+        cache_key = self._cache_key('classify_and_extract', template, body, 0.2)
+        cached = self._cache_get(cache_key, 'classify_and_extract')
+        if cached is not None:
+            return cached['category'], cached['action_items']
+        prompt = (
+            f"{classification_prompt}\n\nAlso:\n{action_prompt}\n{body}\n\n{FUSED_INSTRUCTION}"
+        )
+        try:
+            answer = yield prompt, 0.2, 'classify_and_extract'
+        except Exception as e:
+            # Provider errors and an open circuit would fail the two separate calls too
+            print(f"Fused classification error (chat): {e}")
+            return degraded('Work'), degraded([])
+        payload = self._parse_json(answer, dict)
+        category = self._normalize_category(str(payload.get('category', ''))) if payload else None
+        action_items = payload.get('action_items') if payload else None
+        if category is None or not isinstance(action_items, list):
+            # Only a malformed answer is worth the two separate calls
+            category = yield from self._classify_email_steps(email_body)
+            action_items = yield from self._extract_action_items_steps(email_body)
+            return category, action_items
+        norm = self._normalize_action_items(action_items)
+        self._cache_set(
+            cache_key, {'category': category, 'action_items': norm},
+            'classify_and_extract', 'classify_and_extract'
+        )
+        return category, norm
     
+    def _reply_prompt(self, email_body, subject):
+        reply_prompt = self.prompt_store.snapshot()['reply_generation']
+        body = self._fit('reply', email_body).text
+        prompt = f"{reply_prompt}\n\nSubject: {subject}\n\nEmail Body:\n{body}"
+        cache_key = self._cache_key('reply', reply_prompt, f"{subject}\n{body}", 0.4)
+        return prompt, cache_key
+
     def generate_reply(self, email_body, subject):
         """Generate email reply using Cohere Chat API."""
-        prompts = self.get_prompts()
-        reply_prompt = prompts['reply_generation']
-        prompt = f"{reply_prompt}\n\nSubject: {subject}\n\nEmail Body:\n{email_body[:4000]}"
+        return self._run(self._generate_reply_steps(email_body, subject))
+    
+    def _generate_reply_steps(self, email_body, subject):
+        prompt, cache_key = self._reply_prompt(email_body, subject)
+        cached = self._cache_get(cache_key, 'reply')
+        if cached is not None:
+            return cached
         try:
-            chat_response = self.client.chat(
-                model=self.model,
-                message=prompt,
-                temperature=0.4,
-            )
-            return chat_response.text.strip()
+            reply = yield prompt, 0.4, 'reply'
+            self._cache_set(cache_key, reply, 'reply', 'reply_generation')
+            return reply
         except Exception as e:
             print(f"Reply generation error (chat): {e}")
-            return "Thank you for your email. I will review and respond shortly."
+            return degraded(REPLY_FALLBACK)
+
+    def generate_reply_stream(self, email_body, subject):
+        """Streaming ``generate_reply``: yields ``{'delta'}`` events then ``{'done'}``."""
+        prompt, cache_key = self._reply_prompt(email_body, subject)
+        cached = self._cache_get(cache_key, 'reply')
+        if cached is not None:
+            return self._stream_events([cached], REPLY_FALLBACK, 'Reply generation')
+        return self._stream_events(
+            self._chat_stream(prompt, 0.4, 'reply'), REPLY_FALLBACK, 'Reply generation',
+            on_complete=lambda reply: self._cache_set(cache_key, reply, 'reply', 'reply_generation')
+        )
     
-    def chat_assistant(self, message, context):
-        """General chat assistant using Cohere Chat API."""
-        prompts = self.get_prompts()
+    def _format_documents(self, documents):
+        """Retrieved messages as numbered excerpts within the retrieval token budget.
+
+        Each message gets an equal share of what is left, so budget unused by
+        short messages goes to the ones after them.
+        """
+        budget = self.token_budgets['retrieval']
+        sections, used = [], 0
+        for n, document in enumerate(documents):
+            header = (
+                f"[{n + 1}] {document.get('receivedDateTime', '')} | From: {document.get('from', '')}"
+                f" | Subject: {document.get('subject', '')}"
+            )
+            share = (budget - used) // (len(documents) - n) - estimate_tokens(header)
+            if share <= 0:
+                break
+            body = truncate_to_budget(document.get('body') or '', share).text
+            section = f"{header}\n{body}"
+            sections.append(section)
+            used += estimate_tokens(section)
+        return "\n\n".join(sections)
+
+    def _assistant_prompt(self, message, context, documents=None):
+        prompts = self.prompt_store.snapshot()
         assistant_prompt = prompts['chat_assistant']
         context_info_parts = []
         if context.get('emails'):
@@ -193,16 +672,31 @@ Be concise, professional, and helpful."""
             context_info_parts.append(f"Selected Email Subject: {email.get('subject','')}")
             context_info_parts.append(f"From: {email.get('from','')}")
             context_info_parts.append(f"Category: {email.get('category','')}")
+        if documents:
+            context_info_parts.append(
+                f"Relevant emails from the mailbox:\n{self._format_documents(documents)}"
+            )
         context_blob = "\n".join(context_info_parts)
-        prompt = f"{assistant_prompt}\n\nContext:\n{context_blob}\n\nUser Query:\n{message}"
+        return f"{assistant_prompt}\n\nContext:\n{context_blob}\n\nUser Query:\n{message}"
+
+    def chat_assistant(self, message, context, documents=None):
+        """General chat assistant using Cohere Chat API.
+
+        ``documents`` are messages retrieved for the query (see
+        ``SearchIndex.search``); they are quoted in the prompt.
+        """
+        return self._run(self._chat_assistant_steps(message, context, documents))
+    
+    def _chat_assistant_steps(self, message, context, documents=None):
+        prompt = self._assistant_prompt(message, context, documents)
         try:
-            chat_response = self.client.chat(
-                model=self.model,
-                message=prompt,
-                temperature=0.5,
-            )
-            return chat_response.text.strip()
+            return (yield prompt, 0.5, 'chat')
         except Exception as e:
             print(f"Chat error (assistant): {e}")
-            return "I apologize, but I'm having trouble processing your request. Please try again."
+            return degraded(CHAT_FALLBACK)
+
+    def chat_assistant_stream(self, message, context, documents=None):
+        """Streaming ``chat_assistant``: yields ``{'delta'}`` events then ``{'done'}``."""
+        prompt = self._assistant_prompt(message, context, documents)
+        return self._stream_events(self._chat_stream(prompt, 0.5), CHAT_FALLBACK, 'Chat')
 
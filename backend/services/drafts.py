@@ -0,0 +1,185 @@
+"""
+Server-side reply drafts and their background pre-generation.
+
+A draft records the hash of the subject and body it answers and of the
+``reply_generation`` template it was written with; when either changes the
+``MessageStore`` drops it (or flags it ``stale`` if the user edited it).
+``DraftGenerator`` writes drafts for unread high-priority mail after each
+processed batch, only while the shared Cohere limiter has headroom, so
+opening such an email finds its reply ready.
+"""
+import os
+import socket
+import threading
+import uuid
+
+from . import telemetry
+from .body_normalizer import normalize_body
+from .cohere_service import is_degraded
+from .message_store import content_hash
+from .prompt_store import PromptStore
+
+# Categories whose replies are worth generating before they are asked for
+PREGENERATE_CATEGORIES = ('Clients', 'Meetings', 'Work')
+
+
+def draft_id(email_id):
+    return f"draft_{email_id}"
+
+
+def ready_events(draft):
+    """Stream events replaying a stored draft, in the shape of a generated reply."""
+    return [{'delta': draft['body']}, {'done': True, 'text': draft['body'], 'fallback': False}]
+
+
+def build_draft(email, reply_body, prompt_hash, origin='generated'):
+    return {
+        'id': draft_id(email['id']),
+        'originalEmailId': email['id'],
+        'subject': f"Re: {email['subject']}",
+        'body': reply_body,
+        'recipient': email['from'],
+        'createdAt': email['receivedDateTime'],
+        'sourceHash': content_hash(email),
+        'promptHash': prompt_hash,
+        'origin': origin,
+    }
+
+
+class DraftGenerator:
+    """Generates and serves reply drafts kept in a ``MessageStore``.
+
+    ``notify()`` wakes the background thread, which drafts replies for unread
+    processed messages in ``categories`` newest first. Before each call it
+    waits until the limiter has at least ``idle_fraction`` of its concurrency
+    and bucket capacity free, so interactive requests keep priority. Messages
+    are claimed with a lease so several workers sharing the store don't draft
+    the same reply.
+    """
+
+    def __init__(self, store, cohere_service, limiter=None, categories=PREGENERATE_CATEGORIES,
+                 normalize_bodies=True, idle_fraction=0.5, batch_size=10, poll_interval=60.0,
+                 lease_seconds=120, busy_wait=2.0):
+        self.store = store
+        self.cohere = cohere_service
+        # Optional CohereLimiter whose headroom gates background generation
+        self.limiter = limiter
+        self.categories = tuple(categories)
+        self.normalize_bodies = normalize_bodies
+        self.idle_fraction = idle_fraction
+        self.batch_size = batch_size
+        # Also look for work periodically: other workers process mail and edit prompts
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        # Seconds between headroom checks while Cohere is busy
+        self.busy_wait = busy_wait
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def prompt_hash(self):
+        return PromptStore.template_hash(self.cohere.prompt_store.snapshot()['reply_generation'])
+
+    def reply_body(self, email):
+        """Body text the reply is generated from."""
+        if not self.normalize_bodies:
+            return email['body']
+        return normalize_body(email['body']).text
+
+    def ready_draft(self, email):
+        """Stored draft still current for ``email``, or None.
+
+        Drafts the user edited are always returned, flagged ``stale`` when
+        the email changed since.
+        """
+        draft = self.store.get_draft(draft_id(email['id']))
+        if draft is None or draft['origin'] == 'edited':
+            return draft
+        if draft['sourceHash'] != content_hash(email) or draft['promptHash'] != self.prompt_hash():
+            return None
+        return draft
+
+    def save(self, email, reply_body, prompt_hash, origin='generated'):
+        """Build and store the draft for ``reply_body``; fallback replies are not stored."""
+        draft = build_draft(email, reply_body, prompt_hash, origin)
+        if not is_degraded(reply_body):
+            self.store.save_draft(draft)
+        return draft
+
+    def invalidate(self):
+        """Drop generated drafts made with an older reply prompt and regenerate them."""
+        removed = self.store.invalidate_drafts(self.prompt_hash())
+        self.notify()
+        return removed
+
+    def notify(self):
+        """Look for drafts to generate now instead of at the next poll."""
+        self._wake.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='draft-generator', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                generated = self.run_once()
+            except Exception as e:
+                print(f"Draft generator error: {e}")
+                generated = 0
+            if not generated:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def idle(self):
+        """True when the limiter has the configured share of its capacity free."""
+        if self.limiter is None:
+            return True
+        status = self.limiter.status()
+        if status['state'] != 'closed':
+            return False
+        if status['in_flight'] >= status['concurrency_limit'] * self.idle_fraction:
+            return False
+        for available, per_minute in (
+            (status['requests_available'], status['requests_per_minute']),
+            (status['tokens_available'], status['tokens_per_minute']),
+        ):
+            if available is not None and available < per_minute * self.idle_fraction:
+                return False
+        return True
+
+    def run_once(self):
+        """Draft replies for one batch of pending messages; returns how many were stored.
+
+        Stops early when a reply comes back as a fallback, leaving the rest
+        for a later pass.
+        """
+        prompt_hash = self.prompt_hash()
+        generated = 0
+        for email in self.store.pending_drafts(self.categories, prompt_hash, self.batch_size):
+            while not self.idle():
+                if self._stop.wait(self.busy_wait):
+                    return generated
+            if self._stop.is_set():
+                break
+            if not self.store.claim_draft(email['id'], self.worker_id, self.lease_seconds):
+                continue
+            try:
+                reply = self.cohere.generate_reply(self.reply_body(email), email['subject'])
+                if is_degraded(reply):
+                    telemetry.inc('oceanai_drafts_pregenerated_total', result='degraded')
+                    break
+                self.save(email, reply, prompt_hash, origin='pregenerated')
+                telemetry.inc('oceanai_drafts_pregenerated_total', result='stored')
+                generated += 1
+            finally:
+                self.store.release_draft(email['id'], self.worker_id)
+        return generated
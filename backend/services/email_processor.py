@@ -1,27 +1,307 @@
+from functools import partial
+
+from .body_normalizer import normalize_body
+from .cohere_service import VALID_CATEGORIES, is_degraded
+from .fast_classifier import NO_PREDICTION, Prediction
+from .ms_graph_service import oceanai_category
+from .processing_engine import ProcessingEngine
+from .threads import group_threads, merge_action_items, thread_text
+
+# Categories that never carry action items worth extracting
+SKIP_ACTION_CATEGORIES = ('Spam', 'Newsletters', 'Promotions')
+
+# 'standard' makes separate classify and extract calls, 'fused' makes one combined
+# call per email, 'batch' classifies many emails per call before extracting,
+# 'thread' classifies each conversation once and merges its action items
+PROCESSING_MODES = ('standard', 'fused', 'batch', 'thread')
+
+
 class EmailProcessor:
-    def __init__(self, ms_graph_service, cohere_service):
+    def __init__(self, ms_graph_service, cohere_service, engine=None, fast_classifier=None, store=None,
+                 normalize_bodies=True, drafts=None, write_back=False, flag_priority=False):
         self.ms_graph = ms_graph_service
         self.cohere = cohere_service
+        self.engine = engine or ProcessingEngine()
+        # Optional FastClassifier consulted before any classification call
+        self.fast_classifier = fast_classifier
+        # Optional MessageStore that receives fetched messages and results
+        self.store = store
+        # Strip quoted history, signatures and legal footers before LLM calls
+        self.normalize_bodies = normalize_bodies
+        # Optional DraftGenerator woken once a batch's results are stored
+        self.drafts = drafts
+        # Tag processed messages with their category in Outlook (and flag
+        # those with High priority action items); tagged messages skip
+        # classification wherever they are fetched again
+        self.write_back = write_back
+        self.flag_priority = flag_priority
     
-    def fetch_and_process(self, count=20):
+    def fetch_and_process(self, count=20, mode='standard'):
         """Fetch emails and process them with AI"""
-        # Fetch emails
         emails = self.ms_graph.fetch_emails(count)
-        
-        # Process each email
-        processed = []
-        for email in emails:
-            # Classify
-            category = self.cohere.classify_email(email['body'])
-            email['category'] = category
-            
-            # Extract action items (skip spam)
-            if category not in ['Spam', 'Newsletters', 'Promotions']:
-                action_items = self.cohere.extract_action_items(email['body'])
-                email['actionItems'] = action_items
+        if self.store is not None:
+            self.store.upsert_messages(emails)
+        return self.process_emails(emails, mode)
+
+    def process_emails(self, emails, mode='standard', include_removed=False):
+        """Classify and extract action items for a batch, in input order.
+
+        Emails run concurrently on the shared engine; an email that fails is
+        returned with an ``error`` field instead of failing the batch. With
+        ``include_removed`` each email's ``bodyStats`` also lists the text
+        stripped before the LLM calls.
+        """
+        if mode not in PROCESSING_MODES:
+            raise ValueError(f"Unknown processing mode: {mode}")
+        if mode == 'batch':
+            results = self._process_batch(emails, include_removed)
+        elif mode == 'thread':
+            results = self._process_threads(emails, include_removed)
+        else:
+            results = self.engine.map(
+                partial(self._process_email, mode=mode, include_removed=include_removed),
+                emails
+            )
+        processed = self._collect(emails, results)
+        if self.store is not None:
+            self.store.save_results(processed)
+            if self.drafts is not None:
+                self.drafts.notify()
+        if self.write_back:
+            self._write_back(processed)
+        return processed
+
+    def _write_back(self, emails):
+        try:
+            results = self.ms_graph.write_back_categories(emails, self.flag_priority)
+        except Exception as e:
+            print(f"Outlook category write-back error: {e}")
+            return
+        by_id = {email.get('id'): email for email in emails}
+        written = {}
+        for result in results:
+            if result['success']:
+                written[result['id']] = by_id[result['id']]['categories']
             else:
+                print(f"Outlook category write-back failed for {result['id']}: {result['error']}")
+        if self.store is not None and written:
+            # Keep the tag with the stored copy so later passes don't write it again
+            self.store.set_outlook_categories(written)
+
+    def _collect(self, emails, results):
+        """Merge engine results back into emails, flagging failures."""
+        processed = []
+        for email, (result, error) in zip(emails, results):
+            if error is not None:
+                print(f"Processing error for email {email.get('id')}: {error}")
+                email['category'] = email.get('category') or 'Work'
                 email['actionItems'] = []
-            
-            processed.append(email)
-        
+                email['error'] = str(error)
+                result = email
+            processed.append(result)
         return processed
+
+    def _fast_predict(self, email):
+        # A category written back to Outlook earlier is taken as the answer;
+        # tags anyone can type in Outlook must still name a known category
+        tagged = oceanai_category(email.get('categories'))
+        if tagged in VALID_CATEGORIES:
+            return Prediction(tagged, 1.0, 'outlook', False)
+        if self.fast_classifier is None:
+            return NO_PREDICTION
+        return self.fast_classifier.predict(email)
+
+    def _observe(self, email, prediction, category):
+        # Fallback labels are not model answers: never train on them
+        if self.fast_classifier is not None and not is_degraded(category):
+            self.fast_classifier.observe(email, prediction, category)
+
+    @staticmethod
+    def _mark_degraded(email, *values):
+        """Flag emails whose category or action items are fallbacks."""
+        if any(is_degraded(value) for value in values):
+            email['degraded'] = True
+
+    def _llm_body(self, email, include_removed=False):
+        """Body text sent to Cohere, recording the token savings on the email."""
+        if not self.normalize_bodies:
+            return email['body']
+        normalized = normalize_body(email['body'])
+        email['bodyStats'] = normalized.stats(include_removed)
+        return normalized.text
+
+    @staticmethod
+    def _is_fast_hit(prediction):
+        return prediction.category is not None and not prediction.audit
+
+    def _process_email(self, email, mode='standard', include_removed=False):
+        """Classify one email, then extract its action items (skip spam)."""
+        body = self._llm_body(email, include_removed)
+        prediction = self._fast_predict(email)
+        if self._is_fast_hit(prediction):
+            category = prediction.category
+        elif mode == 'fused':
+            with self.engine.limit('cohere'):
+                category, action_items = self.cohere.classify_and_extract(body)
+            self._observe(email, prediction, category)
+            self._mark_degraded(email, category, action_items)
+            email['category'] = category
+            email['actionItems'] = action_items if category not in SKIP_ACTION_CATEGORIES else []
+            return email
+        else:
+            with self.engine.limit('cohere'):
+                category = self.cohere.classify_email(body)
+            self._observe(email, prediction, category)
+            self._mark_degraded(email, category)
+        email['category'] = category
+
+        if category in SKIP_ACTION_CATEGORIES:
+            email['actionItems'] = []
+            return email
+        return self._extract(email, body)
+
+    def _process_batch(self, emails, include_removed=False):
+        """Classify in token-budgeted multi-email calls, then extract per email."""
+        results = [None] * len(emails)
+        classified = []
+        indexes = []
+        predictions = {}
+        llm_bodies = {}
+        for i, email in enumerate(emails):
+            if 'body' not in email:
+                results[i] = (None, KeyError('body'))
+                continue
+            llm_bodies[i] = self._llm_body(email, include_removed)
+            prediction = self._fast_predict(email)
+            if self._is_fast_hit(prediction):
+                email['category'] = prediction.category
+                classified.append(i)
+            else:
+                predictions[i] = prediction
+                indexes.append(i)
+
+        bodies = [llm_bodies[i] for i in indexes]
+        groups = self.cohere.plan_classification_batches(bodies) if bodies else []
+        group_results = self.engine.map(
+            lambda group: self._classify_group([bodies[j] for j in group]),
+            groups
+        )
+        for group, (categories, error) in zip(groups, group_results):
+            for position, j in enumerate(group):
+                i = indexes[j]
+                if error is not None:
+                    results[i] = (None, error)
+                    continue
+                emails[i]['category'] = categories[position]
+                self._observe(emails[i], predictions[i], categories[position])
+                self._mark_degraded(emails[i], categories[position])
+                classified.append(i)
+
+        to_extract = []
+        for i in sorted(classified):
+            if emails[i]['category'] in SKIP_ACTION_CATEGORIES:
+                emails[i]['actionItems'] = []
+                results[i] = (emails[i], None)
+            else:
+                to_extract.append(i)
+
+        extracted = self.engine.map(lambda i: self._extract(emails[i], llm_bodies[i]), to_extract)
+        for i, result in zip(to_extract, extracted):
+            results[i] = result
+        return results
+
+    def _process_threads(self, emails, include_removed=False):
+        """Classify each conversation once, extract from each message's new content.
+
+        A thread is classified on the normalized bodies of its messages
+        (newest first), or takes the category already stored for it. Action
+        items repeated across the thread, including ones stored for earlier
+        messages, are kept only on the message that first mentions them.
+        """
+        results = [None] * len(emails)
+        llm_bodies = {}
+        for i, email in enumerate(emails):
+            if 'body' not in email:
+                results[i] = (None, KeyError('body'))
+                continue
+            llm_bodies[i] = self._llm_body(email, include_removed)
+        threads = group_threads(emails, list(llm_bodies))
+        known = {}
+        if self.store is not None:
+            known = self.store.get_thread_results(
+                [emails[thread[0]].get('conversationId') for thread in threads],
+                exclude_ids=[email.get('id') for email in emails]
+            )
+
+        categories = self.engine.map(
+            lambda thread: self._classify_thread(emails, thread, llm_bodies, known),
+            threads
+        )
+        to_extract = []
+        extracting = []
+        for thread, (category, error) in zip(threads, categories):
+            for i in thread:
+                if error is not None:
+                    results[i] = (None, error)
+                    continue
+                emails[i]['category'] = category
+                emails[i]['actionItems'] = []
+                results[i] = (emails[i], None)
+            if error is None and category not in SKIP_ACTION_CATEGORIES:
+                # Messages whose new content repeats an earlier one add nothing
+                seen = set()
+                for i in thread:
+                    if llm_bodies[i] not in seen:
+                        seen.add(llm_bodies[i])
+                        to_extract.append(i)
+                extracting.append(thread)
+
+        extracted = dict(zip(to_extract, self.engine.map(
+            lambda i: self._extract(emails[i], llm_bodies[i]), to_extract
+        )))
+        for thread in extracting:
+            for i in thread:
+                if i in extracted and extracted[i][1] is not None:
+                    results[i] = (None, extracted[i][1])
+            done = [i for i in thread if results[i][1] is None]
+            known_items = known.get(emails[thread[0]].get('conversationId'), {}).get('actionItems', [])
+            merged = merge_action_items([emails[i]['actionItems'] for i in done], known_items)
+            for i, items in zip(done, merged):
+                emails[i]['actionItems'] = items
+        return results
+
+    def _classify_thread(self, emails, thread, llm_bodies, known):
+        stored = known.get(emails[thread[0]].get('conversationId'))
+        if stored and stored['category']:
+            return stored['category']
+        latest = emails[thread[-1]]
+        prediction = self._fast_predict(latest)
+        if self._is_fast_hit(prediction):
+            return prediction.category
+        with self.engine.limit('cohere'):
+            category = self.cohere.classify_email(thread_text([llm_bodies[i] for i in thread]))
+        self._observe(latest, prediction, category)
+        for i in thread:
+            self._mark_degraded(emails[i], category)
+        return category
+
+    def _classify_group(self, bodies):
+        with self.engine.limit('cohere'):
+            return self.cohere.classify_batch(bodies)
+
+    def _stored_action_items(self, email):
+        """Action items already stored for a message tagged in Outlook, or None."""
+        if self.store is None or not email.get('id') or oceanai_category(email.get('categories')) is None:
+            return None
+        stored = self.store.get_results([email['id']]).get(email['id'])
+        return stored['actionItems'] if stored else None
+
+    def _extract(self, email, body):
+        stored = self._stored_action_items(email)
+        if stored is not None:
+            email['actionItems'] = stored
+            return email
+        with self.engine.limit('cohere'):
+            email['actionItems'] = self.cohere.extract_action_items(body)
+        self._mark_degraded(email, email['actionItems'])
+        return email
@@ -0,0 +1,290 @@
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: no cross-process lock
+    fcntl = None
+
+# Prediction.audit is True when a confident fast-path label was sampled for
+# an LLM cross-check; source is 'rule', 'model' or None (no confident label)
+Prediction = namedtuple('Prediction', ['category', 'confidence', 'source', 'audit'])
+
+NO_PREDICTION = Prediction(None, 0.0, None, False)
+
+# (category, confidence, sender local-part pattern)
+SENDER_RULES = [
+    ('Meetings', 0.95, re.compile(r'^(calendar|calendar-notification|meetings?|invites?)$')),
+    ('Newsletters', 0.93, re.compile(r'^(news|newsletters?|digest|weekly|updates|bulletin)$')),
+    ('Promotions', 0.92, re.compile(r'^(marketing|promo(tions)?|offers?|deals|sales)$')),
+    ('Alerts', 0.91, re.compile(r'^(alerts?|notifications?|monitoring)$')),
+]
+
+# (category, subject confidence, body confidence, pattern). List footers,
+# quoted promos and IT notices turn up in ordinary work mail, so a hit only in
+# the body, or on a generic keyword, stays below the default threshold and
+# only adds to what the model or LLM decides
+CONTENT_RULES = [
+    ('Meetings', 0.96, 0.0, re.compile(r'^(updated )?(meeting )?invitation:|^(accepted|declined|tentative):', re.I)),
+    ('Spam', 0.95, 0.8, re.compile(r"you('ve| have) won|claim your (prize|reward)", re.I)),
+    ('Spam', 0.7, 0.6, re.compile(r'verify your account', re.I)),
+    ('Newsletters', 0.9, 0.6, re.compile(r'\b(newsletter|weekly digest)\b', re.I)),
+    ('Newsletters', 0.6, 0.5, re.compile(r'\bunsubscribe\b', re.I)),
+    ('Promotions', 0.9, 0.6, re.compile(r'\b(exclusive offer|special pricing|limited[- ]time offer|\d+% off)\b', re.I)),
+]
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9'$%.-]*")
+
+
+class FastClassifier:
+    """Cheap local pre-classifier that runs before the LLM.
+
+    Sender and subject rules catch the obvious shapes (calendar invites,
+    newsletters, promos, prize spam); a hashed n-gram naive Bayes model
+    trained online from LLM labels handles the rest. Only predictions at or
+    above ``threshold`` skip the LLM, and ``sample_rate`` of those are still
+    sent to the LLM to measure disagreement.
+
+    Every worker process trains on the labels it sees; ``save()`` adds its
+    new counts to the model file rather than replacing it, so the file holds
+    what all workers learned.
+    """
+
+    def __init__(self, model_path='data/fast_classifier.json', threshold=0.9,
+                 sample_rate=0.05, n_features=2 ** 18, min_training=200, save_every=25):
+        self.model_path = model_path
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.n_features = n_features
+        self.min_training = min_training
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._class_docs = {}
+        self._class_tokens = {}
+        self._feature_counts = {}
+        # Counts trained since the last save, added to the file by save()
+        self._pending = _empty_counts()
+        self._unsaved = 0
+        self._metrics = {
+            'predictions': 0, 'rule_hits': 0, 'model_hits': 0, 'llm_fallbacks': 0,
+            'sampled': 0, 'disagreements': 0, 'trained': 0
+        }
+        self._load()
+
+    # ----- features -----
+
+    def _features(self, email):
+        sender = (email.get('from') or '').lower()
+        local, _, domain = sender.partition('@')
+        text = f"{email.get('subject') or ''}\n{(email.get('body') or '')[:2000]}".lower()
+        tokens = TOKEN_RE.findall(text)
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        grams += [f"__from_local:{local}", f"__from_domain:{domain}"]
+        features = {}
+        for gram in grams:
+            index = zlib.crc32(gram.encode('utf-8')) % self.n_features
+            features[index] = features.get(index, 0) + 1
+        return features
+
+    # ----- prediction -----
+
+    def _rule_prediction(self, email):
+        local = (email.get('from') or '').lower().partition('@')[0]
+        subject = email.get('subject') or ''
+        body = (email.get('body') or '')[:2000]
+        best = (None, 0.0)
+        for category, confidence, pattern in SENDER_RULES:
+            if confidence > best[1] and pattern.match(local):
+                best = (category, confidence)
+        for category, confidence, body_confidence, pattern in CONTENT_RULES:
+            if confidence > best[1] and pattern.search(subject):
+                best = (category, confidence)
+            elif body_confidence > best[1] and pattern.search(body):
+                best = (category, body_confidence)
+        return best
+
+    def _model_prediction(self, email):
+        total_docs = sum(self._class_docs.values())
+        if total_docs < self.min_training or len(self._class_docs) < 2:
+            return (None, 0.0)
+        features = self._features(email)
+        n_tokens = sum(features.values())
+        scores = {}
+        for category, docs in self._class_docs.items():
+            counts = self._feature_counts[category]
+            denominator = self._class_tokens[category] + self.n_features
+            likelihood = sum(n * math.log((counts.get(index, 0) + 1) / denominator)
+                             for index, n in features.items())
+            # Per-token average: summed independent log-likelihoods push the
+            # posterior to ~1.0 whatever the evidence, so it can't be compared
+            # to ``threshold``
+            scores[category] = math.log(docs / total_docs) + likelihood / n_tokens
+        top = max(scores.values())
+        norm = sum(math.exp(s - top) for s in scores.values())
+        category = max(scores, key=scores.get)
+        return (category, 1.0 / norm)
+
+    def predict(self, email):
+        """Return a Prediction; ``category`` is None when the LLM must decide."""
+        with self._lock:
+            self._metrics['predictions'] += 1
+            category, confidence = self._rule_prediction(email)
+            source = 'rule'
+            if confidence < self.threshold:
+                category, confidence = self._model_prediction(email)
+                source = 'model'
+            if confidence < self.threshold:
+                self._metrics['llm_fallbacks'] += 1
+                return Prediction(None, confidence, None, False)
+            self._metrics['rule_hits' if source == 'rule' else 'model_hits'] += 1
+            audit = self._random.random() < self.sample_rate
+            if audit:
+                self._metrics['sampled'] += 1
+            return Prediction(category, confidence, source, audit)
+
+    # ----- training / feedback -----
+
+    def observe(self, email, prediction, llm_category):
+        """Record an LLM label: trains the model and scores sampled predictions."""
+        with self._lock:
+            if prediction is not None and prediction.audit and prediction.category != llm_category:
+                self._metrics['disagreements'] += 1
+            self._train(email, llm_category)
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def _train(self, email, category):
+        features = self._features(email)
+        example = {
+            'class_docs': {category: 1},
+            'class_tokens': {category: sum(features.values())},
+            'feature_counts': {category: features},
+        }
+        _add_counts(self._model_counts(), example)
+        _add_counts(self._pending, example)
+        self._metrics['trained'] += 1
+        self._unsaved += 1
+
+    # ----- persistence -----
+
+    def _model_counts(self):
+        return {
+            'class_docs': self._class_docs,
+            'class_tokens': self._class_tokens,
+            'feature_counts': self._feature_counts,
+        }
+
+    def _read_state(self):
+        """Counts in the model file, or None when missing, corrupt or incompatible."""
+        try:
+            with open(self.model_path, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if state.get('n_features') != self.n_features:
+            return None
+        return {
+            'class_docs': state.get('class_docs', {}),
+            'class_tokens': state.get('class_tokens', {}),
+            'feature_counts': {
+                category: {int(k): v for k, v in counts.items()}
+                for category, counts in state.get('feature_counts', {}).items()
+            },
+        }
+
+    def _load(self):
+        state = self._read_state()
+        if state is not None:
+            self._class_docs = state['class_docs']
+            self._class_tokens = state['class_tokens']
+            self._feature_counts = state['feature_counts']
+
+    @contextmanager
+    def _model_file_lock(self):
+        """Cross-process lock so concurrent saves from workers don't lose counts."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.model_path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self):
+        """Add the counts trained since the last save to the model file.
+
+        Under a file lock the file is re-read (it may hold other workers'
+        saves), this process's new counts are added and the result is
+        written atomically (temp file + rename). The merged counts then
+        replace the in-memory model, so each worker also picks up what the
+        others learned.
+        """
+        directory = os.path.dirname(self.model_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with self._model_file_lock():
+            merged = self._read_state() or _empty_counts()
+            with self._lock:
+                pending, self._pending = self._pending, _empty_counts()
+                self._unsaved = 0
+            _add_counts(merged, pending)
+            payload = json.dumps(dict(merged, n_features=self.n_features))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.fast-classifier-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self.model_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                with self._lock:
+                    _add_counts(self._pending, pending)
+                raise
+        with self._lock:
+            # Keep what was trained while the file was being written
+            _add_counts(merged, self._pending)
+            self._class_docs = merged['class_docs']
+            self._class_tokens = merged['class_tokens']
+            self._feature_counts = merged['feature_counts']
+
+    # ----- metrics -----
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['training_examples'] = sum(self._class_docs.values())
+        predictions = metrics['predictions']
+        hits = metrics['rule_hits'] + metrics['model_hits']
+        metrics['hit_rate'] = round(hits / predictions, 4) if predictions else 0.0
+        metrics['disagreement_rate'] = (
+            round(metrics['disagreements'] / metrics['sampled'], 4) if metrics['sampled'] else 0.0
+        )
+        metrics['threshold'] = self.threshold
+        metrics['sample_rate'] = self.sample_rate
+        return metrics
+
+
+def _empty_counts():
+    return {'class_docs': {}, 'class_tokens': {}, 'feature_counts': {}}
+
+
+def _add_counts(target, counts):
+    """Add model ``counts`` into ``target`` in place."""
+    for field in ('class_docs', 'class_tokens'):
+        totals = target[field]
+        for category, n in counts[field].items():
+            totals[category] = totals.get(category, 0) + n
+    for category, features in counts['feature_counts'].items():
+        totals = target['feature_counts'].setdefault(category, {})
+        for index, n in features.items():
+            totals[index] = totals.get(index, 0) + n
@@ -0,0 +1,240 @@
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import telemetry
+
+# Graph signals throttling/overload with these; Retry-After is honoured when present
+RETRY_STATUSES = (429, 503, 504)
+
+# Only these may be retried after a connection error (the request may have landed)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'PATCH', 'OPTIONS')
+
+# Longest Retry-After honoured; a larger value is clamped to this
+RETRY_AFTER_MAX = 120.0
+
+# Graph JSON batching accepts at most this many requests per $batch call
+BATCH_LIMIT = 20
+
+# Path segments that are resource ids rather than route names
+_ID_SEGMENT = re.compile(r'^(?=.*\d)[A-Za-z0-9_=+\-]{16,}$')
+
+
+def may_resend(method, status, retry_after=None):
+    """Whether a request answered ``status`` may be sent again.
+
+    Idempotent requests are resent on any 429/503/504. A POST (e.g.
+    ``sendMail``) answered 503/504 may already have been carried out, so it
+    is resent only on 429 or a 503 with Retry-After, which Graph sends when
+    it turned the request away.
+    """
+    if status not in RETRY_STATUSES:
+        return False
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    return status == 429 or (status == 503 and bool(retry_after))
+
+
+class GraphTransport:
+    """Pooled HTTP transport for Microsoft Graph with throttling-aware retries.
+
+    One keep-alive ``requests.Session`` is shared by every call. Responses
+    with 429/503/504 are retried with exponential backoff and full jitter,
+    waiting ``Retry-After`` (at most ``retry_after_max`` seconds) when Graph
+    sends it; non-idempotent requests are only resent when Graph turned them
+    away (see ``may_resend``). Latency, error and retry counters are kept per endpoint (ids collapsed to ``{id}``).
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=5, read_timeout=30,
+                 max_retries=4, backoff_base=0.5, backoff_max=30.0,
+                 retry_after_max=RETRY_AFTER_MAX):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._sleep = time.sleep
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def endpoint_name(method, url):
+        """Normalised ``METHOD /path`` label with ids replaced by ``{id}``."""
+        path = urlsplit(url).path
+        segments = ['{id}' if _ID_SEGMENT.match(s) else s for s in path.split('/')]
+        return f"{method.upper()} {'/'.join(segments)}"
+
+    def _retry_delay(self, attempt, response=None, retry_after=None):
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+        if not retry_after:
+            return backoff
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return backoff
+        return min(max(delay, 0.0), self.retry_after_max)
+
+    def _record(self, endpoint, elapsed, retries, failed):
+        with self._stats_lock:
+            entry = self._stats.setdefault(endpoint, {
+                'requests': 0, 'errors': 0, 'retries': 0,
+                'latency_ms_total': 0.0, 'latency_ms_max': 0.0
+            })
+            latency_ms = elapsed * 1000
+            entry['requests'] += 1
+            entry['retries'] += retries
+            entry['errors'] += int(failed)
+            entry['latency_ms_total'] += latency_ms
+            entry['latency_ms_max'] = max(entry['latency_ms_max'], latency_ms)
+        telemetry.record_span('graph_request', elapsed, endpoint=endpoint, retries=retries, failed=failed)
+        telemetry.observe('oceanai_graph_request_seconds', elapsed, endpoint=endpoint)
+        telemetry.inc('oceanai_graph_requests_total', endpoint=endpoint, outcome='error' if failed else 'ok')
+        if retries:
+            telemetry.inc('oceanai_graph_retries_total', retries, endpoint=endpoint)
+
+    def request(self, method, url, max_retries=None, **kwargs):
+        """Send a request, retrying throttled and transient failures.
+
+        ``max_retries`` overrides the transport's limit for this call (0
+        sends it exactly once).
+        """
+        if max_retries is None:
+            max_retries = self.max_retries
+        method = method.upper()
+        endpoint = self.endpoint_name(method, url)
+        kwargs.setdefault('timeout', self.timeout)
+        retries = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if method not in IDEMPOTENT_METHODS or retries >= max_retries:
+                    self._record(endpoint, time.perf_counter() - started, retries, True)
+                    raise
+                self._sleep(self._retry_delay(retries))
+                retries += 1
+                continue
+            if retries < max_retries and may_resend(
+                method, response.status_code, response.headers.get('Retry-After')
+            ):
+                self._sleep(self._retry_delay(retries, response))
+                retries += 1
+                continue
+            self._record(endpoint, time.perf_counter() - started, retries, response.status_code >= 400)
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def batch(self, base_url, operations, headers=None, max_size=BATCH_LIMIT):
+        """Run ``operations`` through Graph JSON batching (``POST {base_url}$batch``).
+
+        Each operation is ``{'method', 'url', 'body'}`` (``body`` optional)
+        with ``url`` relative to the API version, e.g. ``/me/messages/{id}``;
+        they are sent ``max_size`` to a request. The ``$batch`` call itself is
+        never retried; instead items that were not carried out are sent again
+        in a later batch after their longest Retry-After (or backoff), up to
+        ``max_retries`` times (see ``may_resend``). Returns one
+        ``{'status', 'body', 'retries'}`` dict per operation, in input order;
+        items of a ``$batch`` call that failed as a whole get its status, or 0
+        when it never got a response.
+        """
+        results = [None] * len(operations)
+        pending = list(range(len(operations)))
+        attempt = 0
+        while pending:
+            throttled, delay = [], 0.0
+            for start in range(0, len(pending), max_size):
+                chunk = pending[start:start + max_size]
+                for index, (status, body, retry_after) in zip(
+                    chunk, self._send_batch(base_url, [operations[i] for i in chunk], headers)
+                ):
+                    results[index] = {'status': status, 'body': body, 'retries': attempt}
+                    if may_resend(operations[index]['method'], status, retry_after):
+                        throttled.append(index)
+                        delay = max(delay, self._retry_delay(attempt, retry_after=retry_after))
+            if not throttled or attempt >= self.max_retries:
+                break
+            self._sleep(delay)
+            attempt += 1
+            pending = throttled
+
+        for operation, result in zip(operations, results):
+            status = result['status']
+            outcome = 'ok' if 200 <= status < 300 else 'throttled' if status in RETRY_STATUSES else 'error'
+            telemetry.inc('oceanai_graph_batch_items_total',
+                          endpoint=self.endpoint_name(operation['method'], operation['url']), outcome=outcome)
+        return results
+
+    def _send_batch(self, base_url, operations, headers=None):
+        """One ``$batch`` call; ``(status, body, retry_after)`` per operation, in order."""
+        requests_ = []
+        for n, operation in enumerate(operations):
+            item = {'id': str(n), 'method': operation['method'].upper(), 'url': operation['url']}
+            if operation.get('body') is not None:
+                item['body'] = operation['body']
+                item['headers'] = {'Content-Type': 'application/json'}
+            requests_.append(item)
+        try:
+            # Not retried here: batch() decides per item what may be resent
+            response = self.request(
+                'POST', f"{base_url}$batch", max_retries=0,
+                headers=dict(headers or {}, **{'Content-Type': 'application/json'}),
+                json={'requests': requests_}
+            )
+        except requests.RequestException as e:
+            return [(0, {'error': {'code': 'RequestFailed', 'message': str(e)}}, None)] * len(operations)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        if response.status_code >= 400:
+            retry_after = response.headers.get('Retry-After')
+            return [(response.status_code, payload, retry_after)] * len(operations)
+
+        answers = {item.get('id'): item for item in payload.get('responses', [])}
+        missing = {'error': {'code': 'MissingResponse', 'message': 'No response for this request in the batch'}}
+        parsed = []
+        for n in range(len(operations)):
+            answer = answers.get(str(n))
+            if answer is None:
+                parsed.append((0, missing, None))
+                continue
+            item_headers = {name.lower(): value for name, value in (answer.get('headers') or {}).items()}
+            parsed.append((int(answer.get('status', 0)), answer.get('body'), item_headers.get('retry-after')))
+        return parsed
+
+    def stats(self):
+        """Per-endpoint request, error, retry and latency counters."""
+        with self._stats_lock:
+            snapshot = {endpoint: dict(entry) for endpoint, entry in self._stats.items()}
+        for entry in snapshot.values():
+            entry['latency_ms_avg'] = round(entry['latency_ms_total'] / entry['requests'], 2)
+            entry['latency_ms_total'] = round(entry['latency_ms_total'], 2)
+            entry['latency_ms_max'] = round(entry['latency_ms_max'], 2)
+        return snapshot
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,231 @@
+"""HTML-to-text extraction for email bodies.
+
+Two interchangeable engines are registered:
+
+``bs4``
+    The original implementation: build a BeautifulSoup tree with
+    ``html.parser``, drop ``<script>``/``<style>`` and join the strings of
+    ``<body>`` with newlines. Kept as the reference output.
+
+``stream``
+    A single pass over the same ``html.parser`` tokenizer that never builds
+    a tree. It tracks only the open-tag stack and the handful of rules
+    BeautifulSoup applies to text nodes (whitespace collapsing, entity
+    decoding, string containers, the ``<body>`` selection), so it yields
+    exactly the same text as ``bs4`` for any input at a fraction of the cost.
+
+Plain-text bodies (``contentType: text``) skip parsing entirely.
+"""
+import re
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution
+
+from . import telemetry
+
+DEFAULT_ENGINE = 'stream'
+
+# Mirrors the tree-builder defaults of bs4's html.parser backend
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid',
+    'spacer'
+])
+PRESERVE_WHITESPACE_TAGS = frozenset(['pre', 'textarea'])
+# Text inside these never reaches get_text(): script/style are decomposed,
+# the others are stored as non-default string types
+STRING_CONTAINER_TAGS = frozenset(['rt', 'rp', 'style', 'script', 'template'])
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+_NEWLINES = re.compile(r"[\r\n]+")
+
+
+def _clean(text):
+    return _NEWLINES.sub("\n", text.strip())
+
+
+def extract_text_bs4(html):
+    """Reference extractor built on a full BeautifulSoup tree."""
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Remove script and style tags
+    for tag in soup.find_all(["script", "style"]):
+        tag.decompose()
+
+    if soup.body:
+        return soup.body.get_text(separator="\n")
+    return soup.get_text(separator="\n")
+
+
+class _TextCollector(HTMLParser):
+    """Tree-less html.parser consumer that reproduces bs4's text output."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []            # open tag names, innermost last
+        self.counter = {}          # name -> number of open tags with that name
+        self.already_closed = []   # void tags whose end tag should be ignored
+        self.preserve_depth = 0
+        self.container_depth = 0
+        self.pending = []
+        self.all_strings = []
+        self.body_strings = []
+        self.body_depth = None     # stack depth of the first <body>, while open
+        self.seen_body = False
+
+    # -- text nodes -------------------------------------------------------
+
+    def _end_data(self, is_cdata=False, keep=True):
+        if not self.pending:
+            return
+        data = ''.join(self.pending)
+        self.pending = []
+        if not self.preserve_depth and not data.strip(ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        if not keep or (self.container_depth and not is_cdata):
+            return
+        self.all_strings.append(data)
+        if self.body_depth is not None:
+            self.body_strings.append(data)
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def handle_charref(self, name):
+        if name.startswith(('x', 'X')):
+            code = int(name.lstrip('xX'), 16)
+        else:
+            code = int(name)
+        data = None
+        if code < 256:
+            try:
+                data = bytearray([code]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self.pending.append(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.pending.append(character if character is not None else "&%s" % name)
+
+    def _skip(self, data):
+        # Comments, doctypes, declarations and PIs are separate, ignored nodes
+        self._end_data()
+        self.pending.append(data)
+        self._end_data(keep=False)
+
+    def handle_comment(self, data):
+        self._skip(data)
+
+    def handle_decl(self, data):
+        self._skip(data)
+
+    def handle_pi(self, data):
+        self._skip(data)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self._end_data()
+            self.pending.append(data[len('CDATA['):])
+            self._end_data(is_cdata=True)
+        else:
+            self._skip(data)
+
+    # -- tags -------------------------------------------------------------
+
+    def _push(self, name):
+        self.stack.append(name)
+        self.counter[name] = self.counter.get(name, 0) + 1
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+        if name in STRING_CONTAINER_TAGS:
+            self.container_depth += 1
+        if name == 'body' and not self.seen_body:
+            self.seen_body = True
+            self.body_depth = len(self.stack)
+
+    def _pop(self):
+        name = self.stack.pop()
+        self.counter[name] -= 1
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth -= 1
+        if name in STRING_CONTAINER_TAGS:
+            self.container_depth -= 1
+        if self.body_depth is not None and len(self.stack) < self.body_depth:
+            self.body_depth = None
+
+    def _pop_to(self, name):
+        if not self.counter.get(name):
+            return
+        while self.stack:
+            if self.stack[-1] == name:
+                self._pop()
+                return
+            self._pop()
+
+    def handle_starttag(self, tag, attrs, void_close=True):
+        self._end_data()
+        self._push(tag)
+        if void_close and tag in VOID_ELEMENTS:
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, void_close=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed:
+            self.already_closed.remove(tag)
+            return
+        self._end_data()
+        self._pop_to(tag)
+
+    def close(self):
+        super().close()
+        self._end_data()
+
+
+def extract_text_stream(html):
+    """Single-pass extractor producing the same text as ``extract_text_bs4``."""
+    collector = _TextCollector()
+    collector.feed(html)
+    collector.close()
+    strings = collector.body_strings if collector.seen_body else collector.all_strings
+    return "\n".join(strings)
+
+
+EXTRACTORS = {
+    'bs4': extract_text_bs4,
+    'stream': extract_text_stream,
+}
+
+
+def register_extractor(name, func):
+    """Register an alternative ``func(html) -> str`` engine under ``name``."""
+    EXTRACTORS[name] = func
+
+
+def extract_text(content, content_type='html', engine=DEFAULT_ENGINE):
+    """Turn a Graph message body into clean plain text.
+
+    ``content_type`` is the ``body.contentType`` reported by Graph; plain
+    text bodies only get their line breaks normalised.
+    """
+    if not content:
+        return ""
+    if (content_type or 'html').lower() == 'text':
+        return _clean(content)
+    try:
+        extractor = EXTRACTORS[engine]
+    except KeyError:
+        raise ValueError(f"Unknown HTML extractor: {engine}")
+    with telemetry.span('html_extract', engine=engine, chars=len(content)):
+        return _clean(extractor(content))
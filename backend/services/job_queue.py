@@ -0,0 +1,220 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+JOB_KINDS = ('process', 'fetch_and_process')
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    email_id TEXT,
+    result TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobQueue:
+    """Durable SQLite queue for long-running processing jobs.
+
+    Jobs are claimed with a lease so any number of worker threads or
+    processes can share one file; a job whose worker dies is picked up again
+    once its lease runs out and resumes after the last saved result.
+    """
+
+    def __init__(self, path='data/jobs.sqlite3', lease_seconds=300, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    @staticmethod
+    def _row_to_job(row):
+        return {
+            'id': row['id'],
+            'type': row['kind'],
+            'status': row['status'],
+            'total': row['total'],
+            'done': row['done'],
+            'failed': row['failed'],
+            'error': row['error'],
+            'attempts': row['attempts'],
+            'createdAt': row['created_at'],
+            'startedAt': row['started_at'],
+            'finishedAt': row['finished_at'],
+        }
+
+    def submit(self, kind, payload):
+        """Queue a job and return its ID."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job type: {kind}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        total = len(payload['ids']) if payload.get('ids') is not None else None
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (id, kind, payload, status, total, created_at, updated_at)'
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), total, now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim(self, worker_id):
+        """Lease the oldest runnable job to ``worker_id``.
+
+        Returns ``(job_id, kind, payload, offset)`` where ``offset`` is the
+        number of items already finished, or None when nothing is runnable.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued'"
+                    " OR (status = 'running' AND lease_until < ?)"
+                    ' ORDER BY created_at LIMIT 1',
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    self._conn.commit()
+                    return None
+                if row['attempts'] >= self.max_attempts:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ?"
+                        ' WHERE id = ?',
+                        ('Worker lost too many times', now, now, row['id'])
+                    )
+                    self._conn.commit()
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?,"
+                    ' attempts = attempts + 1, started_at = COALESCE(started_at, ?), updated_at = ?'
+                    ' WHERE id = ?',
+                    (worker_id, now + self.lease_seconds, now, now, row['id'])
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return row['id'], row['kind'], json.loads(row['payload']), row['done'] + row['failed']
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend the lease; returns False if the job was cancelled or taken over."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ?"
+                " AND status = 'running'",
+                (now + self.lease_seconds, now, job_id, worker_id)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def set_items(self, job_id, ids):
+        """Pin the message IDs of a job (fetch jobs do this after fetching)."""
+        with self._lock:
+            row = self._conn.execute('SELECT payload FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            payload = dict(json.loads(row['payload']), ids=list(ids))
+            self._conn.execute(
+                'UPDATE jobs SET payload = ?, total = ?, updated_at = ? WHERE id = ?',
+                (json.dumps(payload), len(ids), time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def add_results(self, job_id, results):
+        """Append processed emails and advance the progress counters."""
+        if not results:
+            return
+        failed = sum(1 for result in results if result.get('error'))
+        with self._lock:
+            (start,) = self._conn.execute(
+                'SELECT done + failed FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO job_results (job_id, seq, email_id, result) VALUES (?, ?, ?, ?)',
+                [
+                    (job_id, start + n, result.get('id'), json.dumps(result))
+                    for n, result in enumerate(results, 1)
+                ]
+            )
+            self._conn.execute(
+                'UPDATE jobs SET done = done + ?, failed = failed + ?, updated_at = ? WHERE id = ?',
+                (len(results) - failed, failed, time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def _finish(self, job_id, status, error=None):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, lease_until = NULL, finished_at = ?, updated_at = ?'
+                " WHERE id = ? AND status IN ('queued', 'running')",
+                (status, error, now, now, job_id)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def complete(self, job_id):
+        return self._finish(job_id, 'completed')
+
+    def fail(self, job_id, error):
+        return self._finish(job_id, 'failed', str(error))
+
+    def cancel(self, job_id):
+        """Stop a queued or running job; running workers notice at their next chunk."""
+        return self._finish(job_id, 'cancelled')
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def results(self, job_id, after=0, limit=500):
+        """Results with sequence numbers greater than ``after`` (1-based, in order)."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT seq, result FROM job_results WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?',
+                (job_id, int(after), int(limit))
+            ).fetchall()
+        return [dict(json.loads(row['result']), seq=row['seq']) for row in rows]
+
+    def list_jobs(self, limit=50):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (int(limit),)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
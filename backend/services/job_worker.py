@@ -0,0 +1,86 @@
+import os
+import socket
+import threading
+import uuid
+
+
+class JobWorker:
+    """Runs queued jobs through an ``EmailProcessor``.
+
+    Items are processed in chunks; each chunk's results are saved before the
+    next one starts, so progress survives restarts and clients can read
+    partial results while the job runs. ``start()`` runs worker threads inside
+    the current process; ``run_forever()`` is used by the standalone
+    ``worker.py`` process.
+    """
+
+    def __init__(self, queue, processor, threads=1, chunk_size=10, poll_interval=1.0):
+        self.queue = queue
+        self.processor = processor
+        self.threads = threads
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start background worker threads in this process."""
+        for n in range(self.threads):
+            thread = threading.Thread(
+                target=self.run_forever, name=f"job-worker-{n}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception as e:
+                print(f"Job worker error: {e}")
+                ran = False
+            if not ran:
+                self._stop.wait(self.poll_interval)
+
+    def run_once(self):
+        """Claim and run one job; returns False when the queue is empty."""
+        claimed = self.queue.claim(self.worker_id)
+        if claimed is None:
+            return False
+        job_id, kind, payload, offset = claimed
+        try:
+            self._run(job_id, kind, payload, offset)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.queue.fail(job_id, e)
+        return True
+
+    def _run(self, job_id, kind, payload, offset):
+        ids = payload.get('ids')
+        if kind == 'fetch_and_process' and ids is None:
+            emails = self.processor.ms_graph.fetch_emails(payload.get('count', 20))
+            self.processor.store.upsert_messages(emails)
+            ids = [email['id'] for email in emails]
+            self.queue.set_items(job_id, ids)
+
+        mode = payload.get('mode', 'standard')
+        for start in range(offset, len(ids), self.chunk_size):
+            if not self.queue.heartbeat(job_id, self.worker_id):
+                # Cancelled, or the lease expired and another worker took over
+                return
+            chunk_ids = ids[start:start + self.chunk_size]
+            emails = self.processor.store.get_messages(chunk_ids)
+            processed = self.processor.process_emails(emails, mode) if emails else []
+            by_id = {email['id']: email for email in processed}
+            self.queue.add_results(job_id, [
+                by_id.get(message_id) or {'id': message_id, 'error': 'Message not found'}
+                for message_id in chunk_ids
+            ])
+        self.queue.complete(job_id)
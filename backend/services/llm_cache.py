@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class LLMCache:
+    """Persistent, content-addressed cache for LLM results.
+
+    Entries live in a small SQLite database so they survive restarts and are
+    shared by every gunicorn worker. Keys are derived from everything that
+    influences the answer (operation, model, template hash, truncated input,
+    temperature); eviction is LRU on top of a TTL and a size cap.
+    """
+
+    # Run LRU eviction every N writes instead of counting rows on each write
+    EVICT_EVERY = 50
+
+    def __init__(self, path='data/llm_cache.sqlite3', max_entries=5000, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' operation TEXT NOT NULL,'
+            ' template TEXT NOT NULL,'
+            ' value TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_template ON llm_cache(template)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)')
+        self._conn.commit()
+
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+    @classmethod
+    def make_key(cls, operation, model, template_hash, text, temperature):
+        """Build the content address for one LLM call."""
+        parts = [operation, model, template_hash, cls.hash_text(text), f"{float(temperature):.3f}"]
+        return cls.hash_text('\x1f'.join(parts))
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None on miss/expiry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created_at FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE llm_cache SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value, operation, template):
+        """Store a (JSON-serialisable) value produced from ``template``."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, operation, template, value, created_at, last_access)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (key, operation, template, json.dumps(value), now, now)
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl_seconds:
+            self._conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl_seconds,))
+        if self.max_entries:
+            (count,) = self._conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    'DELETE FROM llm_cache WHERE key IN '
+                    '(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)',
+                    (overflow,)
+                )
+
+    def evict(self):
+        """Apply TTL and size-cap eviction now."""
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+
+    def invalidate_template(self, template):
+        """Drop every entry produced from the named prompt template."""
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM llm_cache WHERE template = ?', (template,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM llm_cache')
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            (count,) = self._conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()
+        return {'entries': count, 'hits': self.hits, 'misses': self.misses}
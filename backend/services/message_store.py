@@ -0,0 +1,435 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    subject TEXT,
+    sender TEXT,
+    recipient TEXT,
+    received_at TEXT,
+    body TEXT,
+    is_read INTEGER NOT NULL DEFAULT 0,
+    importance TEXT,
+    conversation_id TEXT,
+    outlook_categories TEXT,
+    category TEXT,
+    action_items TEXT,
+    processed_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_received ON messages(received_at);
+CREATE INDEX IF NOT EXISTS idx_messages_category ON messages(category, received_at);
+CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender, received_at);
+CREATE INDEX IF NOT EXISTS idx_messages_read ON messages(is_read, received_at);
+
+CREATE TABLE IF NOT EXISTS drafts (
+    id TEXT PRIMARY KEY,
+    email_id TEXT NOT NULL,
+    subject TEXT,
+    body TEXT,
+    recipient TEXT,
+    created_at TEXT,
+    source_hash TEXT,
+    prompt_hash TEXT,
+    origin TEXT NOT NULL DEFAULT 'generated',
+    stale INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_drafts_email ON drafts(email_id);
+
+CREATE TABLE IF NOT EXISTS draft_claims (
+    email_id TEXT PRIMARY KEY,
+    worker TEXT NOT NULL,
+    lease_until REAL NOT NULL
+);
+"""
+
+# Columns added since the tables were first released; databases created
+# before them are migrated when opened
+ADDED_COLUMNS = (
+    ('messages', 'conversation_id', 'TEXT'),
+    ('messages', 'outlook_categories', 'TEXT'),
+    ('drafts', 'source_hash', 'TEXT'),
+    ('drafts', 'prompt_hash', 'TEXT'),
+    ('drafts', 'origin', "TEXT NOT NULL DEFAULT 'generated'"),
+    ('drafts', 'stale', 'INTEGER NOT NULL DEFAULT 0'),
+)
+
+# Draft origins: written by the user, generated on request, or generated in
+# the background before the email was opened
+DRAFT_ORIGINS = ('edited', 'generated', 'pregenerated')
+
+
+def content_hash(email):
+    """Hash of the fields a reply is generated from; drafts of other content are stale."""
+    text = f"{email.get('subject') or ''}\0{email.get('body') or ''}"
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class MessageStore:
+    """Server-side store for parsed messages, AI results and drafts.
+
+    Backed by SQLite in WAL mode so every gunicorn worker can read while one
+    writes. Messages use the same dict shape as ``MSGraphService._parse_email``
+    plus ``category`` and ``actionItems``. An optional ``SearchIndex`` is kept
+    in step with every upsert and delete.
+    """
+
+    def __init__(self, path='data/messages.sqlite3', search_index=None):
+        self.path = path
+        self.search_index = search_index
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        for table, column, declaration in ADDED_COLUMNS:
+            columns = {row['name'] for row in self._conn.execute(f'PRAGMA table_info({table})')}
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id, received_at)'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _row_to_email(row):
+        return {
+            'id': row['id'],
+            'subject': row['subject'],
+            'from': row['sender'],
+            'to': row['recipient'],
+            'receivedDateTime': row['received_at'],
+            'body': row['body'],
+            'isRead': bool(row['is_read']),
+            'importance': row['importance'],
+            'conversationId': row['conversation_id'],
+            'categories': json.loads(row['outlook_categories']) if row['outlook_categories'] else [],
+            'category': row['category'],
+            'actionItems': json.loads(row['action_items']) if row['action_items'] else [],
+        }
+
+    def upsert_messages(self, emails):
+        """Insert or refresh parsed messages.
+
+        Existing AI results are kept unless the body changed, in which case
+        the message must be reprocessed. Generated drafts of a message whose
+        subject or body changed are dropped; drafts the user edited are kept
+        and flagged ``stale``.
+        """
+        now = time.time()
+        rows = [
+            (
+                email['id'], email.get('subject'), email.get('from'), email.get('to'),
+                email.get('receivedDateTime'), email.get('body'), int(bool(email.get('isRead'))),
+                email.get('importance'), email.get('conversationId'),
+                json.dumps(email['categories']) if 'categories' in email else None, now
+            )
+            for email in emails if email.get('id')
+        ]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT INTO messages (id, subject, sender, recipient, received_at, body, is_read, importance,'
+                ' conversation_id, outlook_categories, updated_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT(id) DO UPDATE SET'
+                '  subject = excluded.subject, sender = excluded.sender, recipient = excluded.recipient,'
+                '  received_at = excluded.received_at, is_read = excluded.is_read,'
+                '  importance = excluded.importance, updated_at = excluded.updated_at,'
+                '  conversation_id = COALESCE(excluded.conversation_id, messages.conversation_id),'
+                '  outlook_categories = COALESCE(excluded.outlook_categories, messages.outlook_categories),'
+                '  category = CASE WHEN messages.body IS excluded.body THEN messages.category END,'
+                '  action_items = CASE WHEN messages.body IS excluded.body THEN messages.action_items END,'
+                '  processed_at = CASE WHEN messages.body IS excluded.body THEN messages.processed_at END,'
+                '  body = excluded.body',
+                rows
+            )
+            hashes = [(email['id'], content_hash(email)) for email in emails if email.get('id')]
+            self._conn.executemany(
+                "DELETE FROM drafts WHERE email_id = ? AND origin != 'edited' AND source_hash IS NOT ?",
+                hashes
+            )
+            self._conn.executemany(
+                "UPDATE drafts SET stale = 1 WHERE email_id = ? AND origin = 'edited' AND source_hash IS NOT ?",
+                hashes
+            )
+            self._conn.commit()
+        if self.search_index is not None:
+            try:
+                self.search_index.add(emails)
+            except Exception as e:
+                print(f"Search index update error: {e}")
+        return len(rows)
+
+    def save_results(self, emails):
+        """Store category and action items for processed messages.
+
+        Failed and degraded (fallback) results are skipped so those messages
+        are processed again later.
+        """
+        now = time.time()
+        rows = [
+            (email.get('category'), json.dumps(email.get('actionItems') or []), now, now, email['id'])
+            for email in emails
+            if email.get('id') and not email.get('error') and not email.get('degraded')
+        ]
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE messages SET category = ?, action_items = ?, processed_at = ?, updated_at = ?'
+                ' WHERE id = ?',
+                rows
+            )
+            self._conn.commit()
+
+    def set_read(self, ids, is_read=True):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE messages SET is_read = ?, updated_at = ? WHERE id = ?',
+                [(int(bool(is_read)), now, i) for i in ids]
+            )
+            self._conn.commit()
+
+    def set_outlook_categories(self, categories_by_id):
+        """Record categories written to Outlook; results and drafts are unaffected."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE messages SET outlook_categories = ?, updated_at = ? WHERE id = ?',
+                [(json.dumps(categories), now, i) for i, categories in categories_by_id.items()]
+            )
+            self._conn.commit()
+
+    def delete_messages(self, ids):
+        with self._lock:
+            self._conn.executemany('DELETE FROM messages WHERE id = ?', [(i,) for i in ids])
+            self._conn.executemany('DELETE FROM drafts WHERE email_id = ?', [(i,) for i in ids])
+            self._conn.executemany('DELETE FROM draft_claims WHERE email_id = ?', [(i,) for i in ids])
+            self._conn.commit()
+        if self.search_index is not None:
+            try:
+                self.search_index.remove(ids)
+            except Exception as e:
+                print(f"Search index update error: {e}")
+
+    def get_messages(self, ids):
+        """Return stored messages for ``ids`` in the requested order (missing ids skipped)."""
+        ids = list(ids)
+        if not ids:
+            return []
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for row in self._conn.execute(
+                    f'SELECT * FROM messages WHERE id IN ({placeholders})', chunk
+                ):
+                    found[row['id']] = self._row_to_email(row)
+        return [found[i] for i in ids if i in found]
+
+    def get_results(self, ids):
+        """``{id: {'category', 'actionItems'}}`` for the messages in ``ids`` that were processed."""
+        ids = list(ids)
+        results = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for row in self._conn.execute(
+                    f'SELECT id, category, action_items FROM messages'
+                    f' WHERE id IN ({placeholders}) AND processed_at IS NOT NULL', chunk
+                ):
+                    results[row['id']] = {
+                        'category': row['category'],
+                        'actionItems': json.loads(row['action_items']) if row['action_items'] else [],
+                    }
+        return results
+
+    def get_thread_results(self, conversation_ids, exclude_ids=()):
+        """Results already stored for each conversation, skipping ``exclude_ids``.
+
+        Returns ``{conversation_id: {'category': ..., 'actionItems': [...]}}``
+        with the category of the newest processed message and the action
+        items of every processed message, oldest first.
+        """
+        conversation_ids = [c for c in dict.fromkeys(conversation_ids) if c]
+        exclude = set(exclude_ids)
+        threads = {}
+        with self._lock:
+            for start in range(0, len(conversation_ids), 500):
+                chunk = conversation_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT id, conversation_id, category, action_items FROM messages'
+                    f' WHERE conversation_id IN ({placeholders}) AND processed_at IS NOT NULL'
+                    f' ORDER BY received_at', chunk
+                ).fetchall()
+                for row in rows:
+                    if row['id'] in exclude:
+                        continue
+                    thread = threads.setdefault(row['conversation_id'], {'category': None, 'actionItems': []})
+                    thread['category'] = row['category']
+                    thread['actionItems'].extend(json.loads(row['action_items']) if row['action_items'] else [])
+        return threads
+
+    def list_messages(self, category=None, sender=None, is_read=None, since=None, limit=50, offset=0):
+        """Newest-first page of messages matching the given filters."""
+        clauses, params = [], []
+        if category is not None:
+            clauses.append('category = ?')
+            params.append(category)
+        if sender is not None:
+            clauses.append('sender = ?')
+            params.append(sender)
+        if is_read is not None:
+            clauses.append('is_read = ?')
+            params.append(int(bool(is_read)))
+        if since is not None:
+            clauses.append('received_at >= ?')
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT * FROM messages {where} ORDER BY received_at DESC LIMIT ? OFFSET ?',
+                params + [int(limit), int(offset)]
+            ).fetchall()
+        return [self._row_to_email(row) for row in rows]
+
+    def count(self):
+        with self._lock:
+            (count,) = self._conn.execute('SELECT COUNT(*) FROM messages').fetchone()
+        return count
+
+    @staticmethod
+    def _row_to_draft(row):
+        return {
+            'id': row['id'],
+            'originalEmailId': row['email_id'],
+            'subject': row['subject'],
+            'body': row['body'],
+            'recipient': row['recipient'],
+            'createdAt': row['created_at'],
+            'sourceHash': row['source_hash'],
+            'promptHash': row['prompt_hash'],
+            'origin': row['origin'],
+            'stale': bool(row['stale']),
+            'updatedAt': row['updated_at'],
+        }
+
+    def save_draft(self, draft):
+        """Insert or replace the draft for an email.
+
+        A ``pregenerated`` draft never replaces one the user edited; returns
+        False when it was not written for that reason.
+        """
+        origin = draft.get('origin', 'generated')
+        if origin not in DRAFT_ORIGINS:
+            raise ValueError(f"Unknown draft origin: {origin}")
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO drafts (id, email_id, subject, body, recipient, created_at, source_hash, prompt_hash,'
+                ' origin, stale, updated_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT(id) DO UPDATE SET'
+                '  email_id = excluded.email_id, subject = excluded.subject, body = excluded.body,'
+                '  recipient = excluded.recipient, created_at = excluded.created_at,'
+                '  source_hash = excluded.source_hash, prompt_hash = excluded.prompt_hash,'
+                '  origin = excluded.origin, stale = excluded.stale, updated_at = excluded.updated_at'
+                " WHERE excluded.origin != 'pregenerated' OR drafts.origin != 'edited'",
+                (
+                    draft['id'], draft['originalEmailId'], draft.get('subject'), draft.get('body'),
+                    draft.get('recipient'), draft.get('createdAt'), draft.get('sourceHash'),
+                    draft.get('promptHash'), origin, int(bool(draft.get('stale'))), time.time()
+                )
+            )
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def get_draft(self, draft_id):
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM drafts WHERE id = ?', (draft_id,)).fetchone()
+        return self._row_to_draft(row) if row else None
+
+    def get_drafts(self, limit=100):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM drafts ORDER BY updated_at DESC LIMIT ?', (int(limit),)
+            ).fetchall()
+        return [self._row_to_draft(row) for row in rows]
+
+    def update_draft(self, draft_id, fields):
+        """Apply user edits (``subject``, ``body``, ``recipient``); returns the draft or None."""
+        columns = {'subject': 'subject', 'body': 'body', 'recipient': 'recipient'}
+        updates = [(columns[key], value) for key, value in fields.items() if key in columns]
+        assignments = ''.join(f'{column} = ?, ' for column, _ in updates)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE drafts SET {assignments}origin = 'edited', updated_at = ? WHERE id = ?",
+                [value for _, value in updates] + [time.time(), draft_id]
+            )
+            self._conn.commit()
+        return self.get_draft(draft_id) if cursor.rowcount else None
+
+    def delete_draft(self, draft_id):
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM drafts WHERE id = ?', (draft_id,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def invalidate_drafts(self, prompt_hash):
+        """Drop generated drafts made with another reply prompt; returns how many."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM drafts WHERE origin != 'edited' AND prompt_hash IS NOT ?", (prompt_hash,)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def pending_drafts(self, categories, prompt_hash, limit=10):
+        """Unread processed messages in ``categories`` without a current draft, newest first.
+
+        Messages someone else is generating for (an unexpired claim) are skipped.
+        """
+        categories = list(categories)
+        if not categories:
+            return []
+        placeholders = ','.join('?' * len(categories))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT m.* FROM messages m'
+                f' LEFT JOIN drafts d ON d.email_id = m.id'
+                f' LEFT JOIN draft_claims c ON c.email_id = m.id AND c.lease_until > ?'
+                f' WHERE m.category IN ({placeholders}) AND m.is_read = 0 AND m.processed_at IS NOT NULL'
+                f"  AND c.email_id IS NULL AND (d.id IS NULL OR (d.origin != 'edited' AND d.prompt_hash IS NOT ?))"
+                f' ORDER BY m.received_at DESC LIMIT ?',
+                [time.time()] + categories + [prompt_hash, int(limit)]
+            ).fetchall()
+        return [self._row_to_email(row) for row in rows]
+
+    def claim_draft(self, email_id, worker, lease_seconds):
+        """Lease ``email_id`` for background generation; False when another worker holds it."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO draft_claims (email_id, worker, lease_until) VALUES (?, ?, ?)'
+                ' ON CONFLICT(email_id) DO UPDATE SET worker = excluded.worker, lease_until = excluded.lease_until'
+                ' WHERE draft_claims.lease_until <= ? OR draft_claims.worker = excluded.worker',
+                (email_id, worker, now + lease_seconds, now)
+            )
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def release_draft(self, email_id, worker):
+        with self._lock:
+            self._conn.execute('DELETE FROM draft_claims WHERE email_id = ? AND worker = ?', (email_id, worker))
+            self._conn.commit()
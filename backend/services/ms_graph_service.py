@@ -1,58 +1,155 @@
 import msal
-import requests
 import os
 import webbrowser
-from bs4 import BeautifulSoup
-import re
 import threading
 import json
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: no cross-process lock
+    fcntl = None
+
+from .graph_transport import GraphTransport
+from .html_extractor import DEFAULT_ENGINE, extract_text
+
+# Refresh cached access tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 300
+
+# Properties requested from the delta endpoint; bodies come with the pages
+# so a full sync needs no request per message
+DELTA_SELECT = 'subject,from,toRecipients,receivedDateTime,isRead,importance,conversationId,categories,body'
+
+# Asks Graph to convert message bodies to plain text server-side
+PREFER_TEXT_BODY = 'outlook.body-content-type="text"'
+
+# Outlook categories written back by OceanAI, e.g. 'OceanAI: Clients'
+CATEGORY_PREFIX = 'OceanAI: '
+
+
+def oceanai_category(categories):
+    """The OceanAI category among a message's Outlook ``categories``, or None."""
+    for name in categories or ():
+        if name.startswith(CATEGORY_PREFIX) and len(name) > len(CATEGORY_PREFIX):
+            return name[len(CATEGORY_PREFIX):]
+    return None
+
+
+def with_oceanai_category(categories, category):
+    """``categories`` with the OceanAI category set to ``category``; the user's own are kept."""
+    kept = [name for name in categories or () if not name.startswith(CATEGORY_PREFIX)]
+    return kept + [CATEGORY_PREFIX + category]
 
 class MSGraphService:
-    def __init__(self, app_id, scopes):
+    def __init__(self, app_id, scopes, base_url=None, transport=None,
+                 prefer_text_body=False, html_engine=DEFAULT_ENGINE):
         self.app_id = app_id
         self.scopes = scopes
         self.authority_url = 'https://login.microsoftonline.com/common/'
-        self.base_url = 'https://graph.microsoft.com/v1.0/'
+        self.base_url = base_url or 'https://graph.microsoft.com/v1.0/'
         self.token_cache_file = 'data/ms_token_cache.json'
         self.device_flow_file = 'data/device_flow.json'
+        self.delta_state_file = 'data/delta_tokens.json'
+        self.prefer_text_body = prefer_text_body
+        self.html_engine = html_engine
+        # Shared keep-alive session with throttling-aware retries
+        self.transport = transport or GraphTransport()
+        self._delta_lock = threading.Lock()
+        # Long-lived MSAL state, reloaded only when the cache file changes on disk
+        self._msal_lock = threading.RLock()
+        self._token_cache = msal.SerializableTokenCache()
+        self._cache_signature = None
+        self._client = None
+        self._accounts = None
+        self._access_token = None
+        self._access_token_expires_at = 0
         self._flow_status = None  # None | 'pending' | 'authenticated' | 'error'
         self._flow_message = None
         
         # Ensure data directory exists
         os.makedirs('data', exist_ok=True)
     
+    @contextmanager
+    def _token_cache_file_lock(self, exclusive):
+        """Cross-process lock so gunicorn workers don't clobber the token cache."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.token_cache_file + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _token_cache_signature(self):
+        try:
+            stat = os.stat(self.token_cache_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
     def _get_token_cache(self):
-        """Load token cache from file"""
-        cache = msal.SerializableTokenCache()
-        if os.path.exists(self.token_cache_file):
-            with open(self.token_cache_file, 'r') as f:
-                cache.deserialize(f.read())
-        return cache
+        """Return the in-memory token cache, reloading it if another worker changed the file"""
+        with self._msal_lock:
+            signature = self._token_cache_signature()
+            if signature != self._cache_signature:
+                cache = msal.SerializableTokenCache()
+                if signature is not None:
+                    with self._token_cache_file_lock(exclusive=False):
+                        with open(self.token_cache_file, 'r') as f:
+                            cache.deserialize(f.read())
+                self._token_cache = cache
+                self._cache_signature = signature
+                self._client = None
+                self._accounts = None
+                self._access_token = None
+            return self._token_cache
     
     def _save_token_cache(self, cache):
-        """Save token cache to file"""
-        with open(self.token_cache_file, 'w') as f:
-            f.write(cache.serialize())
+        """Persist the token cache, only when MSAL reports a change"""
+        with self._msal_lock:
+            if not cache.has_state_changed:
+                return
+            with self._token_cache_file_lock(exclusive=True):
+                tmp_path = self.token_cache_file + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    f.write(cache.serialize())
+                os.replace(tmp_path, self.token_cache_file)
+            cache.has_state_changed = False
+            self._cache_signature = self._token_cache_signature()
+            self._accounts = None
+    
+    def _get_client(self):
+        """One long-lived MSAL client per process, bound to the in-memory cache"""
+        with self._msal_lock:
+            cache = self._get_token_cache()
+            if self._client is None:
+                self._client = msal.PublicClientApplication(
+                    self.app_id,
+                    authority=self.authority_url,
+                    token_cache=cache
+                )
+            return self._client
+    
+    def _get_accounts(self):
+        """Accounts in the token cache, read without constructing an MSAL client"""
+        with self._msal_lock:
+            cache = self._get_token_cache()
+            if self._accounts is None:
+                self._accounts = cache.find(msal.TokenCache.CredentialType.ACCOUNT)
+            return self._accounts
     
     def check_authentication(self):
         """Check if user is authenticated"""
-        cache = self._get_token_cache()
-        client = msal.PublicClientApplication(
-            self.app_id,
-            authority=self.authority_url,
-            token_cache=cache
-        )
-        accounts = client.get_accounts()
-        return len(accounts) > 0
+        return len(self._get_accounts()) > 0
     
     def initiate_auth_flow(self):
         """Start device flow asynchronously, returning verification URI & user code immediately."""
+        client = self._get_client()
         cache = self._get_token_cache()
-        client = msal.PublicClientApplication(
-            self.app_id,
-            authority=self.authority_url,
-            token_cache=cache
-        )
         flow = client.initiate_device_flow(scopes=self.scopes)
         if 'user_code' not in flow:
             self._flow_status = 'error'
@@ -97,7 +194,10 @@ class MSGraphService:
         try:
             token_response = client.acquire_token_by_device_flow(flow)
             if 'access_token' in token_response:
-                self._save_token_cache(cache)
+                with self._msal_lock:
+                    self._save_token_cache(cache)
+                    self._access_token = token_response['access_token']
+                    self._access_token_expires_at = time.time() + int(token_response.get('expires_in', 0))
                 self._flow_status = 'authenticated'
             else:
                 self._flow_status = 'error'
@@ -120,44 +220,52 @@ class MSGraphService:
         }
     
     def get_access_token(self):
-        """Get valid access token"""
-        cache = self._get_token_cache()
-        client = msal.PublicClientApplication(
-            self.app_id,
-            authority=self.authority_url,
-            token_cache=cache
-        )
-        
-        accounts = client.get_accounts()
-        if not accounts:
-            raise Exception("Not authenticated. Please login first.")
-        
-        token_response = client.acquire_token_silent(
-            self.scopes,
-            account=accounts[0]
-        )
-        
-        if not token_response or "access_token" not in token_response:
-            # Token refresh failed, need to re-authenticate
-            raise Exception("Token expired. Please re-authenticate.")
-        
-        return token_response['access_token']
+        """Get valid access token, reusing it until shortly before expiry"""
+        with self._msal_lock:
+            self._get_token_cache()
+            if self._access_token and time.time() < self._access_token_expires_at - TOKEN_REFRESH_MARGIN:
+                return self._access_token
+            
+            client = self._get_client()
+            accounts = client.get_accounts()
+            if not accounts:
+                raise Exception("Not authenticated. Please login first.")
+            
+            token_response = client.acquire_token_silent(
+                self.scopes,
+                account=accounts[0]
+            )
+            
+            if not token_response or "access_token" not in token_response:
+                # Token refresh failed, need to re-authenticate
+                raise Exception("Token expired. Please re-authenticate.")
+            
+            self._save_token_cache(self._token_cache)
+            self._access_token = token_response['access_token']
+            self._access_token_expires_at = time.time() + int(token_response.get('expires_in', 0))
+            return self._access_token
     
     def clear_auth(self):
         """Clear authentication cache"""
-        if os.path.exists(self.token_cache_file):
-            os.remove(self.token_cache_file)
+        with self._msal_lock:
+            if os.path.exists(self.token_cache_file):
+                os.remove(self.token_cache_file)
+            self._token_cache = msal.SerializableTokenCache()
+            self._cache_signature = None
+            self._client = None
+            self._accounts = None
+            self._access_token = None
     
     def fetch_emails(self, count=20):
         """Fetch emails from Outlook"""
         access_token = self.get_access_token()
         endpoint = f"{self.base_url}me/messages?$top={count}"
         
-        headers = {
+        headers = self._body_headers({
             'Authorization': f'Bearer {access_token}'
-        }
+        })
         
-        response = requests.get(endpoint, headers=headers)
+        response = self.transport.get(endpoint, headers=headers)
         
         if response.status_code != 200:
             raise Exception(f"Failed to fetch emails: {response.text}")
@@ -171,6 +279,125 @@ class MSGraphService:
         
         return emails
     
+    def ping(self, timeout=5):
+        """Minimal authenticated Graph request, for health checks (never retried)."""
+        access_token = self.get_access_token()
+        response = self.transport.session.get(
+            f"{self.base_url}me?$select=id",
+            headers={'Authorization': f'Bearer {access_token}'},
+            timeout=timeout
+        )
+        if response.status_code != 200:
+            raise Exception(f"Graph health check failed: HTTP {response.status_code}")
+    
+    def _body_headers(self, headers):
+        """Add the plain-text body preference to message requests when enabled."""
+        if self.prefer_text_body:
+            headers['Prefer'] = PREFER_TEXT_BODY
+        return headers
+    
+    def _delta_headers(self, access_token, page_size):
+        """Headers for delta pages: page size plus the plain-text body preference."""
+        prefer = [f'odata.maxpagesize={page_size}']
+        if self.prefer_text_body:
+            prefer.append(PREFER_TEXT_BODY)
+        return {'Authorization': f'Bearer {access_token}', 'Prefer': ', '.join(prefer)}
+    
+    def _current_account_key(self):
+        """Stable identifier of the signed-in account (keys the delta state)."""
+        accounts = self._get_accounts()
+        if not accounts:
+            raise Exception("Not authenticated. Please login first.")
+        return accounts[0].get('home_account_id') or accounts[0].get('username')
+    
+    def _load_delta_state(self):
+        try:
+            with open(self.delta_state_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+    
+    def _save_delta_link(self, state_key, delta_link):
+        """Persist one delta link atomically, keeping other users' entries."""
+        with self._delta_lock:
+            state = self._load_delta_state()
+            if delta_link is None:
+                state.pop(state_key, None)
+            else:
+                state[state_key] = delta_link
+            directory = os.path.dirname(self.delta_state_file) or '.'
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.delta-', suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.delta_state_file)
+    
+    def reset_sync(self, folder='inbox', account_key=None):
+        """Forget the stored delta link so the next sync is a full one."""
+        account_key = account_key or self._current_account_key()
+        self._save_delta_link(f"{account_key}:{folder}", None)
+    
+    def sync_emails(self, folder='inbox', page_size=50, account_key=None):
+        """Incrementally sync a mail folder using Graph delta queries.
+
+        Follows ``@odata.nextLink`` pages until a ``@odata.deltaLink`` is
+        returned, persists that link per account and folder, and parses the
+        new/changed messages from the pages themselves. Returns
+        ``{'changed': [...], 'removed': [...], 'full_sync': bool}``.
+        """
+        access_token = self.get_access_token()
+        account_key = account_key or self._current_account_key()
+        state_key = f"{account_key}:{folder}"
+        headers = self._delta_headers(access_token, page_size)
+
+        url, full_sync = self._delta_start(state_key, folder)
+
+        changed, removed = {}, set()
+        delta_link = None
+        while url:
+            response = self.transport.get(url, headers=headers)
+            if response.status_code == 410 and not full_sync:
+                # Delta token expired or was invalidated: start over
+                self._save_delta_link(state_key, None)
+                return self.sync_emails(folder, page_size, account_key)
+            url, delta_link = self._merge_delta_page(response, changed, removed, delta_link)
+
+        return self._finish_delta(state_key, changed, removed, delta_link, full_sync)
+
+    def _delta_start(self, state_key, folder):
+        """``(url, full_sync)``: the saved delta link, or a fresh delta query."""
+        url = self._load_delta_state().get(state_key)
+        if url is not None:
+            return url, False
+        return f"{self.base_url}me/mailFolders/{folder}/messages/delta?$select={DELTA_SELECT}", True
+
+    @staticmethod
+    def _merge_delta_page(response, changed, removed, delta_link):
+        """Fold one delta page into ``changed``/``removed``; ``(next_link, delta_link)``."""
+        if response.status_code != 200:
+            raise Exception(f"Failed to sync emails: {response.text}")
+        data = response.json()
+        for item in data.get('value', []):
+            if '@removed' in item:
+                removed.add(item['id'])
+                changed.pop(item['id'], None)
+            else:
+                changed[item['id']] = item
+                removed.discard(item['id'])
+        return data.get('@odata.nextLink'), data.get('@odata.deltaLink', delta_link)
+
+    def _finish_delta(self, state_key, changed, removed, delta_link, full_sync):
+        """Parse the changed messages and persist the delta link for next time."""
+        emails = [self._parse_email(item) for item in changed.values()]
+
+        if delta_link:
+            self._save_delta_link(state_key, delta_link)
+
+        return {
+            'changed': emails,
+            'removed': sorted(removed),
+            'full_sync': full_sync
+        }
+    
     def _parse_email(self, response):
         """Parse email object from MS Graph API"""
         email = {}
@@ -188,39 +415,27 @@ class MSGraphService:
                 email['to'] = 'Unknown'
             
             # Get email body
-            body_content = response.get('body', {}).get('content', '')
-            email['body'] = self._extract_text_from_html(body_content)
+            body = response.get('body', {})
+            email['body'] = self._extract_text_from_html(
+                body.get('content', ''), body.get('contentType', 'html')
+            )
             
             # Additional metadata
             email['isRead'] = response.get('isRead', False)
             email['importance'] = response.get('importance', 'normal')
+            # Groups replies and forwards of one thread (see EmailProcessor 'thread' mode)
+            email['conversationId'] = response.get('conversationId')
+            # Includes the OceanAI category once it has been written back
+            email['categories'] = response.get('categories', [])
             
         except (KeyError, IndexError) as e:
             print(f"Error parsing email: {e}")
         
         return email
     
-    def _extract_text_from_html(self, html):
+    def _extract_text_from_html(self, html, content_type='html'):
         """Extract text from HTML email body"""
-        if not html:
-            return ""
-        
-        soup = BeautifulSoup(html, "html.parser")
-        
-        # Remove script and style tags
-        for tag in soup.find_all(["script", "style"]):
-            tag.decompose()
-        
-        # Get text
-        if soup.body:
-            text = soup.body.get_text(separator="\n")
-        else:
-            text = soup.get_text(separator="\n")
-        
-        # Clean up text
-        text = re.sub(r"[\r\n]+", "\n", text.strip())
-        
-        return text
+        return extract_text(html, content_type, engine=self.html_engine)
 
     def send_mail(self, subject, body, to_address):
         """Send an email via MS Graph API."""
@@ -230,7 +445,16 @@ class MSGraphService:
             'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json'
         }
-        message = {
+        message = self._mail_message(subject, body, to_address)
+        response = self.transport.post(endpoint, headers=headers, json=message)
+        if response.status_code not in (202, 200):
+            raise Exception(f"Failed to send mail: {response.status_code} {response.text}")
+        return {"status": "sent"}
+
+    @staticmethod
+    def _mail_message(subject, body, to_address):
+        """``sendMail`` request body for a plain-text message."""
+        return {
             "message": {
                 "subject": subject,
                 "body": {"contentType": "Text", "content": body},
@@ -240,7 +464,82 @@ class MSGraphService:
             },
             "saveToSentItems": True
         }
-        response = requests.post(endpoint, headers=headers, json=message)
-        if response.status_code not in (202, 200):
-            raise Exception(f"Failed to send mail: {response.status_code} {response.text}")
-        return {"status": "sent"}
\ No newline at end of file
+
+    def _batch(self, operations):
+        """Run Graph operations through ``$batch``; one result per operation."""
+        headers = {'Authorization': f'Bearer {self.get_access_token()}'}
+        results = self.transport.batch(self.base_url, operations, headers=headers)
+        return [self._batch_result(result) for result in results]
+
+    @staticmethod
+    def _batch_result(result):
+        status = result['status']
+        error = None
+        if not 200 <= status < 300:
+            body = result.get('body') or {}
+            details = body.get('error') if isinstance(body, dict) else None
+            error = (details or {}).get('message') or f"Graph returned status {status}"
+        return {'success': error is None, 'status': status, 'error': error, 'retries': result['retries']}
+
+    def send_mails(self, messages):
+        """Send ``{'subject', 'body', 'to'}`` messages, up to 20 per ``$batch`` request.
+
+        Returns ``{'success', 'status', 'error', 'retries'}`` per message, in
+        order; throttled messages are retried, other failures are reported.
+        """
+        return self._batch([
+            {
+                'method': 'POST',
+                'url': '/me/sendMail',
+                'body': self._mail_message(message['subject'], message['body'], message['to'])
+            }
+            for message in messages
+        ])
+
+    def mark_as_read(self, message_ids, is_read=True):
+        """Set ``isRead`` on many messages; one result per id, as ``send_mails``."""
+        return self._batch([
+            {'method': 'PATCH', 'url': f'/me/messages/{message_id}', 'body': {'isRead': is_read}}
+            for message_id in message_ids
+        ])
+
+    def set_categories(self, categories):
+        """Replace the Outlook categories of many messages (``{message_id: [names]}``)."""
+        return self._batch([
+            {'method': 'PATCH', 'url': f'/me/messages/{message_id}', 'body': {'categories': list(names)}}
+            for message_id, names in categories.items()
+        ])
+
+    def write_back_categories(self, emails, flag_priority=False):
+        """Tag processed messages with their OceanAI category in Outlook, batched.
+
+        Messages already carrying the same OceanAI category, failed and
+        degraded results are skipped. With ``flag_priority`` newly tagged
+        messages that have a High priority action item are also flagged for
+        follow-up. Returns ``{'id', 'success', 'status', 'error', 'retries'}``
+        per written message; ``categories`` is updated on the ones that
+        succeeded.
+        """
+        updates = []
+        for email in emails:
+            category = email.get('category')
+            if not (email.get('id') and category) or email.get('error') or email.get('degraded'):
+                continue
+            if oceanai_category(email.get('categories')) == category:
+                continue
+            body = {'categories': with_oceanai_category(email.get('categories'), category)}
+            if flag_priority and any(item.get('priority') == 'High' for item in email.get('actionItems') or []):
+                body['flag'] = {'flagStatus': 'flagged'}
+            updates.append((email, body))
+        if not updates:
+            return []
+
+        results = self._batch([
+            {'method': 'PATCH', 'url': f"/me/messages/{email['id']}", 'body': body}
+            for email, body in updates
+        ])
+        for (email, body), result in zip(updates, results):
+            result['id'] = email['id']
+            if result['success']:
+                email['categories'] = body['categories']
+        return results
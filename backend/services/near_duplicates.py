@@ -0,0 +1,281 @@
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from . import telemetry
+
+# A reusable prior answer. audit=True means it was sampled for an LLM
+# cross-check: call the model anyway and report its answer via record_audit()
+NearDuplicate = namedtuple('NearDuplicate', ['value', 'similarity', 'audit', 'decision_id'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    scope TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    signature_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bands_bucket ON bands(scope, band, bucket);
+CREATE INDEX IF NOT EXISTS idx_bands_signature ON bands(signature_id);
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    operation TEXT NOT NULL,
+    signature_id INTEGER,
+    similarity REAL NOT NULL,
+    decision TEXT NOT NULL,
+    reused TEXT,
+    answer TEXT,
+    agreed INTEGER
+);
+"""
+
+# Words compared in overlapping runs of this length
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD = re.compile(r'\w+', re.UNICODE)
+# URLs, addresses and anything with a digit (IDs, dates, amounts, times)
+# differ between otherwise identical notifications
+_VARIABLE = re.compile(r'https?://\S+|[\w.+-]+@[\w-]+\.[\w.-]+|\b[\w-]*\d[\w./:-]*')
+_VALUE_TOKEN = re.compile(r'\d[\w./:-]*')
+
+
+def _shingles(text):
+    words = _WORD.findall(_VARIABLE.sub(' 0 ', (text or '').lower()))
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _carries_over(value, text):
+    """True when every number or ID quoted in ``value`` also appears in ``text``.
+
+    Action items from templated mail mention the invoice number or date of
+    the message they came from; reusing them for a sibling message would
+    hand back the wrong one.
+    """
+    return all(token in text for token in _VALUE_TOKEN.findall(json.dumps(value)))
+
+
+def _comparable(value):
+    if isinstance(value, list):
+        return sorted(str(item.get('task', '')).strip().lower() if isinstance(item, dict) else str(item)
+                      for item in value)
+    return value
+
+
+class NearDuplicateIndex:
+    """MinHash LSH index of LLM answers, keyed by the text they were given.
+
+    Bodies of bulk notifications, alert storms and templated client mail
+    differ only in timestamps and IDs, so the exact-match ``LLMCache`` misses
+    them. Text is normalized (variable tokens masked), split into word
+    shingles and reduced to a ``num_perm`` MinHash signature; ``bands`` LSH
+    buckets find candidates whose estimated Jaccard similarity is then
+    compared with the operation's threshold.
+
+    Entries are scoped by operation and prompt template hash, so editing a
+    prompt stops old answers from being reused. Every decision is logged;
+    ``sample_rate`` of reuses are still sent to the LLM and the log records
+    whether it agreed.
+    """
+
+    # Run size-cap eviction every N writes instead of counting rows on each write
+    EVICT_EVERY = 50
+
+    def __init__(self, path='data/near_duplicates.sqlite3', thresholds=None, sample_rate=0.05,
+                 num_perm=128, bands=32, max_entries=20000, max_decisions=5000, seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.path = path
+        # Minimum estimated Jaccard similarity per operation; operations
+        # without a threshold are never reused
+        self.thresholds = dict(thresholds or {'classify': 0.9, 'action_items': 0.95})
+        self.sample_rate = sample_rate
+        self.num_perm = num_perm
+        self.bands = bands
+        self.max_entries = max_entries
+        self.max_decisions = max_decisions
+        # Fixed seed: every worker must hash the same way
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def signature(self, text):
+        """MinHash signature of ``text`` (uint32 array), or None when it has no words."""
+        shingles = _shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        values = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME
+        return values.min(axis=0).astype(np.uint32)
+
+    def _buckets(self, signature):
+        return [
+            (band, zlib.crc32(rows.tobytes()))
+            for band, rows in enumerate(signature.reshape(self.bands, -1))
+        ]
+
+    def lookup(self, operation, template_hash, text):
+        """Reusable answer for a near duplicate of ``text``, or None."""
+        threshold = self.thresholds.get(operation)
+        signature = self.signature(text) if threshold is not None else None
+        if signature is None:
+            return None
+        scope = f"{operation}:{template_hash}"
+        buckets = self._buckets(signature)
+        with self._lock:
+            pairs = ' OR '.join('(band = ? AND bucket = ?)' for _ in buckets)
+            candidates = self._conn.execute(
+                f'SELECT signature, value, id FROM signatures WHERE id IN ('
+                f' SELECT signature_id FROM bands WHERE scope = ? AND ({pairs}))'
+                f' ORDER BY id DESC LIMIT 200',
+                [scope] + [n for pair in buckets for n in pair]
+            ).fetchall()
+        best = None
+        for blob, value, signature_id in candidates:
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+            if best is None or similarity > best[0]:
+                best = (similarity, value, signature_id)
+        if best is None or best[0] < threshold:
+            return None
+
+        similarity, value, signature_id = best
+        reused = json.loads(value)
+        if not _carries_over(reused, text):
+            decision = 'rejected'
+        elif self._random.random() < self.sample_rate:
+            decision = 'audit'
+        else:
+            decision = 'reused'
+        decision_id = self._log(operation, signature_id, similarity, decision, value)
+        telemetry.inc('oceanai_near_duplicate_total', operation=operation, decision=decision)
+        if decision == 'rejected':
+            return None
+        return NearDuplicate(reused, round(similarity, 3), decision == 'audit', decision_id)
+
+    def add(self, operation, template_hash, text, value):
+        """Remember the LLM answer ``value`` for ``text``."""
+        if operation not in self.thresholds:
+            return
+        signature = self.signature(text)
+        if signature is None:
+            return
+        scope = f"{operation}:{template_hash}"
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO signatures (scope, signature, value, created_at) VALUES (?, ?, ?, ?)',
+                (scope, signature.tobytes(), json.dumps(value), time.time())
+            )
+            self._conn.executemany(
+                'INSERT INTO bands (scope, band, bucket, signature_id) VALUES (?, ?, ?, ?)',
+                [(scope, band, bucket, cursor.lastrowid) for band, bucket in self._buckets(signature)]
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+
+    def record_audit(self, match, answer):
+        """Store the LLM's own answer for a reuse that was sampled for audit."""
+        agreed = _comparable(match.value) == _comparable(answer)
+        with self._lock:
+            self._conn.execute(
+                'UPDATE decisions SET answer = ?, agreed = ? WHERE id = ?',
+                (json.dumps(answer), int(agreed), match.decision_id)
+            )
+            self._conn.commit()
+        return agreed
+
+    def _log(self, operation, signature_id, similarity, decision, value):
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO decisions (created_at, operation, signature_id, similarity, decision, reused)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (time.time(), operation, signature_id, round(similarity, 4), decision, value)
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def _evict(self):
+        """Keep the newest ``max_entries`` signatures and ``max_decisions`` log rows."""
+        for table, limit in (('signatures', self.max_entries), ('decisions', self.max_decisions)):
+            row = self._conn.execute(
+                f'SELECT id FROM {table} ORDER BY id DESC LIMIT 1 OFFSET ?', (limit,)
+            ).fetchone()
+            if row is None:
+                continue
+            self._conn.execute(f'DELETE FROM {table} WHERE id <= ?', (row[0],))
+            if table == 'signatures':
+                self._conn.execute('DELETE FROM bands WHERE signature_id <= ?', (row[0],))
+
+    def decisions(self, limit=50, operation=None):
+        """Newest-first reuse decisions for auditing."""
+        clause, params = ('WHERE operation = ?', [operation]) if operation else ('', [])
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT id, created_at, operation, signature_id, similarity, decision, reused, answer, agreed'
+                f' FROM decisions {clause} ORDER BY id DESC LIMIT ?', params + [int(limit)]
+            ).fetchall()
+        return [
+            {
+                'id': row[0],
+                'createdAt': row[1],
+                'operation': row[2],
+                'matchedEntry': row[3],
+                'similarity': row[4],
+                'decision': row[5],
+                'reused': json.loads(row[6]) if row[6] else None,
+                'answer': json.loads(row[7]) if row[7] else None,
+                'agreed': None if row[8] is None else bool(row[8]),
+            }
+            for row in rows
+        ]
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._conn.execute('SELECT COUNT(*) FROM signatures').fetchone()
+            rows = self._conn.execute(
+                'SELECT operation, decision, COUNT(*), SUM(agreed = 0) FROM decisions GROUP BY operation, decision'
+            ).fetchall()
+        operations = {}
+        for operation, decision, count, disagreements in rows:
+            entry = operations.setdefault(operation, {'reused': 0, 'audit': 0, 'rejected': 0, 'disagreements': 0})
+            entry[decision] = count
+            entry['disagreements'] += disagreements or 0
+        return {
+            'entries': entries,
+            'thresholds': dict(self.thresholds),
+            'sample_rate': self.sample_rate,
+            'operations': operations,
+        }
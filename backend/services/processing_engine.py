@@ -0,0 +1,61 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class ProcessingEngine:
+    """Bounded worker pool shared by every email processing path.
+
+    Items fan out across ``max_workers`` threads while calls to each
+    provider (e.g. ``'cohere'``) are capped by their own semaphore so a large
+    pool never exceeds what the upstream API tolerates.
+    """
+
+    def __init__(self, max_workers=8, provider_limits=None):
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='email-engine'
+        )
+        self._limits = {
+            provider: threading.BoundedSemaphore(max(1, int(limit)))
+            for provider, limit in (provider_limits or {}).items()
+        }
+
+    @contextmanager
+    def limit(self, provider):
+        """Hold one concurrency slot for ``provider`` (no-op when unlimited)."""
+        semaphore = self._limits.get(provider)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+    def map(self, func, items):
+        """Run ``func`` over ``items`` concurrently.
+
+        Returns a list of ``(result, error)`` tuples in input order, so one
+        failing item never fails the whole batch. Must not be called from
+        inside a task running on this engine.
+        """
+        items = list(items)
+        if not items:
+            return []
+        # Each task runs in a copy of the caller's context so its spans join
+        # the caller's trace
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, func, item)
+            for item in items
+        ]
+        results = []
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
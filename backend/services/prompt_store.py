@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from types import MappingProxyType
+
+
+class PromptStore:
+    """In-memory prompt templates backed by a JSON file.
+
+    Templates are loaded once and served from an immutable snapshot. The file
+    mtime is re-checked at most every ``check_interval`` seconds so edits made
+    by another gunicorn worker are picked up, and writes go through a temp
+    file + rename so readers never see a half-written file.
+    """
+
+    def __init__(self, path, defaults, check_interval=1.0):
+        self.path = path
+        self.defaults = dict(defaults)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = MappingProxyType({})
+        self._signature = None
+        self._last_check = 0.0
+        self.version = 0
+        self._reload(force=True)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read_file(self):
+        with open(self.path, 'r') as f:
+            content = f.read().strip()
+        if not content:
+            raise ValueError("empty prompts file")
+        prompts = json.loads(content)
+        if not isinstance(prompts, dict):
+            raise ValueError("prompts file must contain an object")
+        return prompts
+
+    def _publish(self, prompts, signature):
+        self._snapshot = MappingProxyType(dict(prompts))
+        self._signature = signature
+        self.version += 1
+
+    def _reload(self, force=False):
+        with self._lock:
+            signature = self._file_signature()
+            self._last_check = time.monotonic()
+            if not force and signature == self._signature:
+                return
+            try:
+                prompts = self._read_file()
+            except (FileNotFoundError, json.JSONDecodeError, ValueError):
+                # Recreate defaults on any parse error or missing file
+                prompts = dict(self.defaults)
+                self._write_atomic(prompts)
+                signature = self._file_signature()
+            self._publish(prompts, signature)
+
+    def _write_atomic(self, prompts):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.prompts-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(prompts, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def snapshot(self):
+        """Return the current read-only template mapping."""
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self._reload()
+        return self._snapshot
+
+    def get(self, name):
+        return self.snapshot()[name]
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def template_hash(text):
+        """SHA-256 of a template's text, memoised across calls."""
+        return hashlib.sha256(str(text).encode('utf-8')).hexdigest()
+
+    def update(self, prompts):
+        """Atomically replace the templates on disk and in memory."""
+        with self._lock:
+            self._write_atomic(prompts)
+            self._publish(prompts, self._file_signature())
+            self._last_check = time.monotonic()
@@ -0,0 +1,295 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+# Poll interval while an async caller waits for a concurrency slot
+ASYNC_SLOT_POLL = 0.01
+
+
+class LimiterError(Exception):
+    """Raised instead of calling the provider; callers fall back immediately."""
+
+
+class CircuitOpenError(LimiterError):
+    pass
+
+
+class RateLimitTimeout(LimiterError):
+    pass
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute``.
+
+    ``reserve`` takes tokens immediately (the level may go negative) and
+    returns how long the caller must wait before using them, so callers are
+    paced in arrival order whether they sleep in a thread or an event loop.
+    A ``per_minute`` of 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount, max_wait=None):
+        """Take ``amount`` tokens; returns the wait in seconds.
+
+        Nothing is taken and ``RateLimitTimeout`` is raised when the wait
+        would exceed ``max_wait``.
+        """
+        if not self.per_minute:
+            return 0.0
+        # A request larger than the bucket could never be admitted otherwise
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, (amount - self._level) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                raise RateLimitTimeout(f"Rate limit wait {wait:.1f}s exceeds {max_wait}s")
+            self._level -= amount
+        return wait
+
+    def adjust(self, amount):
+        """Return (positive) or take (negative) tokens after the fact."""
+        if not self.per_minute or not amount:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + amount)
+
+    def level(self):
+        if not self.per_minute:
+            return None
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._level
+
+
+class AIMDConcurrency:
+    """Concurrency limit that grows by one per window of successes and halves on throttling."""
+
+    def __init__(self, max_limit=16, min_limit=1, initial=None, decrease_factor=0.5):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.limit = float(initial if initial is not None else self.max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                raise RateLimitTimeout("Timed out waiting for a Cohere concurrency slot")
+            self.in_flight += 1
+
+    def release(self, throttled=False, succeeded=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            elif succeeded:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open every call fails fast; after ``reset_timeout`` seconds one
+    trial call is let through (half-open) and its outcome closes or re-opens
+    the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise ``CircuitOpenError`` unless a call may go ahead."""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpenError(f"Cohere circuit open after repeated failures: {self.last_error}")
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release_trial(self):
+        """Let another trial through when one ended without a verdict."""
+        with self._lock:
+            self._trial_running = False
+
+
+def is_throttle(error):
+    return getattr(error, 'status_code', None) == 429
+
+
+def is_cancellation(error):
+    """The caller went away mid-call (closed stream generator or cancelled task)."""
+    return isinstance(error, (GeneratorExit, asyncio.CancelledError))
+
+
+def is_provider_failure(error):
+    """Errors that say the provider is unhealthy: 429/5xx answers, transport errors and timeouts.
+
+    Anything else (a 4xx, or a bug of ours such as a TypeError) says
+    nothing about Cohere and must not open the circuit.
+    """
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
+
+
+class CohereLimiter:
+    """Shared gate in front of every Cohere call made by a process.
+
+    Calls pass the circuit breaker, then the requests/min and tokens/min
+    buckets, then an AIMD concurrency limit that halves on 429s. Token
+    reservations use the prompt estimate and are corrected with the billed
+    tokens afterwards. Anything that would wait longer than ``max_wait``
+    fails fast with a ``LimiterError`` so callers can fall back.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_concurrency=16,
+                 min_concurrency=1, failure_threshold=5, reset_timeout=30.0, max_wait=30.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AIMDConcurrency(max_concurrency, min_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_wait = max_wait
+        self._stats_lock = threading.Lock()
+        self._stats = {'admitted': 0, 'rejected': 0, 'throttled': 0, 'failures': 0, 'cancelled': 0,
+                       'waited_s': 0.0}
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _admit(self, tokens):
+        """Breaker check and bucket reservations; returns the pacing wait."""
+        try:
+            self.breaker.allow()
+        except CircuitOpenError:
+            self._count('rejected')
+            raise
+        try:
+            wait = self.requests.reserve(1, self.max_wait)
+            try:
+                wait = max(wait, self.tokens.reserve(tokens, self.max_wait))
+            except RateLimitTimeout:
+                self.requests.adjust(1)
+                raise
+        except RateLimitTimeout:
+            self.breaker.release_trial()
+            self._count('rejected')
+            raise
+        self._count('waited_s', wait)
+        return wait
+
+    def _undo_admit(self, tokens):
+        self.requests.adjust(1)
+        self.tokens.adjust(tokens)
+        self.breaker.release_trial()
+        self._count('rejected')
+
+    def acquire(self, tokens):
+        """Block until a call estimated at ``tokens`` may start."""
+        time.sleep(self._admit(tokens))
+        try:
+            self.concurrency.acquire(self.max_wait)
+        except RateLimitTimeout:
+            self._undo_admit(tokens)
+            raise
+        self._count('admitted')
+
+    async def acquire_async(self, tokens):
+        """``acquire`` for event-loop callers; never blocks the loop."""
+        await asyncio.sleep(self._admit(tokens))
+        deadline = time.monotonic() + self.max_wait
+        while not self.concurrency.try_acquire():
+            if time.monotonic() >= deadline:
+                self._undo_admit(tokens)
+                raise RateLimitTimeout("Timed out waiting for a Cohere concurrency slot")
+            await asyncio.sleep(ASYNC_SLOT_POLL)
+        self._count('admitted')
+
+    def release(self, reserved_tokens, used_tokens=None, error=None):
+        """Record the outcome of an acquired call."""
+        throttled = error is not None and is_throttle(error)
+        self.concurrency.release(throttled=throttled, succeeded=error is None)
+        if used_tokens is not None:
+            self.tokens.adjust(reserved_tokens - used_tokens)
+        if error is None:
+            self.breaker.record_success()
+        elif is_cancellation(error):
+            # Says nothing about Cohere's health either way
+            self._count('cancelled')
+            self.breaker.release_trial()
+        elif is_provider_failure(error):
+            self._count('throttled' if throttled else 'failures')
+            self.breaker.record_failure(error)
+        else:
+            self.breaker.release_trial()
+
+    def status(self):
+        """Breaker state, current limits and counters (JSON-friendly)."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['waited_s'] = round(stats['waited_s'], 3)
+        tokens_level = self.tokens.level()
+        requests_level = self.requests.level()
+        return {
+            'state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'last_error': self.breaker.last_error,
+            'concurrency_limit': int(self.concurrency.limit),
+            'in_flight': self.concurrency.in_flight,
+            'requests_per_minute': self.requests.per_minute,
+            'tokens_per_minute': self.tokens.per_minute,
+            'requests_available': None if requests_level is None else round(requests_level, 1),
+            'tokens_available': None if tokens_level is None else round(tokens_level, 1),
+            **stats
+        }
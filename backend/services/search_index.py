@@ -0,0 +1,382 @@
+"""
+Local retrieval index over stored messages for the chat assistant.
+
+Two rankings are merged with reciprocal rank fusion:
+
+BM25
+    Messages are reduced to hashed terms (lower-cased words without
+    stopwords or plural endings; subject terms count three times). Each
+    process holds the postings as NumPy arrays sorted by term, so scoring a
+    query is a binary search and one vectorised update per query term, no
+    matter how large the mailbox is.
+
+Hashed embeddings (optional)
+    Word and character-trigram features hashed into ``dim`` signed buckets,
+    log-scaled and L2-normalised. No model or network is needed, and
+    inflections and near spellings ("invoicing"/"invoice") still land close
+    together. A query costs one matrix-vector product.
+
+Everything is persisted in one SQLite file (WAL) shared by every gunicorn
+worker and the job worker: one row per message with its term counts and a
+float16 vector. Before a query each process loads the rows added since its
+last query and drops those listed in ``tombstones``. Messages are
+re-indexed only when their subject, sender or body change.
+"""
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id TEXT NOT NULL UNIQUE,
+    content_hash TEXT NOT NULL,
+    subject TEXT,
+    sender TEXT,
+    received_at TEXT,
+    body TEXT,
+    length INTEGER NOT NULL,
+    terms BLOB NOT NULL,
+    counts BLOB NOT NULL,
+    vector BLOB
+);
+CREATE TABLE IF NOT EXISTS tombstones (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# A subject word counts as this many body words
+SUBJECT_WEIGHT = 3
+# Reciprocal rank fusion constant (Cormack et al.)
+RRF_K = 60
+# Cosine below this is hashing noise between unrelated texts
+MIN_SIMILARITY = 0.2
+# Postings of newly loaded messages stay unsorted until they reach this
+# share of the sorted postings, then the two are merged
+MERGE_RATIO = 0.25
+# Reload from the database once this share of loaded messages is deleted
+COMPACT_RATIO = 0.25
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be been before being
+but by can could did do does doing for from had has have having he her here hers
+him his how i if in into is it its just me my no nor not of on or our out over
+please re fw fwd she should so some than that the their them then there these they
+this those to too under up us very was we were what when where which while who
+whom why will with would you your
+""".split())
+
+
+def _words(text):
+    return [w for w in _WORD.findall((text or '').lower()) if len(w) > 1 and w not in STOPWORDS]
+
+
+def _term(word):
+    """Hash of ``word`` without its plural ending ("delays" -> "delay")."""
+    if len(word) > 4 and word.endswith('ies'):
+        word = word[:-3] + 'y'
+    elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    return zlib.crc32(word.encode('utf-8'))
+
+
+def _empty_postings():
+    return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)
+
+
+class SearchIndex:
+    """BM25 + hashed-embedding retrieval over messages, updated incrementally."""
+
+    def __init__(self, path='data/search_index.sqlite3', embeddings=True, dim=128,
+                 candidates=50):
+        self.path = path
+        self.embeddings = embeddings
+        # Results taken from each ranking before fusion
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        # Stored vectors keep the width they were written with
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)", (dim,))
+        (self.dim,) = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self._conn.commit()
+        self._reset()
+
+    def _reset(self):
+        """Drop the in-memory copy; the next query loads everything again."""
+        # Per loaded message (position), in doc_id order: ids only ever grow
+        self._doc_ids = np.zeros(0, dtype=np.int64)
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._size = 0
+        self._deleted = 0
+        self._total_length = 0.0
+        # (term, position, count) postings sorted by term, plus the ones
+        # loaded since the last merge
+        self._postings = _empty_postings()
+        self._recent = _empty_postings()
+        self._last_tombstone = None
+
+    @staticmethod
+    def _content_hash(email):
+        text = '\x00'.join(str(email.get(k) or '') for k in ('subject', 'from', 'body'))
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def term_counts(email):
+        """``{term: weighted count}`` over a message's subject, sender and body."""
+        counts = Counter()
+        for word in _words(email.get('subject')):
+            counts[_term(word)] += SUBJECT_WEIGHT
+        for word in _words(email.get('from')) + _words(email.get('body')):
+            counts[_term(word)] += 1
+        return counts
+
+    def embed(self, text):
+        """Hashed embedding of ``text`` as a unit-length float32 vector."""
+        features = []
+        for word in _words(text):
+            features.append('w:' + word)
+            padded = f' {word} '
+            features.extend('c:' + padded[i:i + 3] for i in range(len(padded) - 2))
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+        hashes = np.fromiter((zlib.crc32(f.encode('utf-8')) for f in features),
+                             dtype=np.uint32, count=len(features))
+        # The top bit picks the sign so colliding features tend to cancel out
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        vector += np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _row(self, email, content_hash):
+        counts = self.term_counts(email)
+        vector = None
+        if self.embeddings:
+            vector = self.embed(f"{email.get('subject') or ''}\n{email.get('body') or ''}")
+            vector = vector.astype(np.float16).tobytes()
+        return (
+            email['id'], content_hash, email.get('subject') or '', email.get('from') or '',
+            email.get('receivedDateTime') or '', email.get('body') or '', sum(counts.values()),
+            np.array(list(counts.keys()), dtype=np.uint32).tobytes(),
+            np.minimum(list(counts.values()), 65535).astype(np.uint16).tobytes(),
+            vector,
+        )
+
+    def add(self, emails):
+        """Index new or changed messages; returns how many were (re)indexed."""
+        # Later duplicates of an id in the same call win
+        emails = list({email['id']: email for email in emails if email.get('id')}.values())
+        if not emails:
+            return 0
+        hashes = {email['id']: self._content_hash(email) for email in emails}
+        ids = list(hashes)
+        with self._lock:
+            existing = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                existing.update(self._conn.execute(
+                    f'SELECT message_id, content_hash FROM docs WHERE message_id IN ({placeholders})', chunk
+                ).fetchall())
+            changed = [email for email in emails if existing.get(email['id']) != hashes[email['id']]]
+            if not changed:
+                return 0
+            self._delete([email['id'] for email in changed if email['id'] in existing])
+            self._conn.executemany(
+                'INSERT INTO docs (message_id, content_hash, subject, sender, received_at, body,'
+                ' length, terms, counts, vector) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [self._row(email, hashes[email['id']]) for email in changed]
+            )
+            self._conn.commit()
+        return len(changed)
+
+    def remove(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._delete(ids)
+            self._conn.commit()
+
+    def _delete(self, message_ids):
+        """Delete rows, leaving tombstones so every process drops them from memory."""
+        for start in range(0, len(message_ids), 500):
+            chunk = message_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            self._conn.execute(
+                f'INSERT INTO tombstones (doc_id) SELECT doc_id FROM docs WHERE message_id IN ({placeholders})',
+                chunk
+            )
+            self._conn.execute(f'DELETE FROM docs WHERE message_id IN ({placeholders})', chunk)
+
+    def count(self):
+        with self._lock:
+            (count,) = self._conn.execute('SELECT COUNT(*) FROM docs').fetchone()
+        return count
+
+    def _refresh(self):
+        """Catch up with messages added and deleted (by any process) since the last query."""
+        if self._last_tombstone is None:
+            (last,) = self._conn.execute('SELECT MAX(seq) FROM tombstones').fetchone()
+            self._last_tombstone = last or 0
+        tombstones = self._conn.execute(
+            'SELECT seq, doc_id FROM tombstones WHERE seq > ? ORDER BY seq', (self._last_tombstone,)
+        ).fetchall()
+        if tombstones:
+            self._last_tombstone = tombstones[-1][0]
+            self._drop(np.array([doc_id for _, doc_id in tombstones], dtype=np.int64))
+            if self._deleted > COMPACT_RATIO * self._size:
+                self._reset()
+                return self._refresh()
+
+        last = int(self._doc_ids[self._size - 1]) if self._size else 0
+        rows = self._conn.execute(
+            'SELECT doc_id, length, terms, counts, vector FROM docs WHERE doc_id > ? ORDER BY doc_id',
+            (last,)
+        ).fetchall()
+        if rows:
+            self._append(rows)
+
+    def _drop(self, doc_ids):
+        loaded = self._doc_ids[:self._size]
+        positions = np.searchsorted(loaded, doc_ids)
+        inside = positions < self._size
+        positions = positions[inside]
+        # Rows added and deleted between two queries were never loaded
+        positions = positions[loaded[positions] == doc_ids[inside]]
+        positions = np.unique(positions[self._alive[positions]])
+        self._alive[positions] = False
+        self._deleted += len(positions)
+        self._total_length -= float(self._lengths[positions].sum())
+
+    def _append(self, rows):
+        start, end = self._size, self._size + len(rows)
+        if end > len(self._doc_ids):
+            # Grow geometrically so loading one message at a time stays cheap
+            capacity = max(end, 2 * len(self._doc_ids), 1024)
+            self._doc_ids = np.resize(self._doc_ids, capacity)
+            self._lengths = np.resize(self._lengths, capacity)
+            self._alive = np.resize(self._alive, capacity)
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            vectors[:start] = self._vectors[:start]
+            self._vectors = vectors
+        self._doc_ids[start:end] = [row[0] for row in rows]
+        self._lengths[start:end] = [row[1] for row in rows]
+        self._alive[start:end] = True
+        self._total_length += float(sum(row[1] for row in rows))
+        if all(row[4] for row in rows):
+            vectors = np.frombuffer(b''.join(row[4] for row in rows), dtype=np.float16)
+            self._vectors[start:end] = vectors.reshape(len(rows), self.dim)
+        else:
+            # Indexed with embeddings switched off for some messages
+            for position, row in enumerate(rows, start):
+                self._vectors[position] = np.frombuffer(row[4], dtype=np.float16) if row[4] else 0
+        self._size = end
+
+        postings = (
+            np.frombuffer(b''.join(row[2] for row in rows), dtype=np.uint32),
+            np.repeat(np.arange(start, end, dtype=np.int32), [len(row[2]) // 4 for row in rows]),
+            np.frombuffer(b''.join(row[3] for row in rows), dtype=np.uint16),
+        )
+        self._recent = tuple(np.concatenate(pair) for pair in zip(self._recent, postings))
+        if len(self._recent[0]) > max(MERGE_RATIO * len(self._postings[0]), 10000):
+            merged = [np.concatenate(pair) for pair in zip(self._postings, self._recent)]
+            order = np.argsort(merged[0], kind='stable')
+            self._postings = tuple(array[order] for array in merged)
+            self._recent = _empty_postings()
+
+    def _bm25(self, query, limit):
+        live = self._size - self._deleted
+        terms = dict.fromkeys(_term(word) for word in _words(query))
+        if not terms or not live:
+            return []
+        average_length = max(self._total_length / live, 1.0)
+        scores = np.zeros(self._size, dtype=np.float32)
+        sorted_terms, sorted_positions, sorted_counts = self._postings
+        recent_terms, recent_positions, recent_counts = self._recent
+        for term in map(np.uint32, terms):
+            # (a Python int would make NumPy upcast and copy the whole array)
+            low = np.searchsorted(sorted_terms, term, side='left')
+            high = np.searchsorted(sorted_terms, term, side='right')
+            recent = recent_terms == term
+            positions = np.concatenate([sorted_positions[low:high], recent_positions[recent]])
+            if not len(positions):
+                continue
+            tf = np.concatenate([sorted_counts[low:high], recent_counts[recent]]).astype(np.float32)
+            idf = math.log(1 + (live - len(positions) + 0.5) / (len(positions) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[positions] / average_length)
+            scores[positions] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        scores[~self._alive[:self._size]] = 0
+        return self._top(scores, limit, minimum=1e-6)
+
+    def _nearest(self, query, limit):
+        query_vector = self.embed(query)
+        if not self._size or not query_vector.any():
+            return []
+        scores = self._vectors[:self._size] @ query_vector
+        scores[~self._alive[:self._size]] = -1
+        return self._top(scores, limit, minimum=MIN_SIMILARITY)
+
+    def _top(self, scores, limit, minimum):
+        """doc_ids of the ``limit`` best scores that reach ``minimum``, best first."""
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [int(self._doc_ids[i]) for i in top if scores[i] >= minimum]
+
+    def search(self, query, k=5):
+        """Top ``k`` messages for ``query``, best first, each with its fused ``score``."""
+        with self._lock:
+            self._refresh()
+            rankings = [self._bm25(query, self.candidates)]
+            if self.embeddings:
+                rankings.append(self._nearest(query, self.candidates))
+            fused = {}
+            for ranking in rankings:
+                for rank, doc_id in enumerate(ranking):
+                    fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            best = sorted(fused, key=fused.get, reverse=True)[:k]
+            if not best:
+                return []
+            placeholders = ','.join('?' * len(best))
+            rows = {
+                row[0]: row for row in self._conn.execute(
+                    f'SELECT doc_id, message_id, subject, sender, received_at, body FROM docs'
+                    f' WHERE doc_id IN ({placeholders})', best
+                )
+            }
+        return [
+            {
+                'id': rows[doc_id][1],
+                'subject': rows[doc_id][2],
+                'from': rows[doc_id][3],
+                'receivedDateTime': rows[doc_id][4],
+                'body': rows[doc_id][5],
+                'score': round(fused[doc_id], 5),
+            }
+            for doc_id in best if doc_id in rows
+        ]
@@ -0,0 +1,373 @@
+"""Per-stage tracing and Prometheus metrics.
+
+``span(stage)`` times one stage of a request (a Graph call, HTML
+extraction, an LLM call, JSON parsing): the duration is observed in the
+``oceanai_stage_seconds`` histogram and, when a trace is active, appended
+to it with the span's attributes so a slow request can be logged with the
+breakdown of where its time went. Traces follow ``contextvars``, so spans
+recorded in ``ProcessingEngine`` workers or ``asyncio.to_thread`` land in
+the request that started them.
+
+Counters and histograms are kept in memory per process and written to
+``<directory>/<pid>.json`` at most every ``flush_interval`` seconds while
+recording; a background thread writes whatever an idle worker recorded since
+its last flush, and the process flushes once more at exit. ``render()``
+merges the files of every worker (gunicorn runs one process each) into a
+single Prometheus text exposition. Files of workers that have exited are
+deleted on startup and when merging, so a recycled worker's counts drop out
+(Prometheus sees a counter reset) instead of adding to the totals forever.
+"""
+import atexit
+import contextvars
+import glob
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Seconds; covers a cached lookup up to a slow LLM answer
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Exported metrics: name -> (type, help)
+METRICS = {
+    'oceanai_http_request_seconds': ('histogram', 'API request latency by route and status.'),
+    'oceanai_stage_seconds': ('histogram', 'Latency of one request stage (span).'),
+    'oceanai_graph_request_seconds': ('histogram', 'Microsoft Graph request latency including retries.'),
+    'oceanai_graph_requests_total': ('counter', 'Microsoft Graph requests by endpoint and outcome.'),
+    'oceanai_graph_retries_total': ('counter', 'Microsoft Graph retries after throttling or transient errors.'),
+    'oceanai_graph_batch_items_total': ('counter', 'Requests sent inside Graph $batch calls by endpoint and final outcome.'),
+    'oceanai_llm_call_seconds': ('histogram', 'Cohere chat call latency by operation.'),
+    'oceanai_llm_calls_total': ('counter', 'Cohere chat calls by operation and outcome.'),
+    'oceanai_llm_tokens_total': ('counter', 'Billed Cohere tokens by operation and kind (prompt/completion).'),
+    'oceanai_llm_cache_total': ('counter', 'LLM result cache lookups by operation and result (hit/miss).'),
+    'oceanai_json_parse_total': ('counter', 'Model answers parsed as JSON by result (ok/invalid).'),
+    'oceanai_near_duplicate_total': ('counter', 'Near-duplicate matches by operation and decision (reused/audit/rejected).'),
+    'oceanai_drafts_pregenerated_total': ('counter', 'Background reply drafts by result (stored/degraded).'),
+}
+
+_current_trace = contextvars.ContextVar('oceanai_trace', default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, OverflowError):
+        # Exists but isn't ours (EPERM), or can't be checked: keep its file
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """Counters and histograms for this process, shared across workers via files."""
+
+    def __init__(self, directory=None, flush_interval=5.0, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._dirty = False
+        # Threads don't survive fork: each worker starts its own flusher
+        self._flusher_pid = None
+        self.configure(directory, flush_interval)
+        atexit.register(self._flush_pending)
+
+    def configure(self, directory=None, flush_interval=None):
+        """Set where snapshots are written; None keeps metrics in memory only."""
+        self.directory = directory
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.prune()
+
+    def prune(self):
+        """Delete the snapshots of workers that are no longer running."""
+        for path, pid in self._snapshot_files():
+            if pid != os.getpid() and not _pid_alive(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _snapshot_files(self):
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            name = os.path.basename(path)[:-len('.json')]
+            if name.isdigit():
+                yield path, int(name)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+        self._maybe_flush()
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = {
+                    'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+            self._dirty = True
+        self._maybe_flush()
+
+    def snapshot(self):
+        """This process's metrics in the on-disk JSON layout."""
+        with self._lock:
+            return {
+                'buckets': list(self.buckets),
+                'counters': [[name, dict(labels), value]
+                             for (name, labels), value in self._counters.items()],
+                'histograms': [[name, dict(labels), dict(entry, buckets=list(entry['buckets']))]
+                               for (name, labels), entry in self._histograms.items()],
+            }
+
+    def _maybe_flush(self):
+        if not self.directory:
+            return
+        if self._flusher_pid != os.getpid():
+            self._start_flusher()
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        """Write counts left unflushed because no further metric was recorded."""
+        while self.directory:
+            time.sleep(max(self.flush_interval, 0.05))
+            self._flush_pending()
+
+    def _flush_pending(self):
+        if self._dirty:
+            self.flush()
+
+    def flush(self):
+        """Write this process's snapshot (atomically) for the other workers."""
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        self._dirty = False
+        path = self._path(os.getpid())
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Metrics flush error: {e}")
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _merge_into(self, counters, histograms, snapshot):
+        if list(snapshot.get('buckets', [])) != list(self.buckets):
+            return
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, _label_key(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, entry in snapshot.get('histograms', []):
+            key = (name, _label_key(labels))
+            merged = histograms.setdefault(
+                key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            )
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], entry['buckets'])]
+            merged['sum'] += entry['sum']
+            merged['count'] += entry['count']
+
+    def collect(self):
+        """Counters and histograms merged across every worker's snapshot."""
+        counters, histograms = {}, {}
+        self._merge_into(counters, histograms, self.snapshot())
+        if self.directory:
+            self.prune()
+            for path, pid in self._snapshot_files():
+                if pid != os.getpid():
+                    snapshot = self._read(path)
+                    if snapshot:
+                        self._merge_into(counters, histograms, snapshot)
+        return counters, histograms
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4) of the merged metrics."""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            series = counters if kind == 'counter' else histograms
+            keys = sorted(key for key in series if key[0] == name)
+            if not keys:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key in keys:
+                labels = key[1]
+                if kind == 'counter':
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(series[key])}")
+                    continue
+                entry = series[key]
+                for bound, count in zip(self.buckets, entry['buckets']):
+                    le = labels + (('le', _format_value(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(le)} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {entry['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(entry['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {entry['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Trace:
+    """The spans recorded while serving one request."""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def elapsed_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def to_dict(self):
+        return {'trace_id': self.id, 'name': self.name, 'ms': self.elapsed_ms(), 'spans': list(self.spans)}
+
+
+class DependencyProbe:
+    """Times live dependency checks, caching the results for ``ttl`` seconds.
+
+    ``checks`` maps a name to a callable returning a status string; an
+    exception reports ``error`` with its message. Caching keeps frequent
+    health checks from turning into load on the dependencies.
+    """
+
+    def __init__(self, checks, ttl=30):
+        self.checks = checks
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._results = None
+        self._checked_at = None
+
+    def results(self):
+        with self._lock:
+            if self._checked_at is None or time.monotonic() - self._checked_at >= self.ttl:
+                results = {}
+                for name, check in self.checks.items():
+                    started = time.perf_counter()
+                    try:
+                        entry = {'status': check()}
+                    except Exception as e:
+                        entry = {'status': 'error', 'error': str(e)}
+                    entry['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                    results[name] = entry
+                self._results, self._checked_at = results, time.monotonic()
+            return {name: dict(entry) for name, entry in self._results.items()}
+
+
+registry = MetricsRegistry()
+
+
+def configure(directory=None, flush_interval=5.0):
+    registry.configure(directory, flush_interval)
+
+
+def start_trace(name):
+    """Begin a trace for the current context; returns ``(trace, token)``."""
+    trace = Trace(name)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    try:
+        _current_trace.reset(token)
+    except ValueError:
+        # Streamed responses finish in another context than they started in
+        _current_trace.set(None)
+
+
+def finish_trace(trace, method, route, status, slow_ms=-1):
+    """Observe a finished request; log its spans when it took ``slow_ms`` or longer."""
+    elapsed_ms = trace.elapsed_ms()
+    registry.observe('oceanai_http_request_seconds', elapsed_ms / 1000,
+                     method=method, route=route, status=status)
+    if 0 <= slow_ms <= elapsed_ms:
+        print(json.dumps({'trace': trace.to_dict(), 'status': status}))
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage, **attrs):
+    """Time a stage; yields a dict the caller may add attributes to."""
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record_span(stage, time.perf_counter() - started, **attrs)
+
+
+def record_span(stage, elapsed, **attrs):
+    """Record a stage timed by the caller (``elapsed`` in seconds)."""
+    registry.observe('oceanai_stage_seconds', elapsed, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        # list.append is atomic; spans may arrive from worker threads
+        trace.spans.append(dict(attrs, stage=stage, ms=round(elapsed * 1000, 2)))
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+def render():
+    return registry.render()
@@ -0,0 +1,92 @@
+"""
+Conversation grouping and action item merging for thread-aware processing.
+
+Messages are grouped by Graph ``conversationId`` (a message without one is
+its own thread) and ordered oldest first. Action items extracted from each
+message's new content are merged across the thread: an item repeated in a
+later message is dropped there and only fills in a deadline or raises the
+priority of the first occurrence.
+"""
+import re
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+# Words that do not change what a task asks for
+FILLER_WORDS = frozenset('a an the please kindly our your my this that'.split())
+PRIORITY_ORDER = {'Low': 0, 'Medium': 1, 'High': 2}
+NO_DEADLINE = 'Not specified'
+# Separates messages in the text a whole thread is classified on
+THREAD_SEPARATOR = '\n\n---\n\n'
+
+
+def thread_id(email):
+    return email.get('conversationId') or email.get('id')
+
+
+def group_threads(emails, indexes=None):
+    """Index lists per conversation, each ordered oldest first.
+
+    Threads keep the order in which their first message appears in
+    ``emails``; ``indexes`` limits grouping to those positions.
+    """
+    threads = {}
+    for i in range(len(emails)) if indexes is None else indexes:
+        threads.setdefault(thread_id(emails[i]), []).append(i)
+    return [
+        sorted(thread, key=lambda i: emails[i].get('receivedDateTime') or '')
+        for thread in threads.values()
+    ]
+
+
+def thread_text(bodies):
+    """Text a thread is classified on: newest message first, so truncation keeps it."""
+    return THREAD_SEPARATOR.join(body for body in reversed(bodies) if body)
+
+
+def action_item_key(item):
+    """Normalised task text; items with the same key are the same task."""
+    words = _WORD.findall((item.get('task') or '').lower())
+    return ' '.join(word for word in words if word not in FILLER_WORDS)
+
+
+def merge_action_items(item_lists, known=()):
+    """Per-message lists of the items each message adds to its thread.
+
+    ``item_lists`` are in thread order (oldest first). ``known`` holds items
+    already recorded for the thread, e.g. from an earlier batch; repeats of
+    them are dropped. The returned dicts are copies.
+    """
+    first = {action_item_key(item): None for item in known}
+    merged = []
+    for items in item_lists:
+        added = []
+        for item in items:
+            key = action_item_key(item)
+            if not key:
+                continue
+            if key not in first:
+                first[key] = dict(item)
+                added.append(first[key])
+                continue
+            original = first[key]
+            if original is None:
+                continue
+            if original.get('deadline', NO_DEADLINE) == NO_DEADLINE:
+                original['deadline'] = item.get('deadline', NO_DEADLINE)
+            if PRIORITY_ORDER.get(item.get('priority'), -1) > PRIORITY_ORDER.get(original.get('priority'), -1):
+                original['priority'] = item['priority']
+        merged.append(added)
+    return merged
+
+
+def thread_summaries(emails):
+    """One entry per conversation in ``emails``: latest category and merged action items."""
+    summaries = []
+    for thread in group_threads(emails):
+        messages = [emails[i] for i in thread]
+        summaries.append({
+            'conversationId': thread_id(messages[0]),
+            'category': messages[-1].get('category'),
+            'messageIds': [email.get('id') for email in messages],
+            'actionItems': [item for email in messages for item in email.get('actionItems') or []],
+        })
+    return summaries
@@ -0,0 +1,130 @@
+"""
+Local token estimation and budgeting helpers (no network calls)
+"""
+import re
+from collections import namedtuple
+
+# Rough average for English prose with Cohere's tokenizer
+CHARS_PER_TOKEN = 4
+# URLs, hashes and tracking parameters split into many short tokens
+URL_CHARS_PER_TOKEN = 3
+# Accented, Cyrillic, Greek, emoji... are usually one or two chars per token
+OTHER_CHARS_PER_TOKEN = 2
+
+URL_PATTERN = re.compile(r'(?:https?://|www\.)\S+', re.I)
+# Han, kana, Hangul and full-width forms: roughly one token per character
+CJK_PATTERN = re.compile(r'[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+NON_ASCII_PATTERN = re.compile(r'[^\x00-\x7f]')
+
+# Sentence ends (Latin and CJK punctuation) and line breaks
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?。！？])\s+|(?<=[。！？])|\n+')
+TRUNCATION_MARKER = '\n[...]\n'
+
+Truncation = namedtuple('Truncation', ['text', 'original_tokens', 'tokens', 'dropped_tokens'])
+
+
+def _ceil_div(n, d):
+    return (n + d - 1) // d
+
+
+def estimate_tokens(text):
+    """Cheap upper-leaning estimate of the tokens in ``text``."""
+    if not text:
+        return 0
+    if text.isascii() and 'http' not in text and 'www.' not in text:
+        return _ceil_div(len(text), CHARS_PER_TOKEN)
+    url_chars = 0
+    for match in URL_PATTERN.finditer(text):
+        url_chars += match.end() - match.start()
+    if url_chars:
+        text = URL_PATTERN.sub('', text)
+    cjk = len(CJK_PATTERN.findall(text))
+    other = len(NON_ASCII_PATTERN.findall(text)) - cjk
+    plain = len(text) - cjk - other
+    return (
+        cjk
+        + _ceil_div(other, OTHER_CHARS_PER_TOKEN)
+        + _ceil_div(url_chars, URL_CHARS_PER_TOKEN)
+        + _ceil_div(plain, CHARS_PER_TOKEN)
+    )
+
+
+def _split_sentences(text):
+    """Split into sentences, each keeping its trailing whitespace."""
+    sentences, start = [], 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        if match.end() > start:
+            sentences.append(text[start:match.end()])
+            start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+def _cut(text, max_tokens, from_end=False):
+    """Longest prefix (or suffix) of ``text`` within ``max_tokens``, at a word break if possible."""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        piece = text[-mid:] if from_end else text[:mid]
+        if estimate_tokens(piece) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    # Back off to whitespace unless that would throw most of the piece away
+    if from_end:
+        piece = text[len(text) - low:]
+        space = piece.find(' ')
+        if 0 <= space < len(piece) // 2:
+            piece = piece[space + 1:]
+    else:
+        piece = text[:low]
+        space = piece.rfind(' ')
+        if space > len(piece) // 2:
+            piece = piece[:space]
+    return piece
+
+
+def truncate_to_budget(text, max_tokens, head_ratio=0.7):
+    """Fit ``text`` into ``max_tokens``, keeping whole sentences from both ends.
+
+    Roughly ``head_ratio`` of the budget goes to the opening sentences and the
+    rest to the closing ones; the middle is replaced by a ``[...]`` marker.
+    Returns a ``Truncation`` recording how many tokens were dropped.
+    """
+    text = text or ''
+    original_tokens = estimate_tokens(text)
+    if original_tokens <= max_tokens:
+        return Truncation(text, original_tokens, original_tokens, 0)
+
+    budget = max(0, max_tokens - estimate_tokens(TRUNCATION_MARKER))
+    head_budget = int(budget * head_ratio)
+    sentences = _split_sentences(text)
+    costs = [estimate_tokens(sentence) for sentence in sentences]
+
+    head_end, used = 0, 0
+    while head_end < len(sentences) and used + costs[head_end] <= head_budget:
+        used += costs[head_end]
+        head_end += 1
+    head = ''.join(sentences[:head_end])
+    if head_end == 0:
+        # Opening sentence alone is over budget: cut it at a word break and
+        # leave its remainder available to the tail
+        head = _cut(sentences[0], head_budget)
+        used = estimate_tokens(head)
+        sentences[0] = sentences[0][len(head):]
+        costs[0] = estimate_tokens(sentences[0])
+
+    tail_start = len(sentences)
+    tail_budget = budget - used
+    tail_used = 0
+    while tail_start > head_end and tail_used + costs[tail_start - 1] <= tail_budget:
+        tail_start -= 1
+        tail_used += costs[tail_start]
+    tail = ''.join(sentences[tail_start:])
+    if not tail and tail_start > head_end:
+        tail = _cut(sentences[-1], tail_budget, from_end=True)
+
+    result = head.rstrip() + TRUNCATION_MARKER + tail.lstrip()
+    tokens = estimate_tokens(result)
+    return Truncation(result, original_tokens, tokens, max(0, original_tokens - tokens))
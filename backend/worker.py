@@ -0,0 +1,29 @@
+"""
+Standalone background job worker.
+
+Runs queued /api/jobs work outside the web server. Set JOB_WORKER_MODE=external
+for the app so the gunicorn workers only serve requests, then start one or
+more of these next to it (from the backend directory):
+
+    python worker.py
+"""
+import os
+import signal
+
+# This process is the worker; don't also start in-process worker threads
+os.environ['JOB_WORKER_MODE'] = 'external'
+
+from app import job_worker  # noqa: E402
+
+
+def main():
+    signal.signal(signal.SIGTERM, lambda *_: job_worker.stop())
+    print(f"Job worker {job_worker.worker_id} started")
+    try:
+        job_worker.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Micro-benchmark for the HTML-to-text extractors.
+
+Runs every registered engine over the golden corpus in
+``Tests/fixtures/html`` (or the ``.html`` files given on the command line)
+and reports throughput in MB/s of input markup.
+
+    python benchmarks/bench_html_extraction.py --repeat 200
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'backend'))
+
+from services.html_extractor import EXTRACTORS  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*', help='HTML files (default: golden corpus)')
+    parser.add_argument('--repeat', type=int, default=100, help='passes over the corpus')
+    parser.add_argument('--engine', action='append', help='engine(s) to run (default: all)')
+    args = parser.parse_args()
+
+    paths = [Path(p) for p in args.files] or sorted((ROOT / 'Tests' / 'fixtures' / 'html').glob('*.html'))
+    docs = [p.read_text(encoding='utf-8') for p in paths]
+    size_mb = sum(len(d.encode('utf-8')) for d in docs) * args.repeat / 1e6
+
+    print(f"{len(docs)} documents x {args.repeat} passes = {size_mb:.2f} MB")
+    for name in args.engine or sorted(EXTRACTORS):
+        extractor = EXTRACTORS[name]
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for doc in docs:
+                extractor(doc)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>8}: {size_mb / elapsed:8.2f} MB/s  ({elapsed:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
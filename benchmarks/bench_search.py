@@ -0,0 +1,93 @@
+"""Micro-benchmark for the mailbox search index behind the chat assistant.
+
+Builds an index over a synthetic mailbox (maritime vocabulary mixed with
+filler words, so query terms are selective the way real ones are) and
+reports indexing throughput and query latency percentiles.
+
+    python benchmarks/bench_search.py --messages 100000
+    python benchmarks/bench_search.py --messages 100000 --no-embeddings
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'backend'))
+
+from services.search_index import SearchIndex  # noqa: E402
+
+TOPIC_WORDS = (
+    'port authority delay vessel berth container customs invoice schedule meeting '
+    'terminal cargo manifest freight shipment arrival departure crane pilot tug '
+    'insurance claim demurrage booking rate contract charter draft tide weather'
+).split()
+QUERIES = (
+    'what did the port authority say about the delay last week',
+    'customs invoice for the container shipment',
+    'berth schedule meeting',
+    'demurrage claim',
+)
+
+
+def synthetic_mailbox(count, seed):
+    rng = random.Random(seed)
+    filler = [f"{rng.choice('bcdfghklmnprstvw')}{rng.choice('aeiou')}{n}" for n in range(20000)]
+    for n in range(count):
+        words = [rng.choice(filler) for _ in range(rng.randint(40, 200))]
+        words += rng.sample(TOPIC_WORDS, 3)
+        rng.shuffle(words)
+        yield {
+            'id': f'bench-{n:07d}',
+            'subject': ' '.join(rng.sample(TOPIC_WORDS, 2) + rng.sample(filler, 3)),
+            'from': f'sender{n % 500}@example.com',
+            'receivedDateTime': f'2025-{1 + n % 12:02d}-{1 + n % 28:02d}T09:00:00Z',
+            'body': ' '.join(words),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000, help='mailbox size')
+    parser.add_argument('--queries', type=int, default=50, help='runs of each query')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--dim', type=int, default=128, help='embedding width')
+    parser.add_argument('--no-embeddings', action='store_true', help='BM25 only')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='oceanai-search-'), 'search_index.sqlite3')
+    index = SearchIndex(path, embeddings=not args.no_embeddings, dim=args.dim)
+
+    started = time.perf_counter()
+    batch = []
+    for email in synthetic_mailbox(args.messages, args.seed):
+        batch.append(email)
+        if len(batch) == 1000:
+            index.add(batch)
+            batch = []
+    index.add(batch)
+    elapsed = time.perf_counter() - started
+    print(f"indexed {args.messages} messages in {elapsed:.1f}s ({args.messages / elapsed:.0f}/s), "
+          f"embeddings {'on' if index.embeddings else 'off'}")
+
+    started = time.perf_counter()
+    index.search(QUERIES[0], args.k)  # first query loads the postings and vectors
+    print(f"loaded into memory in {time.perf_counter() - started:.1f}s")
+    for query in QUERIES:
+        latencies = []
+        for _ in range(args.queries):
+            started = time.perf_counter()
+            index.search(query, args.k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{p50:7.2f} ms p50 {p95:7.2f} ms p95  {query}")
+
+
+if __name__ == '__main__':
+    main()
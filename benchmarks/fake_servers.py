@@ -0,0 +1,360 @@
+"""Local stand-ins for the Cohere chat API and Microsoft Graph mail API.
+
+Both servers answer in the real wire formats, so the unmodified services can
+be pointed at them (``COHERE_BASE_URL`` / ``GRAPH_BASE_URL``). Latency is
+drawn from a log-normal distribution; error rate, random throttling and a
+concurrency ceiling (429 above it) are configurable per server.
+
+Run both servers for manual testing against a separately started backend
+(Graph routes still need a signed-in account; the fake accepts any token):
+
+    python benchmarks/fake_servers.py --cohere-latency 300 --graph-latency 80
+"""
+import argparse
+import json
+import math
+import random
+import socket
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'backend'))
+
+from services.cohere_service import BATCH_INSTRUCTION, FUSED_INSTRUCTION, VALID_CATEGORIES  # noqa: E402
+
+# Streamed answers are sent in chunks of this many words
+STREAM_CHUNK_WORDS = 4
+
+
+class Behaviour:
+    """Latency distribution, failures and throttling of a fake server.
+
+    ``latency_ms`` is the median response time and ``jitter`` the sigma of
+    the log-normal spread (0 gives a fixed latency). Requests beyond
+    ``max_concurrency`` in flight get a 429, as do a random
+    ``throttle_rate`` fraction; ``error_rate`` of requests get a 500.
+    """
+
+    def __init__(self, latency_ms=50.0, jitter=0.3, error_rate=0.0, throttle_rate=0.0,
+                 max_concurrency=0, retry_after=1, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_concurrency = max_concurrency
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            factor = math.exp(self._random.gauss(0, self.jitter)) if self.jitter else 1.0
+        return self.latency_ms * factor / 1000
+
+    def fault(self, in_flight):
+        """HTTP status to fail this request with, or None."""
+        if self.max_concurrency and in_flight > self.max_concurrency:
+            return 429
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connection bursts (SYN retries add seconds)
+    request_queue_size = 256
+
+
+class _FakeServer:
+    """Threaded HTTP server with per-route call counters."""
+
+    def __init__(self, behaviour=None, host='127.0.0.1', port=0):
+        self.behaviour = behaviour or Behaviour()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counts = {'requests': 0, 'throttled': 0, 'errors': 0}
+        self._server = _HTTPServer((host, port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def counts(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def route(self, method, path, query, body):
+        """Return ``(route_name, status, payload)``; payload may be a line generator."""
+        raise NotImplementedError
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Headers and body are written separately; don't let Nagle hold the body
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_lines(self, lines):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/stream+json')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for line in lines:
+                    data = (json.dumps(line) + '\n').encode('utf-8')
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _serve(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = self.rfile.read(length) if length else b''
+                body = json.loads(payload) if payload else None
+                parts = urlsplit(unquote(self.path))
+                with fake._lock:
+                    fake._in_flight += 1
+                    in_flight = fake._in_flight
+                try:
+                    fake._count('requests')
+                    behaviour = fake.behaviour
+                    time.sleep(behaviour.delay())
+                    status = behaviour.fault(in_flight)
+                    if status == 429:
+                        fake._count('throttled')
+                        self._send_json(429, {'message': 'Too many requests'},
+                                        {'Retry-After': str(behaviour.retry_after)})
+                        return
+                    if status is not None:
+                        fake._count('errors')
+                        self._send_json(status, {'message': 'Simulated failure'})
+                        return
+                    name, status, result = fake.route(method, parts.path, parse_qs(parts.query), body)
+                    fake._count(name)
+                    if hasattr(result, '__next__'):
+                        self._send_lines(result)
+                    else:
+                        self._send_json(status, result)
+                finally:
+                    with fake._lock:
+                        fake._in_flight -= 1
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+            def do_PATCH(self):
+                self._serve('PATCH')
+
+        return Handler
+
+
+def _pick(seed_text, options):
+    return options[zlib.crc32(seed_text.encode('utf-8')) % len(options)]
+
+
+class FakeCohereServer(_FakeServer):
+    """Answers ``POST /v1/chat`` (plain and streamed) and ``GET /v1/models`` like Cohere's v1 API.
+
+    The answer format follows the prompt: batch and fused prompts get JSON
+    objects, action-item prompts a JSON array, classification prompts a
+    category picked deterministically from the email text, and anything
+    else a short reply.
+    """
+
+    def __init__(self, behaviour=None, reply_words=60, **kwargs):
+        super().__init__(behaviour, **kwargs)
+        self.reply_words = reply_words
+
+    @property
+    def base_url(self):
+        return f"{self.address}/v1"
+
+    def answer(self, prompt):
+        if BATCH_INSTRUCTION in prompt:
+            sections = prompt.split('### Email ')[1:]
+            return json.dumps({
+                str(n): _pick(section, VALID_CATEGORIES) for n, section in enumerate(sections, 1)
+            })
+        if FUSED_INSTRUCTION in prompt:
+            return json.dumps({
+                'category': _pick(prompt, VALID_CATEGORIES),
+                'action_items': [{'task': 'Confirm the schedule', 'deadline': 'Friday', 'priority': 'Medium'}]
+            })
+        if 'JSON array' in prompt:
+            return json.dumps([{'task': 'Confirm the schedule', 'deadline': 'Friday', 'priority': 'Medium'}])
+        if 'Return ONLY the category' in prompt:
+            return _pick(prompt, VALID_CATEGORIES)
+        words = ('Thank you for the update. I will review the details and get back to you '
+                 'with confirmation of the next steps shortly.').split()
+        return ' '.join(words[i % len(words)] for i in range(self.reply_words))
+
+    def route(self, method, path, query, body):
+        if method == 'GET' and path.endswith('/models'):
+            return 'models', 200, {'models': [{'name': 'command-r-plus-08-2024', 'endpoints': ['chat']}]}
+        if method != 'POST' or not path.endswith('/chat'):
+            return 'not_found', 404, {'message': f'No route {method} {path}'}
+        prompt = (body or {}).get('message', '')
+        text = self.answer(prompt)
+        meta = {'billed_units': {'input_tokens': len(prompt) // 4, 'output_tokens': len(text) // 4}}
+        response = {'text': text, 'generation_id': 'bench', 'finish_reason': 'COMPLETE', 'meta': meta}
+        if not (body or {}).get('stream'):
+            return 'chat', 200, response
+        return 'chat_stream', 200, self._stream(text, response)
+
+    def _stream(self, text, response):
+        words = text.split(' ')
+        # The first chunk arrives after the usual latency; generating the rest
+        # takes about as long again
+        chunk_delay = self.behaviour.delay() / math.ceil(len(words) / STREAM_CHUNK_WORDS)
+        yield {'event_type': 'stream-start', 'generation_id': 'bench', 'is_finished': False}
+        for start in range(0, len(words), STREAM_CHUNK_WORDS):
+            chunk = ' '.join(words[start:start + STREAM_CHUNK_WORDS])
+            yield {'event_type': 'text-generation', 'text': (' ' if start else '') + chunk,
+                   'is_finished': False}
+            time.sleep(chunk_delay)
+        yield {'event_type': 'stream-end', 'finish_reason': 'COMPLETE', 'response': response,
+               'is_finished': True}
+
+
+class FakeGraphServer(_FakeServer):
+    """Synthetic mailbox behind ``/v1.0/me/messages`` and ``/v1.0/me/sendMail``.
+
+    Messages are generated on demand with HTML bodies that include quoted
+    history and a signature, so extraction and normalization do real work.
+    """
+
+    def __init__(self, behaviour=None, mailbox_size=1000, **kwargs):
+        super().__init__(behaviour, **kwargs)
+        self.mailbox_size = mailbox_size
+
+    @property
+    def base_url(self):
+        return f"{self.address}/v1.0/"
+
+    @staticmethod
+    def message(n):
+        topic = ('Vessel schedule', 'Invoice', 'Team meeting', 'Customs documents', 'Newsletter')[n % 5]
+        return {
+            'id': f'bench-{n:06d}',
+            'subject': f'{topic} #{n}',
+            'receivedDateTime': f'2025-11-{1 + n % 28:02d}T08:00:00Z',
+            'from': {'emailAddress': {'address': f'sender{n % 50}@partnerco.com'}},
+            'toRecipients': [{'emailAddress': {'address': 'you@oceanai.com'}}],
+            'isRead': False,
+            'importance': 'normal',
+            # Every four consecutive messages form one conversation
+            'conversationId': f'bench-thread-{n // 4:05d}',
+            'body': {
+                'contentType': 'html',
+                'content': (
+                    f'<html><body><p>Hi team,</p><p>Regarding {topic.lower()} #{n}: please confirm '
+                    'the updated arrival window and send the signed documents by Friday.</p>'
+                    '<p>Thanks,<br>Alex</p><p>--<br>Alex Morgan | Operations</p>'
+                    '<div><p>On Mon, Nov 3, 2025 at 9:00 AM Ops wrote:</p>'
+                    f'<blockquote>Earlier thread about {topic.lower()} with more details.</blockquote>'
+                    '</div></body></html>'
+                )
+            }
+        }
+
+    def route(self, method, path, query, body):
+        if method == 'GET' and path.endswith('/me/messages'):
+            top = min(int(query.get('$top', ['10'])[0]), self.mailbox_size)
+            return 'list_messages', 200, {'value': [self.message(n) for n in range(top)]}
+        if method == 'GET' and '/me/messages/' in path:
+            message_id = path.rsplit('/', 1)[-1]
+            return 'get_message', 200, self.message(int(message_id.rsplit('-', 1)[-1]))
+        if method == 'POST' and path.endswith('/me/sendMail'):
+            return 'send_mail', 202, None
+        return 'not_found', 404, {'error': {'code': 'NotFound', 'message': path}}
+
+
+def add_behaviour_args(parser, name, latency_ms):
+    """``--<name>-latency/-jitter/-errors/-throttle/-max-concurrency`` options."""
+    group = parser.add_argument_group(f'fake {name} server')
+    group.add_argument(f'--{name}-latency', type=float, default=latency_ms, help='median latency in ms')
+    group.add_argument(f'--{name}-jitter', type=float, default=0.3, help='log-normal sigma (0 = fixed)')
+    group.add_argument(f'--{name}-errors', type=float, default=0.0, help='fraction answered with 500')
+    group.add_argument(f'--{name}-throttle', type=float, default=0.0, help='fraction answered with 429')
+    group.add_argument(f'--{name}-max-concurrency', type=int, default=0,
+                       help='requests in flight above this get 429 (0 = unlimited)')
+
+
+def behaviour_from_args(args, name, seed=None):
+    prefix = name.replace('-', '_')
+    return Behaviour(
+        latency_ms=getattr(args, f'{prefix}_latency'),
+        jitter=getattr(args, f'{prefix}_jitter'),
+        error_rate=getattr(args, f'{prefix}_errors'),
+        throttle_rate=getattr(args, f'{prefix}_throttle'),
+        max_concurrency=getattr(args, f'{prefix}_max_concurrency'),
+        seed=seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cohere-port', type=int, default=8010)
+    parser.add_argument('--graph-port', type=int, default=8020)
+    add_behaviour_args(parser, 'cohere', 300.0)
+    add_behaviour_args(parser, 'graph', 80.0)
+    args = parser.parse_args()
+
+    cohere = FakeCohereServer(behaviour_from_args(args, 'cohere'), port=args.cohere_port).start()
+    graph = FakeGraphServer(behaviour_from_args(args, 'graph'), port=args.graph_port).start()
+    print(f"COHERE_BASE_URL={cohere.base_url}")
+    print(f"GRAPH_BASE_URL={graph.base_url}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"cohere {cohere.counts()}  graph {graph.counts()}")
+    except KeyboardInterrupt:
+        cohere.stop()
+        graph.stop()
+
+
+if __name__ == '__main__':
+    main()
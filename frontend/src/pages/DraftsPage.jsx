@@ -8,12 +8,30 @@ import {
   AlertCircle,
 } from "lucide-react";
 
-export default function DraftsPage({ drafts, setDrafts, sendDraft }) {
+export default function DraftsPage({
+  drafts,
+  setDrafts,
+  saveDraft,
+  deleteDraft,
+  sendDraft,
+  sendAllDrafts,
+}) {
   return (
     <div className="bg-white rounded-lg shadow-md p-6">
       <div className="flex items-center justify-between mb-6">
         <h2 className="text-2xl font-bold">Email Drafts</h2>
-        <span className="text-sm text-gray-600">{drafts.length} draft(s)</span>
+        <div className="flex items-center space-x-3">
+          <span className="text-sm text-gray-600">{drafts.length} draft(s)</span>
+          {drafts.length > 1 && (
+            <button
+              onClick={sendAllDrafts}
+              className="bg-indigo-600 text-white px-3 py-1 rounded-lg hover:bg-indigo-700 transition flex items-center space-x-2 text-sm"
+            >
+              <Send size={14} />
+              <span>Send All</span>
+            </button>
+          )}
+        </div>
       </div>
 
       {drafts.length === 0 ? (
@@ -40,11 +58,15 @@ export default function DraftsPage({ drafts, setDrafts, sendDraft }) {
                   <p className="text-xs text-gray-500 mt-1">
                     Created: {new Date(draft.createdAt).toLocaleString()}
                   </p>
+                  {draft.stale && (
+                    <p className="text-xs text-amber-600 mt-1 flex items-center space-x-1">
+                      <AlertCircle size={12} />
+                      <span>The original email changed since this draft was edited</span>
+                    </p>
+                  )}
                 </div>
                 <button
-                  onClick={() =>
-                    setDrafts(drafts.filter((d) => d.id !== draft.id))
-                  }
+                  onClick={() => deleteDraft(draft)}
                   className="text-red-600 hover:text-red-700"
                 >
                   <Trash2 size={18} />
@@ -63,7 +85,10 @@ export default function DraftsPage({ drafts, setDrafts, sendDraft }) {
                 />
               </div>
               <div className="flex space-x-2 mt-3">
-                <button className="flex-1 bg-gray-600 text-white px-4 py-2 rounded-lg hover:bg-gray-700 transition flex items-center justify-center space-x-2">
+                <button
+                  onClick={() => saveDraft(draft)}
+                  className="flex-1 bg-gray-600 text-white px-4 py-2 rounded-lg hover:bg-gray-700 transition flex items-center justify-center space-x-2"
+                >
                   <Save size={16} />
                   <span>Save Draft</span>
                 </button>
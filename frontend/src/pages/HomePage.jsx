@@ -15,6 +15,7 @@ import InboxPage from "./InboxPage";
 import AgentPage from "./AgentPage";
 import DraftsPage from "./DraftsPage";
 import { getCategoryColor, calculateStats } from "../utils/helpers";
+import { streamReply, streamChatMessage } from "../services/api";
 
 const API_BASE_URL = "http://localhost:5000/api";
 
@@ -40,6 +41,7 @@ const OceanAIEmailAgent = () => {
   useEffect(() => {
     checkAuthStatus();
     loadPrompts();
+    loadDrafts();
   }, []);
 
   const checkAuthStatus = async () => {
@@ -62,6 +64,16 @@ const OceanAIEmailAgent = () => {
     }
   };
 
+  const loadDrafts = async () => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/drafts`);
+      const data = await response.json();
+      if (data.success) setDrafts(data.drafts);
+    } catch (error) {
+      console.error("Failed to load drafts:", error);
+    }
+  };
+
   const handleMSGraphAuth = async () => {
     try {
       const response = await fetch(`${API_BASE_URL}/auth/login`, {
@@ -221,21 +233,39 @@ const OceanAIEmailAgent = () => {
       return;
     }
 
+    // Show the reply on the drafts page as it is written; the stored
+    // draft replaces this placeholder once the stream finishes
+    const pendingId = `pending-${email.id}`;
+    setDrafts((prev) => [
+      {
+        id: pendingId,
+        recipient: email.from,
+        subject: `Re: ${email.subject}`,
+        body: "",
+        createdAt: new Date().toISOString(),
+      },
+      ...prev.filter((d) => d.id !== pendingId),
+    ]);
+    setCurrentPage("drafts");
+
     setIsProcessing(true);
     try {
-      const response = await fetch(`${API_BASE_URL}/emails/generate-reply`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ email }),
-      });
-
-      const data = await response.json();
-      if (data.success) {
-        setDrafts([...drafts, data.draft]);
-        showNotification("success", "Draft generated successfully!");
-        setCurrentPage("drafts");
-      }
+      const done = await streamReply(email, (delta) =>
+        setDrafts((prev) =>
+          prev.map((d) => (d.id === pendingId ? { ...d, body: d.body + delta } : d))
+        )
+      );
+      if (!done || !done.draft) throw new Error("No draft returned");
+      setDrafts((prev) => [
+        done.draft,
+        ...prev.filter((d) => d.id !== pendingId && d.id !== done.draft.id),
+      ]);
+      showNotification(
+        "success",
+        done.ready ? "Draft ready" : "Draft generated successfully!"
+      );
     } catch (error) {
+      setDrafts((prev) => prev.filter((d) => d.id !== pendingId));
       showNotification("error", "Failed to generate draft");
     } finally {
       setIsProcessing(false);
@@ -253,7 +283,7 @@ const OceanAIEmailAgent = () => {
       if (data.success) {
         showNotification("success", "Reply sent successfully via Outlook");
         // Remove draft after sending
-        setDrafts((prev) => prev.filter((d) => d.id !== draft.id));
+        await deleteDraft(draft);
       } else {
         showNotification("error", data.error || "Failed to send reply");
       }
@@ -262,34 +292,92 @@ const OceanAIEmailAgent = () => {
     }
   };
 
-  const handleChat = async () => {
-    if (!chatInput.trim()) return;
-
-    const userMessage = { role: "user", content: chatInput };
-    setChatMessages([...chatMessages, userMessage]);
-    const inputValue = chatInput;
-    setChatInput("");
-
+  const sendAllDrafts = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/chat`, {
+      const response = await fetch(`${API_BASE_URL}/emails/send-replies`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ drafts }),
+      });
+      const data = await response.json();
+      if (!data.results) {
+        showNotification("error", data.error || "Failed to send replies");
+        return;
+      }
+      const sent = new Set(data.results.filter((r) => r.success).map((r) => r.id));
+      setDrafts((prev) => prev.filter((d) => !sent.has(d.id)));
+      showNotification(
+        data.failed ? "error" : "success",
+        data.failed
+          ? `Sent ${data.sent} replies, ${data.failed} failed`
+          : `Sent ${data.sent} replies via Outlook`
+      );
+    } catch (e) {
+      showNotification("error", "Network error while sending replies");
+    }
+  };
+
+  const saveDraft = async (draft) => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/drafts/${draft.id}`, {
+        method: "PUT",
+        headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
-          message: inputValue,
-          context: {
-            emails,
-            selectedEmail,
-            stats,
-          },
+          subject: draft.subject,
+          body: draft.body,
+          recipient: draft.recipient,
         }),
       });
-
       const data = await response.json();
       if (data.success) {
-        const assistantMessage = { role: "assistant", content: data.response };
-        setChatMessages((prev) => [...prev, assistantMessage]);
+        setDrafts((prev) => prev.map((d) => (d.id === draft.id ? data.draft : d)));
+        showNotification("success", "Draft saved");
+      } else {
+        showNotification("error", data.error || "Failed to save draft");
       }
+    } catch (e) {
+      showNotification("error", "Network error while saving draft");
+    }
+  };
+
+  const deleteDraft = async (draft) => {
+    setDrafts((prev) => prev.filter((d) => d.id !== draft.id));
+    try {
+      await fetch(`${API_BASE_URL}/drafts/${draft.id}`, { method: "DELETE" });
+    } catch (e) {
+      console.error("Failed to delete draft:", e);
+    }
+  };
+
+  const handleChat = async () => {
+    if (!chatInput.trim()) return;
+
+    const userMessage = { role: "user", content: chatInput };
+    // The assistant's answer is filled in as it streams
+    setChatMessages([
+      ...chatMessages,
+      userMessage,
+      { role: "assistant", content: "" },
+    ]);
+    const inputValue = chatInput;
+    setChatInput("");
+
+    const updateAnswer = (update) =>
+      setChatMessages((prev) => [
+        ...prev.slice(0, -1),
+        { role: "assistant", content: update(prev[prev.length - 1].content) },
+      ]);
+
+    try {
+      const done = await streamChatMessage(
+        inputValue,
+        { emails, selectedEmail, stats },
+        (delta) => updateAnswer((content) => content + delta)
+      );
+      if (!done) throw new Error("Stream ended early");
+      updateAnswer(() => done.text);
     } catch (error) {
+      setChatMessages((prev) => prev.slice(0, -1));
       showNotification("error", "Chat failed");
     }
   };
@@ -624,7 +712,10 @@ const OceanAIEmailAgent = () => {
           <DraftsPage
             drafts={drafts}
             setDrafts={setDrafts}
+            saveDraft={saveDraft}
+            deleteDraft={deleteDraft}
             sendDraft={sendDraft}
+            sendAllDrafts={sendAllDrafts}
           />
         )}
       </div>
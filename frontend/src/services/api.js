@@ -41,12 +41,79 @@ export const generateReply = async (email) => {
   return response.data;
 };
 
+// Drafts
+export const getDrafts = async (limit = 100) => {
+  const response = await api.get('/drafts', { params: { limit } });
+  return response.data;
+};
+
+export const updateDraft = async (draft) => {
+  const { subject, body, recipient } = draft;
+  const response = await api.put(`/drafts/${draft.id}`, { subject, body, recipient });
+  return response.data;
+};
+
+export const deleteDraft = async (draftId) => {
+  const response = await api.delete(`/drafts/${draftId}`);
+  return response.data;
+};
+
+export const sendReplies = async (drafts) => {
+  const response = await api.post('/emails/send-replies', { drafts });
+  return response.data;
+};
+
+export const markAsRead = async (ids, isRead = true) => {
+  const response = await api.post('/emails/mark-read', { ids, isRead });
+  return response.data;
+};
+
 // Chat
 export const sendChatMessage = async (message, context) => {
   const response = await api.post('/chat', { message, context });
   return response.data;
 };
 
+// Streaming (server-sent events): calls onDelta(text) as tokens arrive and
+// resolves with the final event ({ text, fallback, ttft_ms, ... })
+const streamEvents = async (path, payload, onDelta) => {
+  const response = await fetch(`${API_BASE_URL}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ ...payload, stream: true }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Streaming request failed: ${response.status}`);
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let done = null;
+  while (!done) {
+    const { value, done: finished } = await reader.read();
+    if (finished) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      if (!raw.startsWith('data: ')) continue;
+      const event = JSON.parse(raw.slice(6));
+      if (event.done) {
+        done = event;
+      } else if (event.delta) {
+        onDelta(event.delta);
+      }
+    }
+  }
+  return done;
+};
+
+export const streamReply = (email, onDelta) =>
+  streamEvents('/emails/generate-reply', { email }, onDelta);
+
+export const streamChatMessage = (message, context, onDelta) =>
+  streamEvents('/chat', { message, context }, onDelta);
+
 // Prompts
 export const getPrompts = async () => {
   const response = await api.get('/prompts');